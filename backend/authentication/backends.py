@@ -0,0 +1,33 @@
+from django.contrib.auth.backends import ModelBackend
+from .principal import principal_for_user
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose permission checks read the cached principal instead of querying
+    the user's and groups' permissions on every request.
+
+    The principal is cached across requests under the user id and the groups version,
+    which is bumped whenever group permissions change (see principal.bump_groups_version),
+    and kept on the user object for the rest of the request. Authentication is unchanged.
+    """
+    def _principal(self, user_obj):
+        if not hasattr(user_obj, "_principal_cache"):
+            user_obj._principal_cache = principal_for_user(user_obj)
+        return user_obj._principal_cache
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        return set(self._principal(user_obj).permissions)
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return False
+        return self._principal(user_obj).has_perm(perm)
+
+    def has_module_perms(self, user_obj, app_label):
+        if not user_obj.is_active or user_obj.is_anonymous:
+            return False
+        prefix = f"{app_label}."
+        return any(perm.startswith(prefix) for perm in self._principal(user_obj).permissions)
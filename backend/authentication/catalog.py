@@ -0,0 +1,39 @@
+import hashlib
+import json
+from collections import defaultdict
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.utils.http import quote_etag
+
+CATALOG_KEY = "permission-catalog"
+
+
+def build_catalog():
+    " Permissions grouped by 'app_label.model', as the role editor shows them "
+    grouped = defaultdict(list)
+    for perm in Permission.objects.select_related("content_type").order_by("content_type__app_label", "content_type__model", "codename"):
+        key = f"{perm.content_type.app_label}.{perm.content_type.model}"
+        grouped[key].append({
+            "id": perm.id,
+            "codename": perm.codename,
+            "name": perm.name,
+        })
+    return dict(grouped)
+
+
+def get_catalog():
+    """
+    Return ``(etag, catalog)``. Permissions only change when migrations run, so the catalog
+    is built once and kept in the cache until post_migrate drops it.
+    """
+    cached = cache.get(CATALOG_KEY)
+    if cached is None:
+        catalog = build_catalog()
+        etag = quote_etag(hashlib.sha1(json.dumps(catalog, sort_keys=True).encode()).hexdigest())
+        cached = (etag, catalog)
+        cache.set(CATALOG_KEY, cached, None)
+    return cached
+
+
+def invalidate_catalog():
+    cache.delete(CATALOG_KEY)
@@ -0,0 +1,147 @@
+import re
+from collections import Counter
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from . import principal
+
+# userAccountControl flag set on disabled Active Directory accounts
+ACCOUNTDISABLE = 0x2
+USERNAME_TERM = re.compile(r"\((\w+)=%\(user\)s\)")
+
+
+def username_attribute(filterstr):
+    " The attribute a login filter such as ``(sAMAccountName=%(user)s)`` matches usernames on "
+    match = USERNAME_TERM.search(filterstr)
+    if match is None:
+        raise ValueError(f"No '(<attribute>=%(user)s)' term in {filterstr!r}")
+    return match.group(1)
+
+
+def first_value(attrs, name):
+    " First value of an attribute from a lower-cased python-ldap attribute dict "
+    values = attrs.get(name.lower())
+    if not values:
+        return None
+    value = values[0]
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def is_disabled(attrs):
+    " Entries without userAccountControl (e.g. a non-AD stand-in) count as enabled "
+    try:
+        return bool(int(first_value(attrs, "userAccountControl")) & ACCOUNTDISABLE)
+    except (TypeError, ValueError):
+        return False
+
+
+class DirectorySync:
+    """
+    Upserts pages of directory entries into User the way an LDAP login would create them:
+    attributes from AUTH_LDAP_USER_ATTR_MAP, an unusable password and the default USER
+    group for new accounts. Each batch costs a fixed number of queries; unchanged users
+    are not written at all. Disabled accounts are collected and deactivated together by
+    ``deactivate_disabled`` once every page has been seen.
+    """
+    def __init__(self, username_attr, attr_map=None):
+        self.username_attr = username_attr
+        self.attr_map = dict(settings.AUTH_LDAP_USER_ATTR_MAP if attr_map is None else attr_map)
+        self.fields = list(self.attr_map)
+        self.unusable = make_password(None)
+        self.disabled = set()
+        self.stats = Counter()
+        self.default_group = None
+
+    def rows(self, entries):
+        " Username (lower-cased) -> (username, field values) for the usable entries of a page "
+        rows = {}
+        for dn, attrs in entries:
+            if dn is None:
+                # Search continuation reference (AD referral)
+                continue
+            attrs = {name.lower(): values for name, values in attrs.items()}
+            username = first_value(attrs, self.username_attr)
+            values = {field: first_value(attrs, attribute) or "" for field, attribute in self.attr_map.items()}
+            # Disabled accounts are deactivated even when the entry is too incomplete to upsert
+            if username and is_disabled(attrs):
+                self.disabled.add(username.lower())
+            if not username or not values.get("email"):
+                self.stats["skipped"] += 1
+                continue
+            rows[username.lower()] = (username, values)
+        return rows
+
+    def sync_batch(self, entries):
+        User = get_user_model()
+        rows = self.rows(entries)
+        if not rows:
+            return
+
+        with transaction.atomic():
+            # Logins look users up case-insensitively, so keep the spelling already stored
+            existing = {
+                user["username_lower"]: user
+                for user in User.objects.annotate(username_lower=Lower("username"))
+                .filter(Q(username_lower__in=rows) | Q(email__in=[values["email"] for username, values in rows.values()]))
+                .values("pk", "username", "username_lower", *self.fields)
+            }
+            email_owners = {user["email"]: key for key, user in existing.items()}
+
+            users, created = [], []
+            for key, (username, values) in rows.items():
+                current = existing.get(key)
+                owner = email_owners.setdefault(values["email"], key)
+                if owner != key:
+                    # email is unique; the address already belongs to another account
+                    self.stats["email_conflicts"] += 1
+                    continue
+                if current is None:
+                    created.append(len(users))
+                elif all(current[field] == values[field] for field in self.fields):
+                    self.stats["unchanged"] += 1
+                    continue
+                users.append(User(username=current["username"] if current else username, password=self.unusable, **values))
+
+            if not users:
+                return
+            users = User.objects.bulk_create(
+                users, update_conflicts=True, unique_fields=["username"], update_fields=self.fields + ["updated_at"],
+            )
+            new_ids = {users[index].pk for index in created}
+            self.assign_default_group(new_ids)
+            updated = [user.pk for user in users if user.pk not in new_ids]
+            if updated:
+                principal.invalidate(updated)
+            self.stats["created"] += len(new_ids)
+            self.stats["updated"] += len(updated)
+
+    def assign_default_group(self, user_ids):
+        if not user_ids:
+            return
+        if self.default_group is None:
+            self.default_group, _ = Group.objects.get_or_create(name="USER")
+        through = get_user_model().groups.through
+        through.objects.bulk_create(
+            [through(user_id=user_id, group_id=self.default_group.pk) for user_id in user_ids], ignore_conflicts=True,
+        )
+
+    def deactivate_disabled(self):
+        " One UPDATE for every account the directory reports as disabled "
+        User = get_user_model()
+        if not self.disabled:
+            return 0
+        with transaction.atomic():
+            ids = list(
+                User.objects.annotate(username_lower=Lower("username"))
+                .filter(username_lower__in=self.disabled, is_active=True)
+                .values_list("pk", flat=True)
+            )
+            if ids:
+                User.objects.filter(pk__in=ids).update(is_active=False)
+                principal.invalidate(ids)
+        self.stats["deactivated"] += len(ids)
+        return len(ids)
@@ -0,0 +1,125 @@
+import json
+import statistics
+import time
+import ldap
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django_auth_ldap.backend import valid_cache_key
+from django_auth_ldap.config import LDAPSearch, LDAPSearchUnion
+from authentication import principal
+from core.benchmarks import percentile
+
+SEARCH_BASES = ["CN=Users,DC=nbihosp,DC=org", "OU=ALL,DC=nbihosp,DC=org"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark LDAP logins against a stand-in directory "
+        "(docker compose --profile ldap-bench up -d ldap): latency and user-table writes per login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--uri", default="ldap://localhost:1389")
+        parser.add_argument("--bind-dn", default="cn=admin,dc=nbihosp,dc=org")
+        parser.add_argument("--bind-password", default="benchmark")
+        parser.add_argument("--users", type=int, default=200, help="Staff logging in at shift change")
+        parser.add_argument("--rounds", type=int, default=3, help="Logins per user; the first one creates the user")
+        parser.add_argument("--password", default="Shift-Change-1")
+        parser.add_argument("--seed", action="store_true", help="Create the search bases and users in the directory first")
+        parser.add_argument("--no-cache", action="store_true", help="Disable AUTH_LDAP_CACHE_TIMEOUT for comparison")
+        parser.add_argument("--keep-users", action="store_true", help="Keep the Django users created by the run")
+
+    def handle(self, *args, **options):
+        usernames = [f"bench{n:05d}" for n in range(options["users"])]
+        if options["seed"]:
+            self.seed(options, usernames)
+
+        # The stand-in is OpenLDAP, so search on uid / mail instead of the AD attributes
+        ldap_settings = {
+            "AUTH_LDAP_SERVER_URI": options["uri"],
+            "AUTH_LDAP_BIND_DN": options["bind_dn"],
+            "AUTH_LDAP_BIND_PASSWORD": options["bind_password"],
+            "AUTH_LDAP_USER_SEARCH": LDAPSearchUnion(
+                *[LDAPSearch(base, ldap.SCOPE_SUBTREE, "(uid=%(user)s)") for base in SEARCH_BASES]
+            ),
+            "AUTH_LDAP_USER_ATTR_MAP": {"first_name": "givenName", "last_name": "sn", "email": "mail"},
+            "AUTH_LDAP_CACHE_TIMEOUT": 0 if options["no_cache"] else getattr(settings, "AUTH_LDAP_CACHE_TIMEOUT", 3600),
+        }
+        self.forget(usernames)
+        rounds = []
+        with override_settings(**ldap_settings), transaction.atomic():
+            for number in range(options["rounds"]):
+                rounds.append(self.login_round(number + 1, usernames, options["password"]))
+            if not options["keep_users"]:
+                transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({
+            "users": len(usernames),
+            "cache_timeout": ldap_settings["AUTH_LDAP_CACHE_TIMEOUT"],
+            "rounds": rounds,
+        }, indent=2))
+
+    def forget(self, usernames):
+        " Start cold without wiping the shared cache: drop only what earlier runs cached for the benchmark users "
+        cache.delete_many([valid_cache_key(f"django_auth_ldap.user_dn.{username}") for username in usernames])
+        principal.invalidate(get_user_model().objects.filter(username__in=usernames).values_list("pk", flat=True))
+
+    def login_round(self, number, usernames, password):
+        durations, writes, failures = [], 0, 0
+        started = time.perf_counter()
+        for username in usernames:
+            with CaptureQueriesContext(connection) as queries:
+                login_started = time.perf_counter()
+                user = authenticate(username=username, password=password)
+                durations.append((time.perf_counter() - login_started) * 1000)
+            failures += user is None
+            writes += sum(
+                1 for query in queries.captured_queries
+                if query["sql"].startswith(("INSERT", "UPDATE")) and "authentication_user" in query["sql"]
+            )
+        elapsed = time.perf_counter() - started
+        return {
+            "round": number,
+            "logins_per_second": round(len(usernames) / elapsed, 1),
+            "mean_ms": round(statistics.fmean(durations), 2),
+            "p50_ms": round(percentile(durations, 50), 2),
+            "p95_ms": round(percentile(durations, 95), 2),
+            "p99_ms": round(percentile(durations, 99), 2),
+            "user_writes": writes,
+            "failures": failures,
+        }
+
+    def seed(self, options, usernames):
+        " Create both search bases and the benchmark users (idempotent) "
+        conn = ldap.initialize(options["uri"])
+        try:
+            conn.simple_bind_s(options["bind_dn"], options["bind_password"])
+        except ldap.LDAPError as e:
+            raise CommandError(f"Cannot bind to {options['uri']}: {e}")
+
+        entries = [
+            ("CN=Users,DC=nbihosp,DC=org", {"objectClass": [b"top", b"organizationalRole"], "cn": [b"Users"]}),
+            ("OU=ALL,DC=nbihosp,DC=org", {"objectClass": [b"top", b"organizationalUnit"], "ou": [b"ALL"]}),
+        ]
+        for n, username in enumerate(usernames):
+            base = SEARCH_BASES[n % 2]
+            entries.append((f"uid={username},{base}", {
+                "objectClass": [b"top", b"inetOrgPerson"],
+                "uid": [username.encode()],
+                "cn": [f"Bench {n}".encode()],
+                "givenName": [b"Bench"],
+                "sn": [str(n).encode()],
+                "mail": [f"{username}@nbihosp.org".encode()],
+                "userPassword": [options["password"].encode()],
+            }))
+        for dn, attrs in entries:
+            try:
+                conn.add_s(dn, list(attrs.items()))
+            except ldap.ALREADY_EXISTS:
+                pass
+        conn.unbind_s()
+        self.stdout.write(self.style.SUCCESS(f"Seeded {len(usernames)} users under {', '.join(SEARCH_BASES)}."))
@@ -9,22 +9,75 @@ class User(AbstractUser):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     modified_by = models.ForeignKey("self", on_delete=models.PROTECT, null=True, blank=True)
+    # Part of every bearer token; bumping it revokes the tokens issued so far
+    token_version = models.PositiveIntegerField(default=0)
+
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=["updated_at", "id"], name="user_updated_idx"),
+        ]
+
     @property
     def get_full_name(self):
         return " ".join(filter(None, [self.first_name, self.middle_name, self.last_name]))
     @property
+    def primary_group(self):
+        """Return the user's first group, using prefetched groups when available."""
+        if "groups" in getattr(self, "_prefetched_objects_cache", {}):
+            return min(self.groups.all(), key=lambda group: group.pk, default=None)
+        return self.groups.order_by("pk").first()
+    @property
     def role(self):
         """Return the user's first group name, if any."""
-        return self.groups.first().name if self.groups.exists() else None
+        group = self.primary_group
+        return group.name if group else None
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        " Remember the loaded row so saves that change nothing can be skipped "
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    @property
+    def has_changes(self):
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is None:
+            return True
+        return any(
+            getattr(self, field.attname) != loaded[field.attname]
+            for field in self._meta.concrete_fields
+            if field.attname in loaded and not getattr(field, "auto_now", False)
+        )
+
+    def set_password(self, raw_password):
+        " A new password also signs the user out of every bearer token "
+        super().set_password(raw_password)
+        if not self._state.adding:
+            self.token_version += 1
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is not None:
+            loaded.update({
+                field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields
+                if fields is None or field.name in fields or field.attname in fields
+            })
+
     def save(self, *args, **kwargs):
         is_new = self._state.adding  # True if user is being created
+        # Set by the populate_user receiver when an LDAP login changed nothing
+        if getattr(self, "_skip_unchanged_save", False):
+            self._skip_unchanged_save = False
+            return
         super().save(*args, **kwargs)
+        self._loaded_values = {field.attname: getattr(self, field.attname) for field in self._meta.concrete_fields}
 
-        # Assign default group only when user is first created
-        if is_new and not self.groups.exists():
-            default_group, _ = Group.objects.get_or_create(name="USER")
-            self.groups.set([default_group])
+        # Assign the default group only when the user is first created
+        if is_new:
+            default_group, _ = Group.objects.get_or_create(name="ADMIN" if self.is_superuser else "USER")
+            self.groups.add(default_group)
 
     def __str__(self):
         return f"{self.get_full_name} ({self.role})"
@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.postgres.expressions import ArraySubquery
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat
+from core.metrics import cache_lookup
+
+
+class Principal:
+    """
+    Who is making the request: role, dimension and permission names, resolved in one
+    query and cached between requests until the user's groups, permissions or dimension change.
+    """
+    def __init__(self, user_id=None, username="", is_superuser=False, is_staff=False, is_active=False,
+                 role=None, role_id=None, dimension_id=None, permissions=(), token_version=0):
+        self.user_id = user_id
+        self.username = username
+        self.is_superuser = is_superuser
+        self.is_staff = is_staff
+        self.is_active = is_active
+        self.role = role
+        self.role_id = role_id
+        self.dimension_id = dimension_id
+        self.permissions = frozenset(permissions)
+        self.token_version = token_version
+
+    def __repr__(self):
+        return f"<Principal {self.username or 'anonymous'} ({self.role})>"
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def is_system_admin(self):
+        " Sees every dimension "
+        return self.is_superuser or self.role == "SYSTEM_ADMIN"
+
+    def has_perm(self, perm):
+        if not self.is_active:
+            return False
+        return self.is_superuser or perm in self.permissions
+
+
+ANONYMOUS = Principal()
+
+
+GROUPS_VERSION_KEY = "principal:groups-version"
+
+
+def groups_version():
+    " Bumped whenever group permissions change; part of every principal cache key "
+    version = cache.get(GROUPS_VERSION_KEY)
+    if version is None:
+        cache.add(GROUPS_VERSION_KEY, 1, None)
+        version = cache.get(GROUPS_VERSION_KEY, 1)
+    return version
+
+
+def _bump():
+    try:
+        cache.incr(GROUPS_VERSION_KEY)
+    except ValueError:
+        cache.set(GROUPS_VERSION_KEY, 2, None)
+
+
+def bump_groups_version():
+    """
+    Invalidate every cached principal at once, e.g. after a group's permissions changed.
+    Bumped now and again on commit, so a request that reloaded mid-transaction doesn't
+    keep the old permissions.
+    """
+    _bump()
+    transaction.on_commit(_bump)
+
+
+def cache_key(user_id, version=None):
+    return f"principal:{groups_version() if version is None else version}:{user_id}"
+
+
+def load_principal(user_id):
+    " Build the principal with a single query "
+    User = get_user_model()
+    primary_group = Group.objects.filter(user=OuterRef("pk")).order_by("pk")
+    permissions = (
+        Permission.objects.filter(Q(group__user=OuterRef("pk")) | Q(user=OuterRef("pk")))
+        .annotate(full_name=Concat("content_type__app_label", Value("."), "codename"))
+        .values("full_name")
+        .distinct()
+    )
+    row = (
+        User.objects.filter(pk=user_id)
+        .annotate(
+            role_id=Subquery(primary_group.values("pk")[:1]),
+            role=Subquery(primary_group.values("name")[:1]),
+            permission_names=ArraySubquery(permissions),
+        )
+        .values("pk", "username", "is_superuser", "is_staff", "is_active", "role", "role_id", "dimension_id", "permission_names", "token_version")
+        .first()
+    )
+    if row is None:
+        return ANONYMOUS
+    return Principal(
+        user_id=row["pk"],
+        username=row["username"],
+        is_superuser=row["is_superuser"],
+        is_staff=row["is_staff"],
+        is_active=row["is_active"],
+        role=row["role"],
+        role_id=row["role_id"],
+        dimension_id=row["dimension_id"],
+        permissions=row["permission_names"] or (),
+        token_version=row["token_version"],
+    )
+
+
+class LocalPrincipals:
+    """
+    Bounded in-process LRU in front of the shared cache, keyed by groups version and user.
+    Entries live for PRINCIPAL_LOCAL_CACHE_TTL seconds, which bounds how long another
+    process's per-user invalidation takes to reach this one.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            principal, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return principal
+
+    def set(self, key, principal):
+        ttl = getattr(settings, "PRINCIPAL_LOCAL_CACHE_TTL", 30)
+        size = getattr(settings, "PRINCIPAL_LOCAL_CACHE_SIZE", 1024)
+        with self.lock:
+            self.entries[key] = (principal, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > size:
+                self.entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_principals = LocalPrincipals()
+
+
+def principal_for_id(user_id):
+    " In-process LRU, then the shared cache, then one query "
+    key = cache_key(user_id)
+    principal = local_principals.get(key)
+    if principal is not None:
+        cache_lookup("principal_local", hit=True)
+        return principal
+    cache_lookup("principal_local", hit=False)
+
+    principal = cache.get(key)
+    cache_lookup("principal", hit=principal is not None)
+    if principal is None:
+        principal = load_principal(user_id)
+        cache.set(key, principal, getattr(settings, "PRINCIPAL_CACHE_TIMEOUT", 300))
+    local_principals.set(key, principal)
+    return principal
+
+
+def principal_for_user(user):
+    if user is None or not user.is_authenticated:
+        return ANONYMOUS
+    principal = getattr(user, "_principal_cache", None)
+    if principal is None:
+        principal = principal_for_id(user.pk)
+    return principal
+
+
+def get_principal(request):
+    " Return the request's principal, resolving it at most once per request "
+    principal = getattr(request, "_principal", None)
+    if principal is None:
+        principal = principal_for_user(getattr(request, "user", None))
+        request._principal = principal
+    return principal
+
+
+def invalidate(user_ids):
+    version = groups_version()
+    keys = [cache_key(user_id, version) for user_id in user_ids]
+    local_principals.discard(keys)
+    cache.delete_many(keys)
@@ -1,6 +1,7 @@
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
+from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.models import Group, Permission
+from .tokens import REFRESH_SALT, issue_tokens, read_token, refresh_lifetime
 User = get_user_model()
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,11 +12,11 @@ class UserSerializer(serializers.ModelSerializer):
         write_only=True,
         required=False
     )
-    full_name = serializers.ReadOnlyField()
+    full_name = serializers.ReadOnlyField(source="get_full_name")
     class Meta:
         model = User
         fields = [
-            "id", "username", "first_name", "middle_name", "last_name", "email",
+            "id", "username", "first_name", "middle_name", "last_name", "full_name", "email",
             "role", "role_id", "role_name", "dimension",
             "created_at", "updated_at"
         ]
@@ -32,10 +33,12 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
     def get_role(self, obj):
-        return obj.groups.first().name if obj.groups.exists() else None
+        group = obj.primary_group
+        return group.name if group else None
 
     def get_role_id(self, obj):
-        return obj.groups.first().id if obj.groups.exists() else None
+        group = obj.primary_group
+        return group.id if group else None
 
     def validate_role_name(self, value):
         try:
@@ -116,26 +119,43 @@ class GroupPermissionUpdateSerializer(serializers.ModelSerializer):
                 "app_label": perm.content_type.app_label,
                 "model": perm.content_type.model,
             }
-            for perm in group.permissions.select_related("content_type").all()
+            for perm in group.permissions.all()
         ]
 
     def validate(self, data):
         all_ids = set(data.get('add_permissions', []) + data.get('remove_permissions', []))
-        invalid = []
-        for perm_id in all_ids:
-            if not Permission.objects.filter(id=perm_id).exists():
-                invalid.append(str(perm_id))
-        if invalid:
-            raise serializers.ValidationError(f"Invalid permission IDs: {', '.join(invalid)}")
+        if all_ids:
+            invalid = all_ids - set(Permission.objects.filter(id__in=all_ids).values_list("id", flat=True))
+            if invalid:
+                raise serializers.ValidationError(f"Invalid permission IDs: {', '.join(map(str, sorted(invalid)))}")
         return data
 
     def update(self, instance, validated_data):
         add_permissions = validated_data.pop("add_permissions", [])
         remove_permissions = validated_data.pop("remove_permissions", [])
 
+        # Ids were checked in validate(); no need to load the Permission rows again
         if add_permissions:
-            instance.permissions.add(*Permission.objects.filter(id__in=add_permissions))
+            instance.permissions.add(*add_permissions)
         if remove_permissions:
-            instance.permissions.remove(*Permission.objects.filter(id__in=remove_permissions))
+            instance.permissions.remove(*remove_permissions)
+
+        return super().update(instance, validated_data)
+
+class TokenObtainSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True, style={"input_type": "password"})
 
-        return super().update(instance, validated_data)
\ No newline at end of file
+    def validate(self, data):
+        " Authenticate against the configured backends (LDAP, then local accounts) "
+        user = authenticate(self.context.get("request"), username=data["username"], password=data["password"])
+        if user is None or not user.is_active:
+            raise serializers.ValidationError("Unable to log in with the provided credentials.")
+        return issue_tokens(user.pk, user.token_version)
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, data):
+        principal = read_token(data["refresh"], REFRESH_SALT, refresh_lifetime())
+        return issue_tokens(principal.user_id, principal.token_version)
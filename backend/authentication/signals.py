@@ -1,8 +1,11 @@
 import logging
-# from django_auth_ldap.backend import populate_user, LDAPBackend
+from django_auth_ldap.backend import populate_user, LDAPBackend
 from django.dispatch import receiver
-from django.db.models.signals import post_save
-from django.contrib.auth.models import User, Group
+from django.db.models.signals import post_save, post_migrate, m2m_changed
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from . import principal
+from .catalog import invalidate_catalog
 
 logger = logging.getLogger("django_auth_ldap")
 
@@ -25,9 +28,56 @@ logger = logging.getLogger("django_auth_ldap")
 #         logger.warning(f"userAccountControl attribute not found for {user.username}")
 #         user.is_active = False  # Default to inactive if missing
 
-@receiver(post_save, sender=User)
-def assign_superuser_group(sender, instance, created, **kwargs):
-    if created and instance.is_superuser:
-        admin_group, _ = Group.objects.get_or_create(name="ADMIN")
-        instance.groups.set([admin_group])
-        instance.save()
+UserModel = get_user_model()
+
+
+@receiver(populate_user, sender=LDAPBackend)
+def skip_unchanged_ldap_user(sender, user, ldap_user, **kwargs):
+    """
+    LDAP logins save the user on every login (AUTH_LDAP_ALWAYS_UPDATE_USER); this runs just
+    before that save and lets it be skipped when the directory attributes changed nothing.
+    Other saves always write.
+    """
+    user._skip_unchanged_save = not user._state.adding and not user.has_changes
+
+
+MEMBERSHIP_ACTIONS = ("post_add", "post_remove", "pre_clear")
+
+
+@receiver(m2m_changed, sender=UserModel.groups.through)
+@receiver(m2m_changed, sender=UserModel.user_permissions.through)
+def invalidate_user_principal(sender, instance, action, reverse, pk_set, **kwargs):
+    """Drop cached principals whose groups or direct permissions changed."""
+    if action not in MEMBERSHIP_ACTIONS:
+        return
+    if not reverse:
+        principal.invalidate([instance.pk])
+    elif action == "pre_clear":
+        principal.invalidate(instance.user_set.values_list("pk", flat=True))
+    else:
+        principal.invalidate(pk_set)
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_principals(sender, instance, action, reverse, pk_set, **kwargs):
+    """Group permissions changed: move every principal to a new cache generation."""
+    if action in MEMBERSHIP_ACTIONS:
+        principal.bump_groups_version()
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_role(sender, instance, created, **kwargs):
+    if not created:
+        principal.invalidate(instance.user_set.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=UserModel)
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    if not created:
+        principal.invalidate([instance.pk])
+
+
+@receiver(post_migrate)
+def invalidate_permission_catalog(sender, **kwargs):
+    " Migrations are the only thing that adds or removes permissions "
+    invalidate_catalog()
@@ -1,3 +1,294 @@
+import itertools
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django_auth_ldap.backend import LDAPBackend, populate_user
+from rest_framework.test import APIClient
+from core.testing import QueryBudgetMixin
+from .directory import DirectorySync
+from .models import User
+from .principal import local_principals, principal_for_id
+from .tokens import ACCESS_SALT, PrincipalUser, access_lifetime, read_token
 
-# Create your tests here.
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    " Every route in authentication/urls.py answers in a constant number of queries "
+    serial = itertools.count()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="budget", email="budget@nbihosp.org", is_superuser=True)
+        cls.group = cls.make_groups(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @classmethod
+    def make_groups(cls, count):
+        " Groups with a few permissions each, from different content types "
+        permissions = list(Permission.objects.order_by("pk")[:30])
+        groups = Group.objects.bulk_create([Group(name=f"BUDGET_{n}") for n in itertools.islice(cls.serial, count)])
+        Group.permissions.through.objects.bulk_create([
+            Group.permissions.through(group=group, permission=permission)
+            for index, group in enumerate(groups) for permission in permissions[index % 10::10]
+        ])
+        return groups
+
+    @classmethod
+    def make_users(cls, count):
+        " Users in their own group each, so role lookups can't be shared between rows "
+        users = User.objects.bulk_create([
+            User(username=f"budget{n}", email=f"budget{n}@nbihosp.org") for n in itertools.islice(cls.serial, count)
+        ])
+        groups = cls.make_groups(count)
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user=user, group=group) for user, group in zip(users, groups)
+        ])
+        return users
+
+    def get(self, url):
+        return lambda: self.client.get(url)
+
+    def test_users(self):
+        self.assertQueryBudget(4, self.get("/auth/users/"), self.make_users)
+        self.assertQueryBudget(3, self.get(f"/auth/users/{self.admin.pk}/"), self.make_users)
+
+    def test_groups(self):
+        self.assertQueryBudget(1, self.get("/auth/groups/"), self.make_groups)
+        self.assertQueryBudget(1, self.get(f"/auth/groups/{self.group.pk}/"), self.make_groups)
+
+    def test_group_permissions(self):
+        self.assertQueryBudget(2, self.get("/auth/permissions/"), self.make_groups)
+        self.assertQueryBudget(2, self.get(f"/auth/permissions/{self.group.pk}/"), self.make_groups)
+        self.assertQueryBudget(0, self.get("/auth/permissions/available-permissions/"), self.make_groups)
+
+    def test_users_are_paged_newest_first(self):
+        User.objects.bulk_create([User(username=f"paged{n}", email=f"paged{n}@nbihosp.org") for n in range(3)])
+        page = self.client.get("/auth/users/", {"page_size": 2}).data
+        ids = [row["id"] for row in page["results"]]
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertEqual(ids[0], User.objects.latest("id").pk)
+        self.assertIsNone(page["previous"])
+        self.assertIsNotNone(page["next"])
+
+
+class GroupPermissionTests(TestCase):
+    " The role editor loads and saves in a constant number of queries "
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="editor", email="editor@nbihosp.org", is_superuser=True)
+        cls.group = QueryBudgetTests.make_groups(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_available_permissions_etag(self):
+        response = self.client.get("/auth/permissions/available-permissions/")
+        self.assertEqual(response.status_code, 200)
+        cached = self.client.get("/auth/permissions/available-permissions/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_update_permissions_is_constant(self):
+        " Same query count whatever the number of permissions submitted "
+        ids = list(Permission.objects.order_by("pk").values_list("pk", flat=True))
+        counts = []
+        for size in (3, 30):
+            group = QueryBudgetTests.make_groups(1)[0]
+            url = f"/auth/permissions/{group.pk}/update-permissions/"
+            payload = {"add_permissions": ids[-size:], "remove_permissions": ids[:size]}
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(url, payload, format="json")
+            self.assertEqual(response.status_code, 200, response.data)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_update_permissions_rejects_unknown_ids(self):
+        response = self.client.post(
+            f"/auth/permissions/{self.group.pk}/update-permissions/", {"add_permissions": [10 ** 6]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(10 ** 6), str(response.data))
+
+    def test_principal_is_one_query_and_follows_group_changes(self):
+        local_principals.clear()
+        member = User.objects.create(username="principal", email="principal@nbihosp.org")
+        with self.assertNumQueries(1):
+            principal = principal_for_id(member.pk)
+        self.assertEqual(principal.role, "USER")
+        with self.assertNumQueries(0):
+            self.assertIs(principal_for_id(member.pk), principal)
+
+        # Membership changes drop the user's entry; group permission changes move every principal on
+        member.groups.set([self.group])
+        self.assertEqual(principal_for_id(member.pk).role, self.group.name)
+        permission = Permission.objects.exclude(group=self.group).select_related("content_type").first()
+        name = f"{permission.content_type.app_label}.{permission.codename}"
+        self.assertFalse(principal_for_id(member.pk).has_perm(name))
+        self.group.permissions.add(permission)
+        self.assertTrue(principal_for_id(member.pk).has_perm(name))
+
+
+class TokenAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username="bearer", email="bearer@nbihosp.org")
+        cls.user.set_password("quarter-close-2025")
+        cls.user.save()
+
+    def setUp(self):
+        cache.clear()
+        local_principals.clear()
+        self.client = APIClient()
+
+    def obtain(self):
+        response = self.client.post("/auth/token/", {"username": "bearer", "password": "quarter-close-2025"}, format="json")
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_wrong_password(self):
+        response = self.client.post("/auth/token/", {"username": "bearer", "password": "nope"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_access_token_authenticates_without_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.obtain()['access']}")
+        self.client.get("/auth/groups/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/auth/groups/")
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query["sql"] for query in queries if "authentication_user" in query["sql"] or "django_session" in query["sql"]])
+
+    def test_forged_and_refresh_tokens_are_rejected_as_access(self):
+        tokens = self.obtain()
+        for token in (tokens["access"][:-2] + "xx", tokens["refresh"]):
+            self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+            self.assertEqual(self.client.get("/auth/groups/").status_code, 401)
+
+    def test_refresh(self):
+        response = self.client.post("/auth/token/refresh/", {"refresh": self.obtain()["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        self.assertEqual(self.client.get("/auth/groups/").status_code, 200)
+
+    def test_request_user_loads_lazily(self):
+        user = PrincipalUser(read_token(self.obtain()["access"], ACCESS_SALT, access_lifetime()))
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.username, user.is_authenticated), (self.user.pk, "bearer", True))
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, "bearer@nbihosp.org")
+
+    def test_revoked_tokens_are_rejected(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        self.assertEqual(self.client.post("/auth/token/revoke/").status_code, 204)
+        self.assertEqual(self.client.get("/auth/groups/").status_code, 401)
+        response = self.client.post("/auth/token/refresh/", {"refresh": tokens["refresh"]}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_password_change_revokes_tokens(self):
+        refresh = self.obtain()["refresh"]
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password("year-end-2025")
+        user.save()
+        response = self.client.post("/auth/token/refresh/", {"refresh": refresh}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_inactive_user_is_rejected(self):
+        access = self.obtain()["access"]
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        cache.clear()
+        local_principals.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        self.assertEqual(self.client.get("/auth/groups/").status_code, 401)
+
+
+class UserSaveTests(TestCase):
+    " LDAP logins save the user every time; only real changes should reach the database "
+
+    def login(self, user, first_name):
+        " What django_auth_ldap does on each login: copy the attributes, send populate_user, save "
+        user.first_name = first_name
+        populate_user.send(LDAPBackend, user=user, ldap_user=None)
+        user.save()
+
+    def test_unchanged_login_is_not_saved(self):
+        user = User.objects.create(username="ldapuser", email="ldapuser@nbihosp.org", first_name="Ward")
+        user = User.objects.get(pk=user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            self.login(user, "Ward")
+        self.assertEqual(len(queries), 0)
+
+        self.login(user, "Theatre")
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, "Theatre")
+
+    def test_other_saves_always_write(self):
+        user = User.objects.create(username="ldapuser", email="ldapuser@nbihosp.org", first_name="Ward")
+        user = User.objects.get(pk=user.pk)
+        with CaptureQueriesContext(connection) as queries:
+            user.save()
+        self.assertTrue([query["sql"] for query in queries if query["sql"].startswith("UPDATE")])
+
+        # A refreshed instance compares against the refreshed row
+        User.objects.filter(pk=user.pk).update(first_name="Theatre")
+        user.refresh_from_db()
+        self.login(user, "Ward")
+        self.assertEqual(User.objects.get(pk=user.pk).first_name, "Ward")
+
+    def test_default_group(self):
+        self.assertEqual(User.objects.create(username="staff", email="staff@nbihosp.org").role, "USER")
+        self.assertEqual(User.objects.create(username="root", email="root@nbihosp.org", is_superuser=True).role, "ADMIN")
+
+
+class DirectorySyncTests(TestCase):
+    " sync_ldap_users batches: fixed queries per page, no writes for unchanged users "
+
+    ATTR_MAP = {"first_name": "givenName", "last_name": "sn", "email": "userPrincipalName"}
+
+    @staticmethod
+    def entry(n, given="Nurse", flags=512):
+        username = f"staff{n}"
+        return (f"CN={username},OU=ALL,DC=nbihosp,DC=org", {
+            "sAMAccountName": [username.encode()], "givenName": [given.encode()], "sn": [str(n).encode()],
+            "userPrincipalName": [f"{username}@nbihosp.org".encode()], "userAccountControl": [str(flags).encode()],
+        })
+
+    def sync(self, entries):
+        sync = DirectorySync("sAMAccountName", self.ATTR_MAP)
+        with CaptureQueriesContext(connection) as queries:
+            sync.sync_batch(entries)
+            sync.deactivate_disabled()
+        return sync, len(queries)
+
+    def test_batch_is_constant(self):
+        Group.objects.get_or_create(name="USER")
+        counts = [self.sync([self.entry(n) for n in range(start, start + size)])[1] for start, size in ((0, 3), (100, 30))]
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(User.objects.get(username="staff101").role, "USER")
+
+    def test_resync_updates_and_deactivates(self):
+        self.sync([self.entry(n) for n in range(5)] + [(None, ["ldap://DomainDnsZones.nbihosp.org/DC=nbihosp,DC=org"])])
+        User.objects.filter(username="staff1").update(username="STAFF1")
+
+        sync = self.sync([self.entry(0, given="Matron"), self.entry(1, flags=514)] + [self.entry(n) for n in range(2, 5)])[0]
+        self.assertEqual((sync.stats["updated"], sync.stats["unchanged"], sync.stats["deactivated"]), (1, 4, 1))
+        self.assertEqual(User.objects.get(username="staff0").first_name, "Matron")
+        self.assertFalse(User.objects.get(username="STAFF1").is_active)
+        self.assertEqual(User.objects.filter(username__iexact="staff1").count(), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            DirectorySync("sAMAccountName", self.ATTR_MAP).sync_batch([self.entry(n) for n in range(2, 5)])
+        self.assertFalse([query["sql"] for query in queries if query["sql"].startswith(("INSERT", "UPDATE"))])
+
+    def test_disabled_entry_without_email_is_deactivated(self):
+        self.sync([self.entry(0)])
+        dn, attrs = self.entry(0, flags=514)
+        del attrs["userPrincipalName"]
+        sync = self.sync([(dn, attrs)])[0]
+        self.assertEqual((sync.stats["skipped"], sync.stats["deactivated"]), (1, 1))
+        self.assertFalse(User.objects.get(username="staff0").is_active)
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import F
+from django.utils.functional import SimpleLazyObject
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+from .principal import invalidate, principal_for_id
+
+ACCESS_SALT = "authentication.tokens.access"
+REFRESH_SALT = "authentication.tokens.refresh"
+KEYWORD = b"bearer"
+
+
+def access_lifetime():
+    return getattr(settings, "ACCESS_TOKEN_LIFETIME", 15 * 60)
+
+
+def refresh_lifetime():
+    return getattr(settings, "REFRESH_TOKEN_LIFETIME", 7 * 24 * 60 * 60)
+
+
+def issue_tokens(user_id, token_version=0):
+    """
+    Signed, timestamped access and refresh tokens for an authenticated user. Both carry the
+    user's token version, so ``revoke_tokens`` invalidates every pair issued before it. A
+    refresh token is not single-use: it can be exchanged again until it expires or is revoked.
+    """
+    payload = {"uid": user_id, "ver": token_version}
+    return {
+        "access": signing.dumps(payload, salt=ACCESS_SALT),
+        "refresh": signing.dumps(payload, salt=REFRESH_SALT),
+        "access_expires_in": access_lifetime(),
+        "refresh_expires_in": refresh_lifetime(),
+    }
+
+
+def read_token(token, salt, max_age):
+    """
+    The principal of the user ``token`` was issued to; raises AuthenticationFailed when it is
+    forged, expired or revoked, or the user is inactive or deleted.
+    """
+    try:
+        payload = signing.loads(token, salt=salt, max_age=max_age)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed("Token has expired.")
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    principal = principal_for_id(payload["uid"])
+    if not principal.is_authenticated or not principal.is_active:
+        raise exceptions.AuthenticationFailed("User inactive or deleted.")
+    if payload.get("ver", 0) != principal.token_version:
+        raise exceptions.AuthenticationFailed("Token has been revoked.")
+    return principal
+
+
+def revoke_tokens(user_id):
+    """
+    Invalidate every token issued to the user so far. Other processes notice once their
+    in-process principal expires (PRINCIPAL_LOCAL_CACHE_TTL).
+    """
+    User = get_user_model()
+    User.objects.filter(pk=user_id).update(token_version=F("token_version") + 1)
+    invalidate([user_id])
+
+
+class PrincipalUser(SimpleLazyObject):
+    """
+    request.user for bearer requests. pk, the auth flags and permission checks are answered
+    from the cached principal, so authenticating and most permission checks never load the
+    user row; any other attribute (email, names, save(), use as a foreign key value) loads
+    the real user on first access.
+    """
+    def __init__(self, principal):
+        def load():
+            user = get_user_model().objects.get(pk=principal.user_id)
+            user._principal_cache = principal
+            return user
+
+        super().__init__(load)
+        # Set on the proxy itself; plain assignment would load and set it on the user
+        self.__dict__["_principal_cache"] = principal
+
+    pk = id = property(lambda self: self._principal_cache.user_id)
+    username = property(lambda self: self._principal_cache.username)
+    is_active = property(lambda self: self._principal_cache.is_active)
+    is_staff = property(lambda self: self._principal_cache.is_staff)
+    is_superuser = property(lambda self: self._principal_cache.is_superuser)
+    dimension_id = property(lambda self: self._principal_cache.dimension_id)
+    is_authenticated = True
+    is_anonymous = False
+
+    def __bool__(self):
+        # IsAuthenticated tests ``request.user`` for truth before anything else
+        return True
+
+    def has_perm(self, perm, obj=None):
+        return self._principal_cache.has_perm(perm)
+
+    def has_perms(self, perm_list, obj=None):
+        return all(self.has_perm(perm, obj) for perm in perm_list)
+
+    def has_module_perms(self, app_label):
+        principal = self._principal_cache
+        if not principal.is_active:
+            return False
+        return principal.is_superuser or any(perm.startswith(f"{app_label}.") for perm in principal.permissions)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    ``Authorization: Bearer <access token>``.
+
+    The token is checked by signature and age alone, and the user comes from the cached
+    principal (in-process LRU, then the shared cache), so a request with a warm principal
+    costs no queries to authenticate.
+    """
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != KEYWORD:
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid Authorization header. Expected 'Bearer <token>'.")
+
+        principal = read_token(auth[1].decode(), ACCESS_SALT, access_lifetime())
+        return PrincipalUser(principal), None
+
+    def authenticate_header(self, request):
+        return "Bearer"
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . views import UserViewSet, CreateGroupViewSet, GroupViewSet
+from . views import UserViewSet, CreateGroupViewSet, GroupViewSet, TokenObtainView, TokenRefreshView, TokenRevokeView
 
 router = DefaultRouter()
 router.register("users", UserViewSet, basename="user")
@@ -9,4 +9,8 @@ router.register("permissions", GroupViewSet, basename="permission")
 
 app_name = "authentication"
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path("token/", TokenObtainView.as_view(), name="token"),
+    path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
+    path("token/revoke/", TokenRevokeView.as_view(), name="token-revoke"),
+] + router.urls
\ No newline at end of file
@@ -1,27 +1,35 @@
-from .serializers import ( UserSerializer, GroupPermissionUpdateSerializer, GroupCreateSerializer )
+from .serializers import (
+    UserSerializer, GroupPermissionUpdateSerializer, GroupCreateSerializer, TokenObtainSerializer, TokenRefreshSerializer
+)
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.views import APIView
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
-from collections import defaultdict
 from drf_spectacular.utils import extend_schema
 from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response, patch_cache_control
+from .catalog import get_catalog
+from .tokens import revoke_tokens
+from core.conditional import ConditionalGetMixin
+from core.profiling import ProfilingMixin
+from core.pagination import NewestCursorPagination
 
 
 @extend_schema(tags=["Users"])
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, DjangoModelPermissions]
     serializer_class = UserSerializer
-    pagination = None
+    pagination_class = NewestCursorPagination
+    last_modified_fields = ("updated_at",)
 
     def get_queryset(self):
         # Exclude the anonymous user created by django-guardian
-        qs = (User.objects.select_related("support_level").prefetch_related("groups").exclude(username="AnonymousUser").order_by("id"))
-        return qs.exclude(username="AnonymousUser").order_by("id")
+        return User.objects.select_related("dimension").prefetch_related("groups").exclude(username="AnonymousUser")
     
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -38,7 +46,7 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @extend_schema(tags=["Groups"])
-class CreateGroupViewSet(viewsets.ModelViewSet):
+class CreateGroupViewSet(ProfilingMixin, viewsets.ModelViewSet):
     queryset = Group.objects.all().order_by("id") 
     serializer_class = GroupCreateSerializer
     permission_classes = [IsAuthenticated]
@@ -58,15 +66,17 @@ class CreateGroupViewSet(viewsets.ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
 @extend_schema(tags=["Groups"])
-class GroupViewSet(viewsets.ModelViewSet):
-    queryset = Group.objects.all().order_by("id") 
+class GroupViewSet(ProfilingMixin, viewsets.ModelViewSet):
+    queryset = Group.objects.prefetch_related(
+        Prefetch("permissions", queryset=Permission.objects.select_related("content_type"))
+    ).order_by("id")
     serializer_class = GroupPermissionUpdateSerializer
     permission_classes = [IsAuthenticated]
 
     @action(detail=True, methods=["post"], url_path="update-permissions")
     def update_permissions(self, request, pk=None):
         group = self.get_object()
-        serializer = self.get_serializer(data=request.data)
+        serializer = self.get_serializer(group, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.update(group, serializer.validated_data)
         return Response(
@@ -76,20 +86,43 @@ class GroupViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=["get"], url_path="available-permissions")
     def list_permissions(self, request):
-        permissions = Permission.objects.select_related("content_type").all()
-        grouped = defaultdict(list)
-
-        for perm in permissions:
-            key = f"{perm.content_type.app_label}.{perm.content_type.model}"
-            grouped[key].append({
-                "id": perm.id,
-                "codename": perm.codename,
-                "name": perm.name,
-            })
-
-        return Response(grouped, status=status.HTTP_200_OK)
-
+        " The permission catalog, built once and revalidated with its ETag "
+        etag, catalog = get_catalog()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(catalog, status=status.HTTP_200_OK)
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+@extend_schema(tags=["Auth"], request=TokenObtainSerializer)
+class TokenObtainView(APIView):
+    " Exchange username / password for a short-lived access token and a refresh token "
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request):
+        serializer = TokenObtainSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
+@extend_schema(tags=["Auth"], request=TokenRefreshSerializer)
+class TokenRefreshView(APIView):
+    " Exchange a refresh token for a new token pair "
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
 
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
 
+@extend_schema(tags=["Auth"], request=None, responses={204: None})
+class TokenRevokeView(APIView):
+    " Sign the current user out of every access and refresh token issued so far "
+    permission_classes = [IsAuthenticated]
 
+    def post(self, request):
+        revoke_tokens(request.user.pk)
+        return Response(status=status.HTTP_204_NO_CONTENT)
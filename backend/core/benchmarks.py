@@ -0,0 +1,9 @@
+import math
+
+
+def percentile(values, pct):
+    " Nearest-rank percentile: the smallest value with at least ``pct`` percent of the samples at or below it "
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
@@ -0,0 +1,76 @@
+import hashlib
+from django.db.models import Count, Max
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def related_value(instance, lookup):
+    " Follow a ``created_by__updated_at`` style lookup through an instance; None past an empty relation "
+    for name in lookup.split(LOOKUP_SEP):
+        if instance is None:
+            return None
+        instance = getattr(instance, name)
+    return instance
+
+
+class ConditionalGetMixin:
+    """
+    ETag support for ``list`` and ``retrieve``, plus Last-Modified on ``retrieve``.
+
+    Lists are validated with one aggregate (row count plus the newest value of each
+    ``last_modified_fields`` column) over the same scoped, filtered queryset the list
+    would serialize; details with the object's own timestamps. When the client's
+    validators still match, a 304 is returned before anything is serialized.
+
+    Lists carry no Last-Modified: deleting a row leaves the newest timestamp unchanged,
+    so only the ETag, which also hashes the row count, notices.
+
+    Only the listed columns are watched, so a view whose serializer renders data from
+    related rows (e.g. a creator's name) must list those rows' timestamps too, as
+    forward lookups such as ``created_by__updated_at``. Details follow them through the
+    instance, so select_related them.
+    """
+    last_modified_fields = ("modified_at",)
+
+    def _validators(self, kind, state):
+        user_id = getattr(self.request.user, "pk", None)
+        parts = [self.__class__.__name__, kind, str(user_id), self.request.META.get("QUERY_STRING", "")]
+        parts += [f"{key}={value.isoformat() if hasattr(value, 'isoformat') else value}" for key, value in sorted(state.items())]
+        etag = quote_etag(hashlib.sha1("|".join(parts).encode()).hexdigest())
+        timestamps = [value for key, value in state.items() if key in self.last_modified_fields and value]
+        last_modified = int(max(timestamps).timestamp()) if timestamps else None
+        return etag, last_modified
+
+    def get_list_validators(self, queryset):
+        state = queryset.order_by().aggregate(
+            count=Count("pk"), **{field: Max(field) for field in self.last_modified_fields}
+        )
+        etag, _ = self._validators("list", state)
+        return etag, None
+
+    def get_object_validators(self, instance):
+        state = {field: related_value(instance, field) for field in self.last_modified_fields}
+        state["pk"] = instance.pk
+        return self._validators("detail", state)
+
+    def _conditional(self, request, etag, last_modified, respond):
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = respond()
+        response["ETag"] = etag
+        if last_modified:
+            response["Last-Modified"] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization", "Cookie"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        etag, last_modified = self.get_list_validators(self.filter_queryset(self.get_queryset()))
+        return self._conditional(request, etag, last_modified, lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag, last_modified = self.get_object_validators(instance)
+        return self._conditional(request, etag, last_modified, lambda: Response(self.get_serializer(instance).data))
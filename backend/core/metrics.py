@@ -0,0 +1,79 @@
+import ipaddress
+import os
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest
+from prometheus_client import multiprocess
+
+# With several workers in one container, point PROMETHEUS_MULTIPROC_DIR at a directory
+# shared by all of them (and emptied on container start); every worker then writes its
+# samples there and /metrics aggregates the whole container.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Buckets in seconds, tight around the sub-second range the API normally answers in
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "pt_http_request_duration_seconds", "Request latency by route and method",
+    ["route", "method"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    "pt_http_requests", "Requests by route, method and status code", ["route", "method", "status"],
+)
+IN_FLIGHT = Gauge(
+    "pt_http_requests_in_flight", "Requests currently being handled", multiprocess_mode="livesum",
+)
+DB_QUERIES = Counter(
+    "pt_db_queries", "SQL statements executed, by route and method", ["route", "method"],
+)
+DB_DURATION = Counter(
+    "pt_db_query_duration_seconds", "Time spent in SQL, by route and method", ["route", "method"],
+)
+APPROVAL_TRANSITIONS = Counter(
+    "pt_approval_transitions", "Approval workflow transitions by outcome", ["transition", "outcome"],
+)
+CACHE_LOOKUPS = Counter(
+    "pt_cache_lookups", "Cache lookups by cache and result (hit / miss)", ["cache", "result"],
+)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+def route_label(request):
+    " The URL pattern rather than the path, so ids don't explode the label set "
+    match = getattr(request, "resolver_match", None)
+    return match.route if match else UNMATCHED_ROUTE
+
+
+def observe_request(request, response, timing, duration):
+    route, method = route_label(request), request.method
+    REQUEST_LATENCY.labels(route, method).observe(duration)
+    REQUESTS.labels(route, method, str(response.status_code)).inc()
+    DB_QUERIES.labels(route, method).inc(timing.queries.count)
+    DB_DURATION.labels(route, method).inc(timing.queries.duration)
+
+
+def cache_lookup(name, hit):
+    CACHE_LOOKUPS.labels(name, "hit" if hit else "miss").inc()
+
+
+def scrape_allowed(request):
+    " Only METRICS_ALLOWED_IPS, or a request bearing METRICS_TOKEN, may read /metrics "
+    token = settings.METRICS_TOKEN
+    if token and constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def render():
+    " Return (body, content type) in the Prometheus text exposition format "
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
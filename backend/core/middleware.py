@@ -0,0 +1,145 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+from . import metrics
+
+logger = logging.getLogger("core.timing")
+
+
+class QueryTimer:
+    " execute_wrapper that counts queries and accumulates their wall time "
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.start = time.perf_counter()
+        self.view_start = None
+        self.view_end = None
+        self.db_at_view_start = 0.0
+        self.db_at_view_end = None
+        self.view_name = None
+        self.action = None
+
+    def phases(self, end):
+        " Split the request into milliseconds spent in SQL, in the view outside SQL, and rendering "
+        total = end - self.start
+        db = self.queries.duration
+        serialize = render = 0.0
+        if self.view_start is not None:
+            view_end = self.view_end or end
+            db_at_view_end = db if self.db_at_view_end is None else self.db_at_view_end
+            serialize = max(view_end - self.view_start - (db_at_view_end - self.db_at_view_start), 0.0)
+            if self.view_end is not None:
+                render = max(end - self.view_end - (db - db_at_view_end), 0.0)
+        return {
+            "db": db * 1000,
+            "serialize": serialize * 1000,
+            "render": render * 1000,
+            "total": total * 1000,
+        }
+
+
+class RequestTimingMiddleware:
+    """
+    Per-request instrumentation: query count, SQL time, time spent in the view outside
+    SQL (for these DRF viewsets that is serialization), render time and total time.
+
+    The numbers are sent back as a ``Server-Timing`` header and logged as one JSON line
+    on the ``core.timing`` logger, tagged with the DRF viewset and action. Overhead is a
+    few clock reads per query, so it is meant to stay on in production; set
+    REQUEST_TIMING_ENABLED = False to switch it off. The same numbers feed the
+    Prometheus histograms and counters in core.metrics.
+
+    A streamed body runs its queries after the headers have gone out, so streaming
+    responses get no Server-Timing header; queries keep being counted while the body is
+    sent, and the log line and metrics are written once it has been.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "REQUEST_TIMING_ENABLED", True)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        timing = request._timing = RequestTiming()
+        with metrics.IN_FLIGHT.track_inprogress(), ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing.queries))
+            response = self.get_response(request)
+        # Files handed to the server's file wrapper and async bodies are sent outside this code
+        if response.streaming and getattr(response, "file_to_stream", None) is None and not getattr(response, "is_async", False):
+            response.streaming_content = self.stream(request, response, timing, response.streaming_content)
+        else:
+            self.finish(request, response, timing)
+        return response
+
+    def stream(self, request, response, timing, content):
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.queries))
+                yield from content
+        finally:
+            self.finish(request, response, timing)
+
+    def finish(self, request, response, timing):
+        end = time.perf_counter()
+        phases = timing.phases(end)
+        metrics.observe_request(request, response, timing, end - timing.start)
+
+        if not response.streaming:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={phases["db"]:.1f};desc="{timing.queries.count} queries"',
+                f'serialize;dur={phases["serialize"]:.1f}',
+                f'render;dur={phases["render"]:.1f}',
+                f'total;dur={phases["total"]:.1f}',
+            ])
+        self.log(request, response, timing, phases)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, "_timing", None)
+        if timing is None:
+            return None
+        view_class = getattr(view_func, "cls", None)
+        timing.view_name = view_class.__name__ if view_class else getattr(view_func, "__name__", None)
+        timing.action = (getattr(view_func, "actions", None) or {}).get(request.method.lower())
+        timing.view_start = time.perf_counter()
+        timing.db_at_view_start = timing.queries.duration
+        return None
+
+    def process_template_response(self, request, response):
+        " Called after the view returns and before the response is rendered "
+        timing = getattr(request, "_timing", None)
+        if timing is not None:
+            timing.view_end = time.perf_counter()
+            timing.db_at_view_end = timing.queries.duration
+        return response
+
+    def log(self, request, response, timing, phases):
+        match = getattr(request, "resolver_match", None)
+        logger.info(json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "route": match.route if match else None,
+            "status": response.status_code,
+            "view": timing.view_name,
+            "action": timing.action,
+            "queries": timing.queries.count,
+            **{f"{name}_ms": round(value, 2) for name, value in phases.items()},
+        }))
@@ -0,0 +1,25 @@
+from rest_framework.pagination import CursorPagination
+
+
+class NewestCursorPagination(CursorPagination):
+    """
+    Keyset pagination over id, newest first.
+
+    The cursor must follow an immutable, unique key: a row whose modified_at changed while a
+    client was paging would jump to the front and be skipped by the pages still to come.
+    """
+    ordering = ("-id",)
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+class RequestedCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (requested_at, id), newest first. requested_at never changes
+    once an entry is written; entries sharing a timestamp are told apart by the cursor's offset.
+    """
+    ordering = ("-requested_at", "-id")
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
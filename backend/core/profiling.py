@@ -0,0 +1,182 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from rest_framework.permissions import BasePermission
+from authentication.principal import get_principal
+
+PROFILE_PARAM = "profile"
+PROFILER_ROLES = {"SYSTEM_ADMIN", "ADMIN"}
+
+
+def profile_dir():
+    return getattr(settings, "PROFILE_DIR", os.path.join(settings.BASE_DIR, "logs/profiles"))
+
+
+def may_profile(request):
+    principal = get_principal(request)
+    return principal.is_active and (principal.is_superuser or principal.role in PROFILER_ROLES)
+
+
+class IsProfilerAdmin(BasePermission):
+    " SYSTEM_ADMIN / ADMIN group members and superusers "
+    def has_permission(self, request, view):
+        return may_profile(request)
+
+
+class StackSampler(threading.Thread):
+    " Samples one thread's Python stack every ``interval`` seconds "
+    def __init__(self, thread_id, interval):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+class QueryRecorder:
+    " execute_wrapper keeping each statement, its parameters and duration "
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, None if many else params, time.perf_counter() - start))
+
+
+class RequestProfile:
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.recorder = QueryRecorder()
+        self.sampler = StackSampler(threading.get_ident(), getattr(settings, "PROFILE_SAMPLE_INTERVAL", 0.005))
+        self.stack = ExitStack()
+        self.start = time.perf_counter()
+
+    def begin(self):
+        self.stack.enter_context(connection.execute_wrapper(self.recorder))
+        self.sampler.start()
+
+    def end(self):
+        self.sampler.stop()
+        self.stack.close()
+        self.duration = time.perf_counter() - self.start
+
+    def explain(self, limit):
+        " Re-run the slowest SELECTs under EXPLAIN (ANALYZE, BUFFERS), inside a rolled back savepoint "
+        if connection.vendor != "postgresql" or connection.needs_rollback:
+            return []
+        selects = [query for query in self.recorder.queries if query[0].lstrip().upper().startswith("SELECT") and query[1] is not None]
+        plans = []
+        for sql, params, duration in sorted(selects, key=lambda query: query[2], reverse=True)[:limit]:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                    transaction.set_rollback(True)
+            except DatabaseError as exc:
+                plan = f"EXPLAIN failed: {exc}"
+            plans.append({"sql": sql, "duration_ms": round(duration * 1000, 2), "plan": plan})
+        return plans
+
+    def report(self, request, response, view):
+        queries = self.recorder.queries
+        leaves = Counter()
+        for stack, count in self.sampler.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        return {
+            "id": self.id,
+            "created_at": timezone.now().isoformat(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "user": getattr(request.user, "username", None),
+            "view": view.__class__.__name__,
+            "action": getattr(view, "action", None),
+            "status": response.status_code,
+            "duration_ms": round(self.duration * 1000, 2),
+            "cpu": {
+                "interval_ms": self.sampler.interval * 1000,
+                "samples": sum(self.sampler.stacks.values()),
+                "hot_frames": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(30)],
+                "stacks": [{"stack": stack, "samples": count} for stack, count in self.sampler.stacks.most_common(100)],
+            },
+            "sql": {
+                "count": len(queries),
+                "duration_ms": round(sum(query[2] for query in queries) * 1000, 2),
+                "queries": [{"sql": sql, "duration_ms": round(duration * 1000, 2)} for sql, params, duration in queries],
+            },
+            "explain": self.explain(getattr(settings, "PROFILE_EXPLAIN_LIMIT", 3)),
+        }
+
+
+def save_report(report):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{report['id']}.json"), "w") as file:
+        json.dump(report, file, default=str)
+
+
+def load_report(profile_id):
+    path = os.path.join(profile_dir(), f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+class ProfilingMixin:
+    """
+    Append ``?profile`` to any request to get back a sampled CPU profile of the view, every
+    SQL statement with its timing and EXPLAIN (ANALYZE, BUFFERS) of the slowest SELECTs.
+
+    Only SYSTEM_ADMIN / ADMIN group members and superusers can profile. The report is
+    returned under ``profile`` next to the normal payload (as ``data``) and stored in
+    PROFILE_DIR; its id is sent in the X-Profile-Id header. Without the flag the only
+    cost is one query string lookup.
+    """
+    _profile = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if PROFILE_PARAM in request._request.GET and may_profile(request):
+            self._profile = RequestProfile()
+            self._profile.begin()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        profile = self._profile
+        if profile is None:
+            return super().finalize_response(request, response, *args, **kwargs)
+
+        self._profile = None
+        profile.end()
+        report = profile.report(request, response, self)
+        save_report(report)
+        if getattr(response, "data", None) is not None and not response.streaming:
+            response.data = {"data": response.data, "profile": report}
+        response = super().finalize_response(request, response, *args, **kwargs)
+        response["X-Profile-Id"] = profile.id
+        return response
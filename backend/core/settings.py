@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.middleware.RequestTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -76,6 +77,26 @@ DATABASES = {
     },
 }
 
+# Caches
+# Use a shared backend (e.g. CACHE_URL=rediscache://redis:6379/1) so cached request
+# principals are invalidated across every worker process.
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+PRINCIPAL_CACHE_TIMEOUT = env.int("PRINCIPAL_CACHE_TIMEOUT", default=300)
+
+# Server-Timing header and per-request timing log (logs/timing.log)
+REQUEST_TIMING_ENABLED = env.bool("REQUEST_TIMING_ENABLED", default=True)
+
+# /metrics answers only these addresses / networks, or a scraper sending
+# "Authorization: Bearer <METRICS_TOKEN>" when a token is set
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=["127.0.0.1", "::1"])
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# On-demand ?profile reports (core.profiling), admins only
+PROFILE_DIR = env("PROFILE_DIR", default=os.path.join(BASE_DIR, "logs/profiles"))
+PROFILE_SAMPLE_INTERVAL = env.float("PROFILE_SAMPLE_INTERVAL", default=0.005)
+PROFILE_EXPLAIN_LIMIT = env.int("PROFILE_EXPLAIN_LIMIT", default=3)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -89,7 +110,7 @@ AUTH_PASSWORD_VALIDATORS = [
 # Enable LDAP Authentication Backend
 AUTHENTICATION_BACKENDS = [
     "django_auth_ldap.backend.LDAPBackend",  # LDAP authentication
-    "django.contrib.auth.backends.ModelBackend",  # Default Django auth (for superusers)
+    "authentication.backends.CachedModelBackend",  # Default Django auth (for superusers), permissions served from the principal cache
 ]
 # LDAP Server Configuration
 # LDAP Server URI
@@ -110,6 +131,10 @@ AUTH_LDAP_USER_ATTR_MAP = {
 }
 # Alow creating Django user records on first login
 AUTH_LDAP_ALWAYS_UPDATE_USER = True
+# Cache username -> DN searches (and group lookups) so a login is one bind plus one
+# base-scope attribute read instead of a two-base subtree search. User.save skips the
+# write when the refreshed attributes didn't change anything.
+AUTH_LDAP_CACHE_TIMEOUT = env.int("AUTH_LDAP_CACHE_TIMEOUT", default=3600)
 # Internationalization
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "Africa/Nairobi"
@@ -123,6 +148,18 @@ STATIC_ROOT = BASE_DIR / 'static'
 # Media files (for file uploads)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / 'media'
+# Evidence is stored once per content hash under MEDIA_ROOT/evidence; resumable uploads
+# are assembled in EVIDENCE_UPLOAD_DIR (keep it on the same filesystem so finishing is a rename)
+EVIDENCE_UPLOAD_DIR = env("EVIDENCE_UPLOAD_DIR", default=os.path.join(MEDIA_ROOT, "uploads"))
+EVIDENCE_MAX_SIZE = env.int("EVIDENCE_MAX_SIZE", default=100 * 1024 * 1024)
+EVIDENCE_MAX_CHUNK_SIZE = env.int("EVIDENCE_MAX_CHUNK_SIZE", default=8 * 1024 * 1024)
+# Outside DEBUG, evidence downloads are handed to nginx (X-Accel-Redirect to its internal
+# /protected-media/ location, which serves MEDIA_ROOT with Range support)
+EVIDENCE_ACCEL_REDIRECT = env.bool("EVIDENCE_ACCEL_REDIRECT", default=not DEBUG)
+EVIDENCE_ACCEL_PREFIX = env("EVIDENCE_ACCEL_PREFIX", default="/protected-media/")
+# Thumbnails / first-page previews are rendered by a per-process thread pool (PDFs need poppler's pdftoppm)
+EVIDENCE_PREVIEW_WORKERS = env.int("EVIDENCE_PREVIEW_WORKERS", default=2)
+EVIDENCE_PREVIEW_TIMEOUT = env.int("EVIDENCE_PREVIEW_TIMEOUT", default=30)
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -132,9 +169,20 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        # Signed bearer tokens from /auth/token/: no session or user query per request
+        'authentication.tokens.SignedTokenAuthentication',
+        'rest_framework.authentication.SessionAuthentication',
+    ],
 }
 
+# Signed access / refresh tokens (authentication.tokens), lifetimes in seconds
+ACCESS_TOKEN_LIFETIME = env.int("ACCESS_TOKEN_LIFETIME", default=15 * 60)
+REFRESH_TOKEN_LIFETIME = env.int("REFRESH_TOKEN_LIFETIME", default=7 * 24 * 60 * 60)
+# Per-process LRU of request principals in front of the shared cache
+PRINCIPAL_LOCAL_CACHE_SIZE = env.int("PRINCIPAL_LOCAL_CACHE_SIZE", default=1024)
+PRINCIPAL_LOCAL_CACHE_TTL = env.int("PRINCIPAL_LOCAL_CACHE_TTL", default=30)
+
 AUTH_USER_MODEL="authentication.User"
 
 
@@ -159,6 +207,11 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'timing': {
+            'format': '{asctime} {message}',
+            'style': '{',
+            'datefmt': '%Y-%m-%d %H:%M:%S',
+        },
     },
     'handlers': {
         # Console handler for development
@@ -178,6 +231,13 @@ LOGGING = {
             "level": LOG_LEVEL,
             "class": "logging.StreamHandler",
         },
+        # One JSON line per request from core.middleware.RequestTimingMiddleware
+        'timing': {
+            'level': 'INFO',
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(BASE_DIR, 'logs/timing.log'),
+            'formatter': 'timing',
+        },
     },
     'loggers': {
         'django': {
@@ -200,5 +260,10 @@ LOGGING = {
             "level": LOG_LEVEL,
             "propagate": True,
         },
+        'core.timing': {
+            'handlers': ['timing'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
\ No newline at end of file
@@ -0,0 +1,57 @@
+import re
+from collections import Counter
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+QUERY_BUDGET_N = 3
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+
+
+def query_shape(sql):
+    " Collapse literals and IN lists so queries that only differ by parameters compare equal "
+    sql = _NUMBER.sub("?", _STRING.sub("?", sql))
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+class QueryBudgetMixin:
+    """
+    Asserts that an endpoint's query count does not grow with the data it serves.
+
+    ``seed(count)`` adds ``count`` more rows of whatever the endpoint lists. The request
+    is measured after seeding N rows and again after growing to 10N; both counts must be
+    equal and within ``budget``. On failure the message lists the query shapes that
+    repeated, which is where the N+1 lives.
+    """
+    query_budget_n = QUERY_BUDGET_N
+
+    def capture_queries(self, make_request):
+        " Warm the per-process caches, then capture one request "
+        make_request()
+        with CaptureQueriesContext(connection) as queries:
+            response = make_request()
+            if response.streaming:
+                b"".join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, "data", response))
+        return [query["sql"] for query in queries.captured_queries]
+
+    def assertQueryBudget(self, budget, make_request, seed):
+        n = self.query_budget_n
+        seed(n)
+        small = self.capture_queries(make_request)
+        seed(9 * n)
+        large = self.capture_queries(make_request)
+
+        if len(small) == len(large) and len(large) <= budget:
+            return
+        small_shapes, large_shapes = Counter(map(query_shape, small)), Counter(map(query_shape, large))
+        repeated = [
+            f"  {small_shapes[shape]} -> {count}x  {shape}"
+            for shape, count in large_shapes.most_common() if count > 1 or count > small_shapes[shape]
+        ]
+        self.fail(
+            f"{len(small)} queries with N={n}, {len(large)} with N={10 * n} (budget {budget}).\n"
+            + ("Repeated query shapes (N -> 10N):\n" + "\n".join(repeated) if repeated else "No query repeated.")
+        )
@@ -3,13 +3,19 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from rest_framework.routers import SimpleRouter
+from .views import ProfileViewSet, health, metrics_view
 
-
+router = SimpleRouter()
+router.register("profiles", ProfileViewSet, basename="profile")
 
 urlpatterns = [
+    path("health/", health, name="health"),
+    path("metrics", metrics_view, name="metrics"),
     path("admin/", admin.site.urls),
     path("posts/", include("posts.urls")),
     path("auth/", include("authentication.urls")),
+    path("", include(router.urls)),
 ]
 
 if settings.DEBUG:
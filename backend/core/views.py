@@ -1,5 +1,11 @@
-from django.http import HttpResponse, JsonResponse
+import os
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.db import connection
+from rest_framework import viewsets
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from . import metrics
+from .profiling import IsProfilerAdmin, load_report, profile_dir
 
 def health(request):
     try:
@@ -12,3 +18,35 @@ def health(request):
         'status': 'ok' if db_ok else 'degraded',
         'db': db_ok,
     })
+
+
+def metrics_view(request):
+    " Prometheus scrape endpoint; aggregates all workers when PROMETHEUS_MULTIPROC_DIR is set "
+    if not metrics.scrape_allowed(request):
+        return HttpResponseForbidden()
+    body, content_type = metrics.render()
+    return HttpResponse(body, content_type=content_type)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    " Stored ?profile reports, newest first "
+    permission_classes = [IsProfilerAdmin]
+    lookup_value_regex = "[0-9a-f]{32}"
+
+    def list(self, request):
+        directory = profile_dir()
+        names = [name for name in os.listdir(directory) if name.endswith(".json")] if os.path.isdir(directory) else []
+        names.sort(key=lambda name: os.path.getmtime(os.path.join(directory, name)), reverse=True)
+        summaries = []
+        for name in names[:100]:
+            report = load_report(name.removesuffix(".json"))
+            summaries.append({
+                key: report[key] for key in ("id", "created_at", "method", "path", "user", "view", "action", "status", "duration_ms")
+            })
+        return Response(summaries)
+
+    def retrieve(self, request, pk=None):
+        report = load_report(pk)
+        if report is None:
+            raise NotFound("Profile not found.")
+        return Response(report)
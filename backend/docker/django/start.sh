@@ -9,6 +9,13 @@ fi
 
 PROCESS_TYPE=$1
 
+# Workers share this directory so /metrics reports the whole container; stale samples
+# from a previous run must not leak into the new one
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 if [ "$PROCESS_TYPE" = "backend" ]; then
     if [ "$DEBUG" = "True" ]; then
         echo ""
@@ -16,5 +23,7 @@ if [ "$PROCESS_TYPE" = "backend" ]; then
         echo ""
         python manage.py runserver \
             0.0.0.0:8000
+    else
+        gunicorn core.wsgi:application -c gunicorn.conf.py
     fi
 fi
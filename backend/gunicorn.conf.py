@@ -0,0 +1,14 @@
+import multiprocessing
+import os
+
+bind = "0.0.0.0:8000"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+accesslog = "-"
+
+
+def child_exit(server, worker):
+    " Drop a dead worker's live gauges from the shared PROMETHEUS_MULTIPROC_DIR "
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,251 @@
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.http import FileResponse, HttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.encoding import iri_to_uri
+from django.utils.http import content_disposition_header, quote_etag
+from rest_framework import serializers
+from .models import EvidenceBlob, EvidenceUpload, InitiativeAction
+from . import previews
+
+BLOCK_SIZE = 1024 * 1024
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class PartFile(File):
+    " Lets FileSystemStorage move a finished part into place instead of copying it "
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def part_path(upload):
+    return os.path.join(settings.EVIDENCE_UPLOAD_DIR, f"{upload.pk}.part")
+
+
+def blob_name(sha256, filename):
+    " evidence/ab/cd/<sha256>.<ext>: fanned out so no directory grows too large "
+    extension = os.path.splitext(filename)[1].lower()
+    return f"evidence/{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}"
+
+
+def file_sha256(path, digest=None, offset=0):
+    " Hash a file from disk block by block, or only its bytes past ``offset`` into ``digest`` "
+    digest = hashlib.sha256() if digest is None else digest
+    with open(path, "rb") as file:
+        file.seek(offset)
+        for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RunningDigests:
+    """
+    SHA-256 state of the uploads in progress in this process, as (offset, digest). Chunks
+    arrive in order, so each one carries the digest forward while it streams in and the
+    upload is finished without reading the file back. hashlib state can't be stored, so a
+    chunk received by another process leaves this one behind; finishing then hashes only
+    the bytes past the last offset this process saw.
+    """
+    def __init__(self, limit=1024):
+        self.lock = threading.Lock()
+        self.limit = limit
+        self.digests = OrderedDict()
+
+    def resume(self, upload_id, offset):
+        " A copy of the digest of the first ``offset`` bytes, or None when this process doesn't have it "
+        with self.lock:
+            stored = self.digests.get(upload_id)
+        if stored and stored[0] == offset:
+            return stored[1].copy()
+        return hashlib.sha256() if offset == 0 else None
+
+    def save(self, upload_id, offset, digest):
+        with self.lock:
+            self.digests[upload_id] = (offset, digest)
+            self.digests.move_to_end(upload_id)
+            while len(self.digests) > self.limit:
+                self.digests.popitem(last=False)
+
+    def finish(self, upload_id, path):
+        " The hex digest of the whole file, hashing from disk only what this process didn't see "
+        with self.lock:
+            offset, digest = self.digests.pop(upload_id, (0, None))
+        return file_sha256(path, digest, offset)
+
+
+digests = RunningDigests()
+
+
+def parse_content_range(header, size):
+    " ``bytes <start>-<end>/<total>`` for this upload, as (start, end) with end inclusive "
+    match = CONTENT_RANGE.match(header or "")
+    if match is None:
+        raise serializers.ValidationError("Content-Range header must be 'bytes <start>-<end>/<total>'.")
+    start, end, total = (int(value) for value in match.groups())
+    if total != size or start > end or end >= size:
+        raise serializers.ValidationError(f"Content-Range {header!r} does not fit a {size} byte upload.")
+    if end - start + 1 > settings.EVIDENCE_MAX_CHUNK_SIZE:
+        raise serializers.ValidationError(f"Chunks may be at most {settings.EVIDENCE_MAX_CHUNK_SIZE} bytes.")
+    return start, end
+
+
+def write_chunk(upload, stream, start, end, chunk_sha256=None):
+    """
+    Write bytes ``start``..``end`` of the upload from the request stream, and finish the
+    upload when it was the last chunk.
+
+    The body is received into a file of its own with no lock held, hashing it as it
+    arrives. Only then is the session row locked, to check the chunk still starts at the
+    stored offset, append it to the part file and advance the offset; so a slow client never
+    holds the lock, and two chunks racing for one offset cannot both land in the part file.
+    A retry of a chunk already stored (its response was lost) is acknowledged as it is; a
+    chunk that would leave a gap or rewrite stored bytes is refused with the offset to
+    resume from, as is a short body or a digest mismatch.
+    """
+    if upload.is_complete or end < upload.received:
+        return upload
+    if start != upload.received:
+        raise serializers.ValidationError({"detail": mismatch(upload, start), "received": upload.received})
+
+    staged, running, error = receive(upload, stream, start, end, chunk_sha256)
+    try:
+        with transaction.atomic():
+            upload = EvidenceUpload.objects.select_for_update().get(pk=upload.pk)
+            if error is None and not upload.is_complete and end >= upload.received:
+                if start != upload.received:
+                    error = mismatch(upload, start)
+                else:
+                    append(upload, staged, start)
+                    upload.received = end + 1
+                    if running is not None:
+                        digests.save(upload.pk, upload.received, running)
+                    upload.save(update_fields=["received", "modified_at"])
+                    if upload.received == upload.size:
+                        error = complete(upload)
+    finally:
+        os.remove(staged)
+    if error:
+        raise serializers.ValidationError({"detail": error, "received": upload.received})
+    return upload
+
+
+def mismatch(upload, start):
+    return f"Chunk starts at {start} but {upload.received} bytes are stored; resume from {upload.received}."
+
+
+def receive(upload, stream, start, end, chunk_sha256):
+    " Stream the chunk into a file of its own; returns its path, the upload's running digest and an error, if any "
+    length = end - start + 1
+    digest = hashlib.sha256()
+    running = digests.resume(upload.pk, start)
+    os.makedirs(settings.EVIDENCE_UPLOAD_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=settings.EVIDENCE_UPLOAD_DIR, prefix=f"{upload.pk}.", suffix=".chunk", delete=False) as chunk:
+        remaining = length
+        while remaining:
+            block = stream.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            if running is not None:
+                running.update(block)
+            chunk.write(block)
+            remaining -= len(block)
+
+    if remaining:
+        return chunk.name, None, f"Chunk body is {length - remaining} bytes; Content-Range announced {length}."
+    if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+        return chunk.name, None, "Chunk SHA-256 does not match its content."
+    return chunk.name, running, None
+
+
+def append(upload, staged, start):
+    " Copy a received chunk into the part file at ``start``; called with the session row locked "
+    path = part_path(upload)
+    with open(staged, "rb") as chunk, open(path, "r+b" if os.path.exists(path) else "w+b") as part:
+        part.seek(start)
+        shutil.copyfileobj(chunk, part, BLOCK_SIZE)
+        part.truncate()
+
+
+def store_blob(path, sha256, filename):
+    " The blob for ``sha256``, moving the part file into storage only if the content is new "
+    blob = EvidenceBlob.objects.filter(pk=sha256).first()
+    if blob is not None:
+        os.remove(path)
+        return blob
+
+    size = os.path.getsize(path)
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    with open(path, "rb") as part:
+        name = default_storage.save(blob_name(sha256, filename), PartFile(part))
+    try:
+        with transaction.atomic():
+            return EvidenceBlob.objects.create(sha256=sha256, file=name, size=size, content_type=content_type)
+    except IntegrityError:
+        # Another upload of the same content finished first
+        default_storage.delete(name)
+        return EvidenceBlob.objects.get(pk=sha256)
+
+
+def complete(upload):
+    " Store the assembled file once by content, under the digest kept while it arrived, and attach it to the action "
+    path = part_path(upload)
+    sha256 = digests.finish(upload.pk, path)
+    if upload.sha256 and sha256 != upload.sha256:
+        os.remove(path)
+        upload.received = 0
+        upload.save(update_fields=["received", "modified_at"])
+        return "Uploaded file does not match the expected SHA-256; upload it again."
+    attach(upload, store_blob(path, sha256, upload.filename))
+    return None
+
+
+def attach(upload, blob):
+    upload.blob = blob
+    upload.received = upload.size
+    upload.save(update_fields=["blob", "received", "modified_at"])
+    # Evidence doesn't feed the scorecard, so skip save() and its rollup refresh
+    InitiativeAction.objects.filter(pk=upload.action_id).update(
+        evidence_blob=blob, modified_by_id=upload.created_by_id, modified_at=timezone.now()
+    )
+    previews.schedule(blob)
+
+
+def serve(request, blob, filename):
+    " Download response for an evidence blob; the content never changes for a hash, so the hash is the ETag "
+    return send_file(request, blob.file.name, quote_etag(blob.sha256), blob.content_type, filename, blob.size)
+
+
+def send_file(request, name, etag, content_type, filename, size=None):
+    """
+    Respond with a stored file. Revalidation is answered here without touching the file;
+    the bytes are sent by nginx via X-Accel-Redirect (which also serves Range requests)
+    unless EVIDENCE_ACCEL_REDIRECT is off, e.g. under runserver.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if settings.EVIDENCE_ACCEL_REDIRECT:
+            response = HttpResponse(content_type=content_type)
+            response["X-Accel-Redirect"] = iri_to_uri(settings.EVIDENCE_ACCEL_PREFIX + name)
+        else:
+            response = FileResponse(default_storage.open(name, "rb"), content_type=content_type)
+            if size is not None:
+                response["Content-Length"] = size
+        response["Content-Disposition"] = content_disposition_header(False, filename)
+        response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Authorization", "Cookie"])
+    return response
@@ -0,0 +1,157 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import resolve
+from rest_framework.test import APIClient
+from core.benchmarks import percentile
+from posts.models import Dimension, Initiative, InitiativeAction
+
+User = get_user_model()
+
+WORKLOADS = ["dashboard", "quarter-close"]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay department-dashboard and quarter-close traffic against the API in-process and "
+        "report throughput and p50/p95/p99 latency per endpoint as JSON. Writes are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workload", choices=WORKLOADS + ["all"], default="all")
+        parser.add_argument("--iterations", type=int, default=50, help="Workload rounds to replay")
+        parser.add_argument("--warmup", type=int, default=3, help="Rounds run first and not measured")
+        parser.add_argument("--prefix", default="synthetic", help="Prefix used by generate_dataset")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--output", help="Also write the JSON report to this file")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        self.admin = User.objects.filter(username=f"{prefix}_admin").first()
+        self.members = list(
+            User.objects.filter(username__startswith=f"{prefix}_", dimension__isnull=False).select_related("dimension")
+        )
+        if self.admin is None or not self.members:
+            raise CommandError(f"No '{prefix}' dataset found. Run generate_dataset first.")
+        self.heads = list(User.objects.filter(dim_lead__isnull=False, username__startswith=f"{prefix}_").distinct())
+
+        workloads = WORKLOADS if options["workload"] == "all" else [options["workload"]]
+        settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ["testserver"]
+        report = {"revision": git_revision(), "iterations": options["iterations"], "workloads": {}}
+        for workload in workloads:
+            replay = getattr(self, f"replay_{workload.replace('-', '_')}")
+            with transaction.atomic():
+                self.timings = defaultdict(list)
+                for _ in range(options["warmup"]):
+                    replay()
+                self.timings = defaultdict(list)
+                started = time.perf_counter()
+                for _ in range(options["iterations"]):
+                    replay()
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            report["workloads"][workload] = self.summarize(elapsed)
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output)
+        self.stdout.write(output)
+
+    def client(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def call(self, client, method, path, data=None):
+        " Time one request, grouped by the route it resolved to "
+        route = resolve(path.split("?", 1)[0]).route
+        started = time.perf_counter()
+        response = getattr(client, method)(path, data, format="json") if data is not None else getattr(client, method)(path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        self.timings[f"{method.upper()} {route}"].append((elapsed, response.status_code))
+        return response
+
+    def replay_dashboard(self):
+        " A department member opening their dashboard "
+        member = self.rng.choice(self.members)
+        client = self.client(member)
+        self.call(client, "get", "/posts/dimensions/")
+        self.call(client, "get", "/posts/strategicobjectives/")
+        self.call(client, "get", "/posts/approvalstatuses/")
+        page = self.call(client, "get", "/posts/initiatives/")
+        self.call(client, "get", "/posts/initiativeactions/")
+        self.call(client, "get", f"/posts/scorecards/?dimension={member.dimension_id}")
+        self.call(client, "get", "/posts/approvalinbox/?scope=dimension")
+        results = page.data.get("results", []) if page.status_code == 200 else []
+        if results:
+            self.call(client, "get", f"/posts/initiatives/{self.rng.choice(results)['id']}/")
+
+    def replay_quarter_close(self):
+        " Owners post their actuals, initiatives go through approval, heads export the quarter "
+        member = self.rng.choice(self.members)
+        client = self.client(member)
+        approved = list(
+            InitiativeAction.objects.filter(initiative__dimension_id=member.dimension_id).values("id", "initiative_id")[:20]
+        )
+        if approved:
+            self.call(client, "post", "/posts/initiativeactions/bulk/", [
+                {"id": action["id"], "initiative": action["initiative_id"], "cummulative_actual": "0.750",
+                 "action_description": "Quarter close", "action_factor": "Actual", "raw_score": "1.00",
+                 "weighted_score": "0.50", "weighted_achieved": "0.40"}
+                for action in approved
+            ])
+
+        initiative = Initiative.objects.filter(dimension_id=member.dimension_id, status_id="OPEN").first()
+        if initiative:
+            self.call(client, "post", "/posts/requestapprovals/", {"approval_entry": initiative.pk, "comment": "Ready"})
+            head = self.client(Dimension.objects.get(pk=member.dimension_id).head or self.admin)
+            self.call(head, "get", "/posts/approvalinbox/")
+            self.call(head, "post", "/posts/approveapprovals/", {"approval_entry": initiative.pk, "comment": "Approved"})
+
+        head = self.client(self.rng.choice(self.heads) if self.heads else self.admin)
+        self.call(head, "get", "/posts/scorecards/")
+        self.call(head, "get", "/posts/initiatives/export/?file_format=csv")
+        self.call(head, "get", "/posts/initiativeactions/export/?file_format=ndjson")
+        self.call(self.client(self.admin), "get", "/posts/requestapprovals/export/")
+
+    def summarize(self, elapsed):
+        endpoints = {}
+        total = 0
+        for endpoint, samples in sorted(self.timings.items()):
+            durations = sorted(duration * 1000 for duration, status in samples)
+            total += len(samples)
+            endpoints[endpoint] = {
+                "requests": len(samples),
+                "errors": sum(1 for duration, status in samples if status >= 400),
+                "mean_ms": round(statistics.fmean(durations), 2),
+                "p50_ms": round(percentile(durations, 50), 2),
+                "p95_ms": round(percentile(durations, 95), 2),
+                "p99_ms": round(percentile(durations, 99), 2),
+                "throughput_rps": round(len(samples) / elapsed, 1),
+            }
+        return {
+            "requests": total,
+            "seconds": round(elapsed, 3),
+            "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+            "endpoints": endpoints,
+        }
@@ -1,80 +1,157 @@
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission
-from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Q
+from authentication import principal
+
+ROLES_PERMISSIONS = {
+    "USER": [
+        # From posts app
+        ("posts", "dimension", ["view_dimension"]),
+        ("posts", "strategicobjective", ["view_strategicobjective"]),
+        ("posts", "approvalstatus", ["view_approvalstatus"]),
+        ("posts", "initiative", ["view_initiative"]),
+        ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
+        ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry"]),
+        # From authentication app
+        ("authentication", "user", ["view_user"]),
+    ],
+    "INSTRUCTOR":  [
+        # From posts app
+        ("posts", "dimension", ["view_dimension"]),
+        ("posts", "strategicobjective", ["add_strategicobjective", "view_strategicobjective", "change_strategicobjective", "delete_strategicobjective"]),
+        ("posts", "approvalstatus", ["view_approvalstatus"]),
+        ("posts", "initiative", ["add_initiative", "view_initiative", "change_initiative", "delete_initiative"]),
+        ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
+        ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry"]),
+        # From authentication app
+        ("authentication", "user", ["view_user"]),
+    ],
+    "SYSTEM_ADMIN": [
+        # From posts app
+        ("posts", "dimension", ["add_dimension","view_dimension", "change_dimension", "delete_dimension"]),
+        ("posts", "strategicobjective", ["add_strategicobjective", "view_strategicobjective", "change_strategicobjective", "delete_strategicobjective"]),
+        ("posts", "approvalstatus", ["view_approvalstatus", "change_approvalstatus"]),
+        ("posts", "initiative", ["add_initiative", "view_initiative", "change_initiative", "delete_initiative"]),
+        ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
+        ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry", "change_approvalentry"]),
+        # From authentication app
+        ("authentication", "user", ["view_user", "change_user"]),
+        # From Django auth
+        ("auth", "group", ["add_group", "view_group", "change_group", "delete_group"]),
+        ("auth", "permission", ["view_permission"]),
+    ],
+    "ADMIN": "ALL",  # Full permissions
+}
 
 
 class Command(BaseCommand):
-    help = "Assign permissions to system roles: USER, TECHNICIAN, HELPDESK_ADMIN, ADMIN"
+    help = (
+        "Grant system roles (USER, INSTRUCTOR, SYSTEM_ADMIN, ADMIN) the permissions declared for them; "
+        "with --prune, also remove the ones that are not declared"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the permissions that would be added and removed without changing anything"
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            help="Also remove permissions a role has but does not declare (e.g. granted by hand in the admin)"
+        )
 
     def handle(self, *args, **options):
-        roles_permissions = {
-            "USER": [
-                # From posts app
-                ("posts", "dimension", ["view_dimension"]),
-                ("posts", "strategicobjective", ["view_strategicobjective"]),
-                ("posts", "approvalstatus", ["view_approvalstatus"]),
-                ("posts", "initiative", ["view_initiative"]),
-                ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
-                ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry"]),
-                # From authentication app
-                ("authentication", "user", ["view_user"]),
-            ],
-            "INSTRUCTOR":  [
-                # From posts app
-                ("posts", "dimension", ["view_dimension"]),
-                ("posts", "strategicobjective", ["add_strategicobjective", "view_strategicobjective", "change_strategicobjective", "delete_strategicobjective"]),
-                ("posts", "approvalstatus", ["view_approvalstatus"]),
-                ("posts", "initiative", ["add_initiative", "view_initiative", "change_initiative", "delete_initiative"]),
-                ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
-                ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry"]),
-                # From authentication app
-                ("authentication", "user", ["view_user"]),
-            ],
-            "SYSTEM_ADMIN": [
-                # From posts app
-                ("posts", "dimension", ["add_dimension","view_dimension", "change_dimension", "delete_dimension"]),
-                ("posts", "strategicobjective", ["add_strategicobjective", "view_strategicobjective", "change_strategicobjective", "delete_strategicobjective"]),
-                ("posts", "approvalstatus", ["view_approvalstatus", "change_approvalstatus"]),
-                ("posts", "initiative", ["add_initiative", "view_initiative", "change_initiative", "delete_initiative"]),
-                ("posts", "initiativeaction", ["add_initiativeaction","view_initiativeaction", "change_initiativeaction", "delete_initiativeaction"]),
-                ("posts", "approvalentry", ["add_approvalentry", "view_approvalentry", "change_approvalentry"]),
-                # From authentication app
-                ("authentication", "user", ["view_user", "change_user"]),
-                # From Django auth
-                ("auth", "group", ["add_group", "view_group", "change_group", "delete_group"]),
-                ("auth", "permission", ["view_permission"]),
-            ],
-            "ADMIN": "ALL",  # Full permissions
+        """
+        Every role gets its declared permissions; permissions granted outside this command are
+        kept unless --prune is given, which leaves each role with exactly what it declares.
+        Content types, permissions, groups and current grants are each read once and the
+        changes are written in bulk, so the query count does not grow with the number of
+        roles or permissions.
+        """
+        dry_run, prune = options["dry_run"], options["prune"]
+        through = Group.permissions.through
+
+        permissions = {
+            (perm.content_type.app_label, perm.content_type.model, perm.codename): perm
+            for perm in Permission.objects.select_related("content_type")
         }
+        models = {(app_label, model) for app_label, model, codename in permissions}
+        desired = {name: self.resolve(name, perms, permissions, models) for name, perms in ROLES_PERMISSIONS.items()}
+        labels = {perm.pk: f"{app_label}.{codename}" for (app_label, model, codename), perm in permissions.items()}
 
-        for group_name, perms in roles_permissions.items():
-            group, created = Group.objects.get_or_create(name=group_name)
+        with transaction.atomic():
+            groups = {group.name: group for group in Group.objects.filter(name__in=desired)}
+            missing = [Group(name=name) for name in desired if name not in groups]
+            if missing and not dry_run:
+                groups.update((group.name, group) for group in Group.objects.bulk_create(missing))
 
-            if perms == "ALL":
-                group.permissions.set(Permission.objects.all())
-                self.stdout.write(self.style.SUCCESS(f"{group_name}: All permissions assigned."))
-                continue
+            current = {}
+            for group_id, permission_id in through.objects.filter(group__name__in=desired).values_list("group_id", "permission_id"):
+                current.setdefault(group_id, set()).add(permission_id)
 
-            for app_label, model, codenames in perms:
-                try:
-                    content_type = ContentType.objects.get(app_label=app_label, model=model)
-                    for codename in codenames:
-                        try:
-                            perm = Permission.objects.get(codename=codename, content_type=content_type)
-                            group.permissions.add(perm)
-                        except Permission.DoesNotExist:
-                            self.stdout.write(
-                                self.style.WARNING(f"Permission '{codename}' not found for model '{model}' in app '{app_label}'")
-                            )
-                except ContentType.DoesNotExist:
-                    self.stdout.write(
-                        self.style.WARNING(f"Model '{model}' not found in app '{app_label}'")
-                    )
+            to_add, to_remove = [], Q()
+            changed = []
+            for name, wanted in desired.items():
+                group = groups.get(name)
+                have = current.get(group.pk, set()) if group else set()
+                added, extra = wanted - have, have - wanted
+                removed = extra if prune else set()
+                if group is None:
+                    self.stdout.write(f"{name}: group would be created")
+                self.report(name, added, removed, labels)
+                if extra and not prune:
+                    self.stdout.write(f"  {len(extra)} undeclared permission(s) kept; --prune removes them")
+                if group is None:
+                    continue
+                to_add += [through(group_id=group.pk, permission_id=permission_id) for permission_id in added]
+                if removed:
+                    to_remove |= Q(group_id=group.pk, permission_id__in=removed)
+                if added or removed:
+                    changed.append(group.pk)
 
-            self.stdout.write(self.style.SUCCESS(f"{group_name}: Permissions assigned."))
+            if dry_run:
+                self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+                return
 
-        self.stdout.write(self.style.SUCCESS("✅ All roles and permissions processed."))
+            if to_add:
+                through.objects.bulk_create(to_add, ignore_conflicts=True)
+            if to_remove:
+                through.objects.filter(to_remove).delete()
+            if changed:
+                # Bulk writes on the through table bypass m2m_changed, so move cached principals on here
+                principal.bump_groups_version()
 
+        self.stdout.write(self.style.SUCCESS("✅ All roles and permissions processed."))
 
+    def resolve(self, name, perms, permissions, models):
+        " Permission ids declared for a role; unknown models and codenames are reported and skipped "
+        if perms == "ALL":
+            return {perm.pk for perm in permissions.values()}
 
+        wanted = set()
+        for app_label, model, codenames in perms:
+            if (app_label, model) not in models:
+                self.stdout.write(self.style.WARNING(f"Model '{model}' not found in app '{app_label}'"))
+                continue
+            for codename in codenames:
+                perm = permissions.get((app_label, model, codename))
+                if perm is None:
+                    self.stdout.write(
+                        self.style.WARNING(f"Permission '{codename}' not found for model '{model}' in app '{app_label}'")
+                    )
+                    continue
+                wanted.add(perm.pk)
+        return wanted
 
+    def report(self, name, added, removed, labels):
+        if not added and not removed:
+            self.stdout.write(f"{name}: up to date.")
+            return
+        self.stdout.write(self.style.SUCCESS(f"{name}: +{len(added)} / -{len(removed)}"))
+        for permission_id in sorted(added, key=labels.get):
+            self.stdout.write(f"  + {labels[permission_id]}")
+        for permission_id in sorted(removed, key=labels.get):
+            self.stdout.write(f"  - {labels[permission_id]}")
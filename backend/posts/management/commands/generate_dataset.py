@@ -0,0 +1,155 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from posts.models import ApprovalEntry, ApprovalStatus, Dimension, Initiative, InitiativeAction, ScorecardRollup, StrategicObjective
+from posts.rollups import refresh_buckets
+
+User = get_user_model()
+
+STATUSES = ["OPEN", "PENDINGAPPROVAL", "APPROVED", "REJECTED", "CANCELLED"]
+# Share of initiatives in each status around quarter close
+STATUS_WEIGHTS = [20, 15, 50, 10, 5]
+ROLES = ["USER", "INSTRUCTOR", "SYSTEM_ADMIN", "ADMIN"]
+ACTION_STATUSES = [choice for choice, label in InitiativeAction.STATUS_CHOICES]
+QUARTERS = ["Q1", "Q2", "Q3", "Q4"]
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic hospital-scale dataset (users, dimensions, objectives, initiatives, actions, approvals)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dimensions", type=int, default=17, help="Departments / divisions to create")
+        parser.add_argument("--objectives", type=int, default=8, help="Strategic objectives to create")
+        parser.add_argument("--users-per-dimension", type=int, default=40)
+        parser.add_argument("--initiatives-per-dimension", type=int, default=300)
+        parser.add_argument("--actions-per-initiative", type=int, default=4, help="Created for APPROVED initiatives only")
+        parser.add_argument("--prefix", default="synthetic", help="Prefix for generated usernames and names")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed, so runs are reproducible")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        prefix = options["prefix"]
+        if User.objects.filter(username__startswith=f"{prefix}_").exists():
+            raise CommandError(f"Users prefixed '{prefix}_' already exist. Use another --prefix.")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            owner = self.owner = self.ensure_reference_data(prefix)
+            dimensions = self.create_dimensions(prefix, options["dimensions"], options["users_per_dimension"], owner)
+            objectives = StrategicObjective.objects.bulk_create([
+                StrategicObjective(name=f"{prefix} objective {n + 1}", created_by=owner)
+                for n in range(options["objectives"])
+            ])
+            initiatives = self.create_initiatives(dimensions, objectives, options["initiatives_per_dimension"])
+            actions = self.create_actions(initiatives, options["actions_per_initiative"])
+            entries = self.create_approval_entries(initiatives)
+            refresh_buckets({initiative.scorecard_bucket for initiative in initiatives})
+
+        with connection.cursor() as cursor:
+            for model in (User, Dimension, StrategicObjective, Initiative, InitiativeAction, ApprovalEntry, ScorecardRollup):
+                cursor.execute(f"ANALYZE {model._meta.db_table}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(dimensions)} dimensions, {len(objectives)} objectives, {len(initiatives)} initiatives, "
+            f"{actions} actions and {entries} approval entries in {time.perf_counter() - started:.1f}s."
+        ))
+
+    def ensure_reference_data(self, prefix):
+        " Approval statuses and role groups the app expects, plus an owner for reference rows "
+        owner = User.objects.create(
+            username=f"{prefix}_admin", email=f"{prefix}_admin@nbihosp.org", first_name="Synthetic", last_name="Admin",
+            is_superuser=True, is_staff=True, password=make_password(None),
+        )
+        for code in STATUSES:
+            ApprovalStatus.objects.get_or_create(code=code, defaults={"description": code.title(), "created_by": owner})
+        self.groups = {name: Group.objects.get_or_create(name=name)[0] for name in ROLES}
+        owner.groups.set([self.groups["ADMIN"]])
+        return owner
+
+    def create_dimensions(self, prefix, count, users_per_dimension, owner):
+        " Each dimension gets a head (INSTRUCTOR) and members (mostly USER, a few SYSTEM_ADMIN) "
+        dimensions = Dimension.objects.bulk_create([
+            Dimension(name=f"{prefix} dimension {n + 1}", created_by=owner) for n in range(count)
+        ])
+        unusable = make_password(None)
+        users, roles = [], []
+        for dimension in dimensions:
+            for n in range(users_per_dimension):
+                username = f"{prefix}_{dimension.pk}_{n}"
+                users.append(User(
+                    username=username, email=f"{username}@nbihosp.org", first_name="Member", last_name=f"{dimension.pk}-{n}",
+                    dimension=dimension, password=unusable,
+                ))
+                roles.append("INSTRUCTOR" if n == 0 else "SYSTEM_ADMIN" if n % 25 == 1 else "USER")
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user=user, group=self.groups[role]) for user, role in zip(users, roles)],
+            batch_size=self.batch_size,
+        )
+
+        self.members = {}
+        for user in users:
+            self.members.setdefault(user.dimension_id, []).append(user)
+        for dimension in dimensions:
+            dimension.head = self.members[dimension.pk][0] if self.members.get(dimension.pk) else owner
+        Dimension.objects.bulk_update(dimensions, ["head"])
+        return dimensions
+
+    def decimal(self, low, high, places=3):
+        return Decimal(f"{self.rng.uniform(low, high):.{places}f}")
+
+    def create_initiatives(self, dimensions, objectives, per_dimension):
+        initiatives = []
+        for dimension in dimensions:
+            members = self.members.get(dimension.pk) or [self.owner]
+            for n in range(per_dimension):
+                author = self.rng.choice(members)
+                initiatives.append(Initiative(
+                    objective=self.rng.choice(objectives), dimension=dimension,
+                    description=f"{dimension.name} initiative {n + 1}", unit_of_measure=self.rng.choice(["%", "count", "days"]),
+                    weight=self.decimal(0.01, 0.2), previous_target=self.decimal(0.3, 0.9), current_target=self.decimal(0.4, 1),
+                    cumulative_target=self.decimal(0.4, 1), status_id=self.rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+                    created_by=author, modified_by=author,
+                ))
+        return Initiative.objects.bulk_create(initiatives, batch_size=self.batch_size)
+
+    def create_actions(self, initiatives, per_initiative):
+        actions = []
+        for initiative in initiatives:
+            if initiative.status_id != "APPROVED":
+                continue
+            for n in range(per_initiative):
+                actions.append(InitiativeAction(
+                    initiative=initiative, cummulative_actual=self.decimal(0, 1), action_description=f"Action {n + 1}",
+                    action_factor="Synthetic", raw_score=self.decimal(0, 9.99, 2), weighted_score=self.decimal(0, 1, 2),
+                    weighted_achieved=self.decimal(0, 1, 2), progress=self.rng.randint(0, 100),
+                    status=self.rng.choice(ACTION_STATUSES), deadline=f"{QUARTERS[n % 4]} {timezone.now().year}",
+                    created_by=initiative.created_by, modified_by=initiative.created_by,
+                ))
+        InitiativeAction.objects.bulk_create(actions, batch_size=self.batch_size)
+        return len(actions)
+
+    def create_approval_entries(self, initiatives):
+        " One entry per initiative that has been through review; pending ones wait on the dimension head "
+        now = timezone.now()
+        heads = dict(Dimension.objects.filter(pk__in={i.dimension_id for i in initiatives}).values_list("pk", "head_id"))
+        entries = []
+        for initiative in initiatives:
+            if initiative.status_id == "OPEN":
+                continue
+            pending = initiative.status_id == "PENDINGAPPROVAL"
+            entries.append(ApprovalEntry(
+                requestor=initiative.created_by, approver_id=heads[initiative.dimension_id], approval_entry=initiative,
+                status_id=initiative.status_id, actioned_at=None if pending else now - timedelta(days=self.rng.randint(0, 90)),
+            ))
+        ApprovalEntry.objects.bulk_create(entries, batch_size=self.batch_size)
+        return len(entries)
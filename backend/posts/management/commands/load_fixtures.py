@@ -1,11 +1,82 @@
 import json
+import time
+from contextlib import contextmanager
 from datetime import datetime, UTC
-from django.core.management.base import BaseCommand
+from itertools import groupby, islice
+from django.core.management.base import BaseCommand, CommandError
 from django.apps import apps
 from django.contrib.auth import get_user_model
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+from authentication import principal
+from posts import statuses
+from posts.models import ApprovalStatus, Initiative, InitiativeAction
+from posts.rollups import refresh_initiatives
 
 User = get_user_model()
 
+TIMESTAMP_FIELDS = ["created_at", "updated_at", "modified_at"]
+
+
+def iter_fixture(file, block_size=1 << 16):
+    " Yield the entries of a top-level JSON array one at a time, reading the file in blocks "
+    decoder = json.JSONDecoder()
+    buffer, position, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, position, eof
+        block = file.read(block_size)
+        eof = not block
+        buffer = buffer[position:] + block
+        position = 0
+
+    def skip(characters):
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in characters:
+                position += 1
+            if position < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(" \t\r\n")
+    if buffer[position:position + 1] != "[":
+        raise CommandError("Fixture must be a JSON array.")
+    position += 1
+    while True:
+        skip(" \t\r\n,")
+        if position >= len(buffer):
+            raise CommandError("Unexpected end of fixture file.")
+        if buffer[position] == "]":
+            return
+        while True:
+            try:
+                entry, end = decoder.raw_decode(buffer, position)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        position = end
+        yield entry
+
+
+@contextmanager
+def keep_timestamps(Model):
+    " Let fixture values win over auto_now / auto_now_add while bulk loading "
+    fields = [field for field in Model._meta.concrete_fields if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
 class Command(BaseCommand):
     help = "Load initial data from a fixture JSON file with safe insertion"
 
@@ -16,9 +87,22 @@ class Command(BaseCommand):
             help='Path to the fixture file',
             default='db.json'
         )
+        parser.add_argument(
+            '--bulk',
+            action='store_true',
+            help='Stream the file and upsert in batches (for large fixtures / restores)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Entries per transaction in --bulk mode'
+        )
 
     def handle(self, *args, **options):
         file_path = options['file']
+        if options['bulk']:
+            return self.load_bulk(file_path, options['chunk_size'])
 
         try:
             with open(file_path, "r") as file:
@@ -78,3 +162,151 @@ class Command(BaseCommand):
 
         except Exception as e:
             self.stderr.write(self.style.ERROR(f"Error loading {file_path}: {e}"))
+
+    def load_bulk(self, file_path, chunk_size):
+        """
+        Streams the fixture and upserts it chunk by chunk, each chunk in its own transaction.
+
+        Consecutive entries of the same model are written with one
+        bulk_create(update_conflicts=True) per set of fields, keyed on the pk (or the first
+        unique field when the entry has no pk). Foreign keys are checked with one query per
+        field per batch; entries pointing at missing rows are skipped and reported. Rows
+        written with explicit pks don't advance the id sequences, so those are reset at the end.
+        """
+        started = time.perf_counter()
+        self.loaded = self.skipped = 0
+        self.explicit_pks = set()
+        with open(file_path, "r") as file:
+            entries = iter_fixture(file)
+            while chunk := list(islice(entries, chunk_size)):
+                with transaction.atomic():
+                    for model_name, batch in groupby(chunk, key=lambda entry: entry.get("model")):
+                        self.upsert(model_name, list(batch))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{self.loaded} rows loaded, {self.skipped} skipped ({self.loaded / elapsed:,.0f} rows/s)")
+        self.reset_sequences()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {self.loaded} rows from {file_path} in {elapsed:.2f}s ({self.loaded / elapsed if elapsed else 0:,.0f} rows/s)."
+        ))
+
+    def upsert(self, model_name, entries):
+        try:
+            Model = apps.get_model(model_name)
+        except (LookupError, ValueError, TypeError, AttributeError):
+            # AttributeError: an entry without "model"
+            self.stderr.write(self.style.ERROR(f"Skipping {len(entries)} entries of unknown model {model_name!r}"))
+            self.skipped += len(entries)
+            return
+
+        now = timezone.now()
+        opts = Model._meta
+        rows = []
+        for entry in entries:
+            try:
+                rows.append(self.build(Model, entry, now))
+            except (KeyError, ValueError, ValidationError, FieldDoesNotExist) as e:
+                self.stderr.write(self.style.ERROR(f"Skipping {model_name} entry {entry.get('pk', '')}: {e}"))
+                self.skipped += 1
+        rows = self.drop_missing_references(Model, rows)
+
+        with keep_timestamps(Model):
+            for field_names, group in groupby(sorted(rows, key=lambda row: sorted(row[1])), key=lambda row: sorted(row[1])):
+                group = list(group)
+                instances = [instance for instance, fields, m2m in group]
+                has_pk = instances[0].pk is not None
+                unique_field = opts.pk if has_pk else next(
+                    (opts.get_field(name) for name in field_names if opts.get_field(name).unique and not opts.get_field(name).primary_key), None
+                )
+                update_fields = [opts.get_field(name).name for name in field_names if not opts.get_field(name).primary_key]
+                if unique_field is not None and update_fields:
+                    Model.objects.bulk_create(
+                        instances, update_conflicts=True, unique_fields=[unique_field.name],
+                        update_fields=[name for name in update_fields if name != unique_field.name],
+                    )
+                else:
+                    Model.objects.bulk_create(instances, ignore_conflicts=unique_field is not None)
+                self.set_many_to_many(Model, group)
+                self.loaded += len(instances)
+                if has_pk:
+                    self.explicit_pks.add(Model)
+
+        self.after_load(Model, [instance.pk for instance, fields, m2m in rows if instance.pk is not None])
+
+    def reset_sequences(self):
+        " Move each id sequence past the highest pk loaded, so the next create() doesn't collide "
+        statements = connection.ops.sequence_reset_sql(no_style(), sorted(self.explicit_pks, key=lambda Model: Model._meta.label))
+        if statements:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+    def build(self, Model, entry, now):
+        " Return (instance, concrete field names set from the fixture, many-to-many values) "
+        opts = Model._meta
+        data = dict(entry["fields"])
+        for name in TIMESTAMP_FIELDS:
+            if any(field.name == name for field in opts.concrete_fields):
+                data.setdefault(name, now)
+
+        instance, fields, m2m = Model(), set(), {}
+        if "pk" in entry:
+            instance.pk = opts.pk.to_python(entry["pk"])
+            fields.add(opts.pk.name)
+        for name, value in data.items():
+            field = opts.get_field(name)
+            if field.many_to_many:
+                m2m[field.name] = value
+            elif field.is_relation:
+                setattr(instance, field.attname, None if value is None else field.target_field.to_python(value))
+                fields.add(field.name)
+            else:
+                setattr(instance, field.attname, field.to_python(value))
+                fields.add(field.name)
+        if Model is ApprovalStatus and instance.code:
+            # As ApprovalStatus.save() would
+            instance.code = instance.code.upper()
+        return instance, fields, m2m
+
+    def drop_missing_references(self, Model, rows):
+        " One query per foreign key for the whole batch "
+        for field in Model._meta.concrete_fields:
+            if not field.is_relation:
+                continue
+            wanted = {getattr(instance, field.attname) for instance, fields, m2m in rows} - {None}
+            if not wanted:
+                continue
+            related = field.related_model
+            found = set(related._default_manager.filter(**{f"{field.target_field.name}__in": wanted}).values_list(field.target_field.name, flat=True))
+            missing = wanted - found
+            if missing:
+                self.stderr.write(self.style.ERROR(
+                    f"{related._meta.label} {', '.join(map(str, sorted(missing, key=str)))} does not exist. "
+                    f"Skipping {Model._meta.label} entries that reference it."
+                ))
+                kept = [row for row in rows if getattr(row[0], field.attname) not in missing]
+                self.skipped += len(rows) - len(kept)
+                rows = kept
+        return rows
+
+    def set_many_to_many(self, Model, rows):
+        for field in Model._meta.many_to_many:
+            through = field.remote_field.through
+            source, target = field.m2m_field_name(), field.m2m_reverse_field_name()
+            links = [
+                through(**{f"{source}_id": instance.pk, f"{target}_id": value})
+                for instance, fields, m2m in rows for value in m2m.get(field.name, [])
+            ]
+            through.objects.bulk_create(links, ignore_conflicts=True)
+
+    def after_load(self, Model, pks):
+        " bulk_create skips signals, so do what their receivers would have done "
+        if Model is User:
+            principal.invalidate(pks)
+        elif Model is ApprovalStatus:
+            statuses.invalidate()
+        elif Model is Initiative:
+            refresh_initiatives(pks)
+        elif Model is InitiativeAction:
+            refresh_initiatives(set(InitiativeAction.objects.filter(pk__in=pks).values_list("initiative_id", flat=True)))
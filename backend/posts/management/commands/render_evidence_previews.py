@@ -0,0 +1,43 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from posts.models import EvidenceBlob
+from posts.previews import IMAGE_TYPES, PDF_TYPES, failed_path, has_failed, previews_exist, render_previews
+
+
+class Command(BaseCommand):
+    help = "Render missing thumbnails and first-page previews for stored evidence (backfill)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=settings.EVIDENCE_PREVIEW_WORKERS)
+        parser.add_argument(
+            "--retry-failed", action="store_true", help="Clear .failed markers and try those files again, e.g. after installing poppler"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        blobs = [
+            blob for blob in EvidenceBlob.objects.filter(content_type__in=IMAGE_TYPES | PDF_TYPES).only("sha256", "file", "content_type")
+            if not previews_exist(blob.sha256)
+        ]
+        if options["retry_failed"]:
+            for blob in blobs:
+                if has_failed(blob.sha256):
+                    os.remove(failed_path(blob.sha256))
+        else:
+            blobs = [blob for blob in blobs if not has_failed(blob.sha256)]
+        failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            futures = {
+                executor.submit(render_previews, blob.sha256, blob.file.path, blob.content_type): blob.sha256 for blob in blobs
+            }
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    failed += 1
+                    self.stdout.write(self.style.WARNING(f"{futures[future]}: {future.exception()}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered previews for {len(blobs) - failed} of {len(blobs)} files in {time.perf_counter() - started:.1f}s."
+        ))
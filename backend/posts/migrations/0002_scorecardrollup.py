@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_scorecards(apps, schema_editor):
+    Initiative = apps.get_model("posts", "Initiative")
+    InitiativeAction = apps.get_model("posts", "InitiativeAction")
+    ScorecardRollup = apps.get_model("posts", "ScorecardRollup")
+
+    actions = {
+        (row["initiative__dimension_id"], row["initiative__objective_id"], row["initiative__status_id"]): row
+        for row in InitiativeAction.objects.values("initiative__dimension_id", "initiative__objective_id", "initiative__status_id")
+        .annotate(action_count=Count("id"), total_weighted_score=Sum("weighted_score"), total_weighted_achieved=Sum("weighted_achieved"))
+        .order_by()
+    }
+    rows = []
+    for row in (
+        Initiative.objects.exclude(status__isnull=True)
+        .values("dimension_id", "objective_id", "status_id")
+        .annotate(initiative_count=Count("id"), total_weight=Sum("weight"), total_target=Sum("current_target"))
+        .order_by()
+    ):
+        action_row = actions.get((row["dimension_id"], row["objective_id"], row["status_id"]), {})
+        rows.append(ScorecardRollup(
+            dimension_id=row["dimension_id"],
+            objective_id=row["objective_id"],
+            status_id=row["status_id"],
+            initiative_count=row["initiative_count"],
+            total_weight=row["total_weight"] or 0,
+            total_target=row["total_target"] or 0,
+            action_count=action_row.get("action_count", 0),
+            total_weighted_score=action_row.get("total_weighted_score") or 0,
+            total_weighted_achieved=action_row.get("total_weighted_achieved") or 0,
+        ))
+    ScorecardRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScorecardRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('initiative_count', models.PositiveIntegerField(default=0)),
+                ('action_count', models.PositiveIntegerField(default=0)),
+                ('total_weight', models.DecimalField(decimal_places=3, default=0, max_digits=12)),
+                ('total_target', models.DecimalField(decimal_places=3, default=0, max_digits=12)),
+                ('total_weighted_score', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total_weighted_achieved', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('modified_at', models.DateTimeField(auto_now=True)),
+                ('dimension', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scorecards', related_query_name='scorecards', to='posts.dimension')),
+                ('objective', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scorecards', related_query_name='scorecards', to='posts.strategicobjective')),
+                ('status', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='scorecards', related_query_name='scorecards', to='posts.approvalstatus')),
+            ],
+            options={
+                'verbose_name_plural': 'Scorecard Rollups',
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'objective', 'status'), name='uniq_scorecard_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_scorecards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0002_scorecardrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvalentry',
+            index=models.Index(fields=['requested_at', 'id'], name='appent_requested_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='initiative',
+            index=models.Index(fields=['modified_at', 'id'], name='init_modified_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='initiativeaction',
+            index=models.Index(fields=['modified_at', 'id'], name='init_act_modified_idx'),
+        ),
+    ]
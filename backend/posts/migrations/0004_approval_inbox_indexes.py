@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='approvalentry',
+            index=models.Index(fields=['approver', 'status', 'requested_at'], name='appent_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='approvalentry',
+            index=models.Index(fields=['approval_entry', 'requested_at'], name='appent_history_idx'),
+        ),
+    ]
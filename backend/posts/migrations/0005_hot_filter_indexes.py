@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 16:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_approval_inbox_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='approvalentry',
+            name='approval_entry',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='appent_inits', related_query_name='appent_inits', to='posts.initiative'),
+        ),
+        migrations.AlterField(
+            model_name='approvalentry',
+            name='approver',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='app_apvs', related_query_name='app_apvs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='approvalentry',
+            name='status',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='app_statuses', related_query_name='app_statuses', to='posts.approvalstatus'),
+        ),
+        migrations.AlterField(
+            model_name='initiative',
+            name='dimension',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='posts.dimension'),
+        ),
+        migrations.AlterField(
+            model_name='initiativeaction',
+            name='initiative',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, to='posts.initiative'),
+        ),
+        migrations.AddIndex(
+            model_name='approvalentry',
+            index=models.Index(fields=['status', 'requested_at'], name='appent_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='initiative',
+            index=models.Index(fields=['dimension', 'status'], name='init_dimension_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='initiativeaction',
+            index=models.Index(fields=['initiative', 'created_at'], name='init_act_initiative_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_evidence_blobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='approvalentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
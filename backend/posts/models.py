@@ -1,3 +1,4 @@
+import uuid
 from django.db import models
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError
@@ -49,7 +50,7 @@ class ApprovalStatus(models.Model):
     
 class Initiative(models.Model):
     objective = models.ForeignKey(StrategicObjective, on_delete=models.PROTECT, null=False, blank=False)
-    dimension = models.ForeignKey(Dimension, on_delete=models.PROTECT, null=False, blank=False)
+    dimension = models.ForeignKey(Dimension, on_delete=models.PROTECT, null=False, blank=False, db_index=False) # covered by init_dimension_status_idx
     description = models.TextField(null=False, blank=False)
     unit_of_measure = models.TextField(null=False, blank=False)
     weight = models.DecimalField(max_digits=4, decimal_places=3)
@@ -64,17 +65,50 @@ class Initiative(models.Model):
 
     def __str__(self):
         return f"{self.description}"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["modified_at", "id"], name="init_modified_idx"),
+            models.Index(fields=["dimension", "status"], name="init_dimension_status_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        " Remember the row's share of the scorecard as loaded, so a save can move exactly that "
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_scorecard = (
+            (loaded.get("dimension_id"), loaded.get("objective_id"), loaded.get("status_id")),
+            loaded.get("weight"), loaded.get("current_target"),
+        )
+        return instance
+
+    @property
+    def scorecard_bucket(self):
+        return (self.dimension_id, self.objective_id, self.status_id)
     
     def save(self, *args, **kwargs):
 
         if not self.status_id:
+            from .statuses import get_status
             try:
-                self.status = ApprovalStatus.objects.get(code="OPEN")
+                self.status = get_status("OPEN")
             except ApprovalStatus.DoesNotExist:
                 raise ValidationError("Default 'OPEN' status does not exist. Please create it first.")
 
         super().save(*args, **kwargs)
     
+class EvidenceBlob(models.Model):
+    " One stored copy of an evidence file, addressed by the SHA-256 of its content "
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    file = models.FileField(max_length=255)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256} ({self.size} bytes)"
+
 class InitiativeAction(models.Model):
     STATUS_CHOICES = [
         ('on_track', 'On Track'),
@@ -83,7 +117,7 @@ class InitiativeAction(models.Model):
         ('behind_schedule', 'Behind Schedule'),
         ('completed', 'Completed'),
     ]
-    initiative = models.ForeignKey(Initiative, on_delete=models.PROTECT, null=False, blank=False)
+    initiative = models.ForeignKey(Initiative, on_delete=models.PROTECT, null=False, blank=False, db_index=False) # covered by init_act_initiative_idx
     cummulative_actual = models.DecimalField(max_digits=4, decimal_places=3)
     action_description = models.TextField(null=False, blank=False)
     action_factor = models.TextField(null=False, blank=False)
@@ -98,6 +132,7 @@ class InitiativeAction(models.Model):
     modified_at = models.DateTimeField(auto_now=True)
     modified_by = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True, related_name="init_act_modifiers", related_query_name="init_act_modifiers")
     evidence = models.FileField(upload_to="attachments/", null=True, blank=True, validators=[validate_file_extension], help_text="Upload Word, PDF, JPEG, or PNG files.")
+    evidence_blob = models.ForeignKey(EvidenceBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="actions", related_query_name="actions")
     # define property
     @property
     def color(self):
@@ -111,17 +146,78 @@ class InitiativeAction(models.Model):
         }
         return color_map.get(self.status, 'default')
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["modified_at", "id"], name="init_act_modified_idx"),
+            models.Index(fields=["initiative", "created_at"], name="init_act_initiative_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_scorecard = (loaded.get("initiative_id"), loaded.get("weighted_score"), loaded.get("weighted_achieved"))
+        return instance
+
+class EvidenceUpload(models.Model):
+    " A resumable, chunked upload of one evidence file for an initiative action "
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    action = models.ForeignKey(InitiativeAction, on_delete=models.CASCADE, related_name="evidence_uploads", related_query_name="evidence_uploads")
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True, help_text="SHA-256 the client expects the finished file to have")
+    received = models.BigIntegerField(default=0, help_text="Bytes stored so far; the next chunk starts here")
+    blob = models.ForeignKey(EvidenceBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="uploads", related_query_name="uploads")
+    created_by = models.ForeignKey(User, on_delete=models.PROTECT, related_name="evidence_uploads", related_query_name="evidence_uploads")
+    created_at = models.DateTimeField(auto_now_add=True)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def is_complete(self):
+        return self.blob_id is not None
+
+    def __str__(self):
+        return f"Upload {self.id} of {self.filename} ({self.received}/{self.size})"
+
 class ApprovalEntry(models.Model):
     requestor = models.ForeignKey(User, on_delete=models.PROTECT, null=False, blank=False, related_name="app_reqs", related_query_name="app_reqs")
-    approval_entry = models.ForeignKey(Initiative, on_delete=models.PROTECT, null=False, blank=False, related_name="appent_inits", related_query_name="appent_inits")
+    approval_entry = models.ForeignKey(Initiative, on_delete=models.PROTECT, null=False, blank=False, db_index=False, related_name="appent_inits", related_query_name="appent_inits") # covered by appent_history_idx
     requested_at = models.DateTimeField(auto_now_add=True)
-    approver = models.ForeignKey(User, on_delete=models.PROTECT, null=False, blank=False, related_name="app_apvs", related_query_name="app_apvs")
+    approver = models.ForeignKey(User, on_delete=models.PROTECT, null=False, blank=False, db_index=False, related_name="app_apvs", related_query_name="app_apvs") # covered by appent_inbox_idx
     actioned_at = models.DateTimeField(null=True, blank=True)
-    status = models.ForeignKey(ApprovalStatus, on_delete=models.PROTECT, null=False, blank=False, related_name="app_statuses", related_query_name="app_statuses")
+    status = models.ForeignKey(ApprovalStatus, on_delete=models.PROTECT, null=False, blank=False, db_index=False, related_name="app_statuses", related_query_name="app_statuses") # covered by appent_status_idx
     comment = models.CharField(max_length=255, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Approval request {self.id} by {self.requestor} for {self.approver}"
     
     class Meta:
-        verbose_name_plural = "Approval Entries"
\ No newline at end of file
+        verbose_name_plural = "Approval Entries"
+        indexes = [
+            models.Index(fields=["requested_at", "id"], name="appent_requested_idx"),
+            models.Index(fields=["approver", "status", "requested_at"], name="appent_inbox_idx"),
+            models.Index(fields=["approval_entry", "requested_at"], name="appent_history_idx"),
+            models.Index(fields=["status", "requested_at"], name="appent_status_idx"),
+        ]
+
+class ScorecardRollup(models.Model):
+    dimension = models.ForeignKey(Dimension, on_delete=models.CASCADE, null=False, blank=False, related_name="scorecards", related_query_name="scorecards")
+    objective = models.ForeignKey(StrategicObjective, on_delete=models.CASCADE, null=False, blank=False, related_name="scorecards", related_query_name="scorecards")
+    status = models.ForeignKey(ApprovalStatus, on_delete=models.CASCADE, null=False, blank=False, related_name="scorecards", related_query_name="scorecards")
+    initiative_count = models.PositiveIntegerField(default=0)
+    action_count = models.PositiveIntegerField(default=0)
+    total_weight = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    total_target = models.DecimalField(max_digits=12, decimal_places=3, default=0)
+    total_weighted_score = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total_weighted_achieved = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    modified_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Scorecard Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=["dimension", "objective", "status"], name="uniq_scorecard_bucket"),
+        ]
+
+    def __str__(self):
+        return f"{self.dimension_id}/{self.objective_id}/{self.status_id} scorecard"
@@ -0,0 +1,139 @@
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels: list thumbnails and a readable first-page preview
+PREVIEW_SIZES = {"thumb": 256, "page": 1280}
+IMAGE_TYPES = {"image/jpeg", "image/png"}
+PDF_TYPES = {"application/pdf"}
+# Failures that say the file itself cannot be decoded: Pillow can't identify or refuses the
+# image, or pdftoppm exits non-zero on the PDF. Anything else (out of memory, a full disk, a
+# timeout) may pass, so it is left to be retried.
+UNRENDERABLE = (UnidentifiedImageError, Image.DecompressionBombError, subprocess.CalledProcessError)
+
+
+def can_preview(content_type):
+    return content_type in IMAGE_TYPES or content_type in PDF_TYPES
+
+
+def preview_name(sha256, size):
+    " Previews are keyed by content hash, so every action sharing a file shares its previews "
+    return f"previews/{sha256[:2]}/{sha256[2:4]}/{sha256}-{size}.jpg"
+
+
+def preview_path(sha256, size):
+    return default_storage.path(preview_name(sha256, size))
+
+
+def previews_exist(sha256):
+    return all(os.path.exists(preview_path(sha256, size)) for size in PREVIEW_SIZES)
+
+
+def failed_path(sha256):
+    " Marker left beside the previews when a file cannot be rendered, so it isn't retried on every request "
+    return default_storage.path(f"previews/{sha256[:2]}/{sha256[2:4]}/{sha256}.failed")
+
+
+def has_failed(sha256):
+    return os.path.exists(failed_path(sha256))
+
+
+def first_pdf_page(path, pixels):
+    " Rasterize page one with poppler's pdftoppm, scaled so its longest edge is ``pixels`` "
+    with tempfile.TemporaryDirectory() as directory:
+        prefix = os.path.join(directory, "page")
+        subprocess.run(
+            ["pdftoppm", "-f", "1", "-l", "1", "-singlefile", "-scale-to", str(pixels), "-jpeg", path, prefix],
+            check=True, capture_output=True, timeout=settings.EVIDENCE_PREVIEW_TIMEOUT,
+        )
+        with Image.open(f"{prefix}.jpg") as page:
+            return page.convert("RGB")
+
+
+def open_image(path, pixels):
+    with Image.open(path) as image:
+        # JPEG scans can be decoded at a fraction of their size, which is most of the work
+        image.draft("RGB", (pixels, pixels))
+        return ImageOps.exif_transpose(image).convert("RGB")
+
+
+def render_previews(sha256, path, content_type):
+    """
+    Render whichever previews of the file are missing; safe to call more than once. A file
+    that cannot be decoded gets a ``.failed`` marker and is skipped from then on; other
+    errors are raised without one, so the next request schedules it again.
+    """
+    missing = {size: pixels for size, pixels in PREVIEW_SIZES.items() if not os.path.exists(preview_path(sha256, size))}
+    if not missing or not can_preview(content_type) or has_failed(sha256):
+        return
+    largest = max(missing.values())
+    try:
+        image = first_pdf_page(path, largest) if content_type in PDF_TYPES else open_image(path, largest)
+    except UNRENDERABLE as e:
+        marker = failed_path(sha256)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, "w") as file:
+            file.write(f"{type(e).__name__}: {e}\n")
+        raise
+    try:
+        for size, pixels in missing.items():
+            preview = image.copy()
+            preview.thumbnail((pixels, pixels))
+            target = preview_path(sha256, size)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            # Write beside the target and rename, so readers never see a partial file
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(target), suffix=".tmp", delete=False) as file:
+                preview.save(file, "JPEG", quality=80, optimize=True)
+            os.replace(file.name, target)
+    finally:
+        image.close()
+
+
+class PreviewPool:
+    """
+    Background threads rendering previews off the request path. A hash already queued or
+    rendering in this process is not queued again.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = set()
+
+    def submit(self, sha256, path, content_type):
+        with self.lock:
+            if sha256 in self.pending:
+                return None
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=settings.EVIDENCE_PREVIEW_WORKERS, thread_name_prefix="evidence-preview"
+                )
+            self.pending.add(sha256)
+        future = self.executor.submit(render_previews, sha256, path, content_type)
+        future.add_done_callback(lambda done: self.finished(sha256, done))
+        return future
+
+    def finished(self, sha256, future):
+        with self.lock:
+            self.pending.discard(sha256)
+        if future.exception() is not None:
+            logger.warning("Evidence preview for %s failed: %s", sha256, future.exception())
+
+
+pool = PreviewPool()
+
+
+def schedule(blob):
+    " Queue the blob's previews once the transaction that attached it commits "
+    if not can_preview(blob.content_type) or previews_exist(blob.sha256) or has_failed(blob.sha256):
+        return
+    sha256, path, content_type = blob.sha256, blob.file.path, blob.content_type
+    transaction.on_commit(lambda: pool.submit(sha256, path, content_type))
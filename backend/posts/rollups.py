@@ -0,0 +1,178 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Initiative, InitiativeAction, ScorecardRollup
+
+ROLLUP_TOTALS = [
+    "initiative_count", "action_count", "total_weight", "total_target",
+    "total_weighted_score", "total_weighted_achieved",
+]
+
+
+def initiative_totals(weight, current_target):
+    " What one initiative adds to its bucket, leaving out its actions "
+    return {"initiative_count": 1, "total_weight": weight, "total_target": current_target}
+
+
+def action_totals(weighted_score, weighted_achieved):
+    return {"action_count": 1, "total_weighted_score": weighted_score, "total_weighted_achieved": weighted_achieved}
+
+
+def actions_of(initiative_id):
+    " The totals of an initiative's actions as subqueries, evaluated by the UPDATE that applies them "
+    actions = InitiativeAction.objects.filter(initiative_id=initiative_id).order_by().values("initiative_id")
+
+    def total(aggregate, output_field):
+        return Coalesce(Subquery(actions.annotate(total=aggregate).values("total")), Value(0), output_field=output_field)
+
+    return {
+        "action_count": total(Count("pk"), IntegerField()),
+        "total_weighted_score": total(Sum("weighted_score"), DecimalField()),
+        "total_weighted_achieved": total(Sum("weighted_achieved"), DecimalField()),
+    }
+
+
+def initiative_share(initiative_id):
+    " Everything an initiative contributes to its bucket, actions included, as subqueries "
+    initiative = Initiative.objects.filter(pk=initiative_id)
+    return {
+        "initiative_count": 1,
+        "total_weight": Subquery(initiative.values("weight")),
+        "total_target": Subquery(initiative.values("current_target")),
+        **actions_of(initiative_id),
+    }
+
+
+def initiative_buckets(initiative_ids, initiatives=Initiative.objects):
+    " Initiative id -> its current (dimension, objective, status), in one query over ``initiatives`` "
+    return {
+        pk: (dimension_id, objective_id, status_id)
+        for pk, dimension_id, objective_id, status_id in initiatives.filter(id__in=initiative_ids).values_list(
+            "id", "dimension_id", "objective_id", "status_id"
+        )
+    }
+
+
+def add(deltas, bucket, totals, sign=1):
+    " Accumulate ``totals`` (numbers or expressions) into ``deltas[bucket]``, subtracted when ``sign`` is -1 "
+    if bucket is None or None in bucket:
+        return
+    changes = deltas.setdefault(bucket, {})
+    for field, value in totals.items():
+        value = value if sign > 0 else -value
+        changes[field] = changes[field] + value if field in changes else value
+
+
+def apply_deltas(deltas):
+    """
+    Apply accumulated deltas with one ``UPDATE ... SET total = total + delta`` per bucket,
+    so concurrent writers to the same bucket each add theirs instead of overwriting one
+    another. A bucket gaining its first initiative or action is inserted; buckets that
+    empty out stay at zero (the scorecard endpoint hides them) so no writer races a delete.
+    Buckets are updated in key order so concurrent writers lock them in the same order.
+    """
+    now = timezone.now()
+    for key, changes in sorted(deltas.items()):
+        changes = {field: value for field, value in changes.items() if hasattr(value, "resolve_expression") or value}
+        if not changes:
+            continue
+        dimension_id, objective_id, status_id = key
+        bucket = ScorecardRollup.objects.filter(dimension_id=dimension_id, objective_id=objective_id, status_id=status_id)
+        increments = {field: F(field) + value for field, value in changes.items()}
+        if bucket.update(modified_at=now, **increments):
+            continue
+        if not any(isinstance(changes.get(field), int) and changes[field] > 0 for field in ("initiative_count", "action_count")):
+            # Nothing to subtract from; a rebuild (refresh_buckets) repairs a bucket that drifted
+            continue
+        try:
+            with transaction.atomic():
+                ScorecardRollup.objects.create(
+                    dimension_id=dimension_id, objective_id=objective_id, status_id=status_id, **changes
+                )
+        except IntegrityError:
+            # Another writer inserted the bucket first
+            bucket.update(modified_at=now, **increments)
+
+
+def bucket_filter(keys, prefix=""):
+    " Build an OR filter matching the given (dimension, objective, status) buckets "
+    query = Q()
+    for dimension_id, objective_id, status_id in keys:
+        query |= Q(**{
+            f"{prefix}dimension_id": dimension_id,
+            f"{prefix}objective_id": objective_id,
+            f"{prefix}status_id": status_id,
+        })
+    return query
+
+
+def refresh_buckets(keys):
+    """
+    Rebuild the scorecard rows for the given (dimension_id, objective_id, status_id) keys
+    from the initiatives and actions themselves.
+
+    For bulk loads and backfills that bypass the signals; requests keep the rollup current
+    with ``apply_deltas`` instead. Only the touched buckets are aggregated, and buckets left
+    without initiatives are zeroed.
+    """
+    keys = {key for key in keys if key and None not in key}
+    if not keys:
+        return
+
+    totals = {}
+    initiatives = (
+        Initiative.objects.filter(bucket_filter(keys))
+        .values("dimension_id", "objective_id", "status_id")
+        .annotate(initiative_count=Count("id"), total_weight=Sum("weight"), total_target=Sum("current_target"))
+        .order_by()
+    )
+    for row in initiatives:
+        key = (row["dimension_id"], row["objective_id"], row["status_id"])
+        totals[key] = {
+            "initiative_count": row["initiative_count"],
+            "total_weight": row["total_weight"] or 0,
+            "total_target": row["total_target"] or 0,
+            "action_count": 0,
+            "total_weighted_score": 0,
+            "total_weighted_achieved": 0,
+        }
+
+    actions = (
+        InitiativeAction.objects.filter(bucket_filter(keys, prefix="initiative__"))
+        .values("initiative__dimension_id", "initiative__objective_id", "initiative__status_id")
+        .annotate(
+            action_count=Count("id"),
+            total_weighted_score=Sum("weighted_score"),
+            total_weighted_achieved=Sum("weighted_achieved"),
+        )
+        .order_by()
+    )
+    for row in actions:
+        key = (row["initiative__dimension_id"], row["initiative__objective_id"], row["initiative__status_id"])
+        if key in totals:
+            totals[key]["action_count"] = row["action_count"]
+            totals[key]["total_weighted_score"] = row["total_weighted_score"] or 0
+            totals[key]["total_weighted_achieved"] = row["total_weighted_achieved"] or 0
+
+    if totals:
+        ScorecardRollup.objects.bulk_create(
+            [
+                ScorecardRollup(dimension_id=key[0], objective_id=key[1], status_id=key[2], **values)
+                for key, values in totals.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["dimension", "objective", "status"],
+            update_fields=ROLLUP_TOTALS + ["modified_at"],
+        )
+
+    empty = keys - totals.keys()
+    if empty:
+        ScorecardRollup.objects.filter(bucket_filter(empty)).update(
+            modified_at=timezone.now(), **{field: 0 for field in ROLLUP_TOTALS}
+        )
+
+
+def refresh_initiatives(initiative_ids):
+    " Rebuild the buckets the given initiatives currently belong to "
+    refresh_buckets(set(initiative_buckets(initiative_ids).values()))
@@ -1,5 +1,16 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
 from rest_framework import serializers
-from .models import StrategicObjective, Dimension, Initiative, InitiativeAction, ApprovalEntry, ApprovalStatus
+from authentication.principal import get_principal
+from .rollups import action_totals, add, apply_deltas, initiative_buckets
+from .transitions import apply_transition
+from .evidence import SHA256
+from .previews import can_preview
+from .models import StrategicObjective, Dimension, Initiative, InitiativeAction, ApprovalEntry, ApprovalStatus, ScorecardRollup, EvidenceUpload, validate_file_extension
 
 class DimensionSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.get_full_name')
@@ -80,8 +91,9 @@ class InitiativeSerializer(serializers.ModelSerializer):
         if request and request.user.is_authenticated:
             user = request.user
             validated_data['created_by'] = user
-            if user.dimension:
-                validated_data['dimension'] = user.dimension
+            dimension_id = get_principal(request).dimension_id
+            if dimension_id:
+                validated_data['dimension_id'] = dimension_id
             else:
                 raise serializers.ValidationError({"dimension": "User is not mapped to a dimension(division or department)"})
         
@@ -97,6 +109,7 @@ class InitiativeSerializer(serializers.ModelSerializer):
 class InitiativeActionSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.get_full_name')
     modified_by = serializers.SerializerMethodField()
+    evidence_preview = serializers.SerializerMethodField()
     created_at = serializers.DateTimeField(format="%b %d, %Y %I:%M %p", read_only=True)
     modified_at = serializers.DateTimeField(format="%b %d, %Y %I:%M %p", read_only=True)
 
@@ -104,19 +117,28 @@ class InitiativeActionSerializer(serializers.ModelSerializer):
         model = InitiativeAction
         fields = [
             'id', 'initiative', 'cummulative_actual', 'action_description', 'action_factor', 'raw_score', 'weighted_score', 'weighted_achieved',
-            'created_by', 'created_at', 'modified_by', 'modified_at'
+            'evidence', 'evidence_blob', 'evidence_preview', 'created_by', 'created_at', 'modified_by', 'modified_at'
         ]
-        read_only_fields = ['id','created_by', 'created_at', 'modified_by', 'modified_at']
+        read_only_fields = ['id', 'evidence_blob', 'evidence_preview', 'created_by', 'created_at', 'modified_by', 'modified_at']
 
     def validate(self, attrs):
         initiative = attrs.get("initiative") or getattr(self.instance, "initiative", None)
-        if initiative and initiative.status.code != "APPROVED":
+        if initiative and initiative.status_id != "APPROVED":
             raise serializers.ValidationError("You can only add or update initiative actions for approved initiatives.")
         return super().validate(attrs)
 
     def get_modified_by(self, obj):
         return obj.modified_by.get_full_name if obj.modified_by else None
 
+    def get_evidence_preview(self, obj):
+        " Thumbnail URL for images and PDFs; ?size=page gives the larger first-page preview "
+        blob = obj.evidence_blob
+        if blob is None or not can_preview(blob.content_type):
+            return None
+        url = reverse("initiativeaction-preview-evidence", kwargs={"pk": obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
     def create(self, validated_data):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
@@ -131,6 +153,125 @@ class InitiativeActionSerializer(serializers.ModelSerializer):
             validated_data['modified_by'] = request.user
         return super().update(instance, validated_data)
     
+class InitiativeActionBulkListSerializer(serializers.ListSerializer):
+    """
+    Validates and writes a batch of initiative actions.
+
+    The initiatives (scoped to the user's dimension) and the actions being updated are each
+    loaded with one query for the whole batch, and the writes go through bulk_create/bulk_update in one transaction.
+    Errors are reported per item, in request order.
+    """
+    def to_internal_value(self, data):
+        " Batch checks run here so their errors stay aligned with the submitted items "
+        attrs = super().to_internal_value(data)
+        queryset = self.context["queryset"]
+        initiative_ids = {item["initiative"] for item in attrs}
+        update_ids = {item["id"] for item in attrs if item.get("id")}
+
+        self.instances = queryset.in_bulk(update_ids) if update_ids else {}
+        # Initiatives outside the user's dimension read as missing. The buckets of the actions'
+        # current initiatives come along for the rollup deltas.
+        self.buckets = initiative_buckets(
+            initiative_ids | {action.initiative_id for action in self.instances.values()}, self.context["initiatives"]
+        )
+        statuses = {pk: bucket[2] for pk, bucket in self.buckets.items() if pk in initiative_ids}
+
+        errors, seen = [], set()
+        for item in attrs:
+            item_errors = {}
+            if item.get("id") in seen:
+                item_errors["id"] = [f"Initiative action {item['id']} appears more than once in this request."]
+            elif item.get("id"):
+                seen.add(item["id"])
+            if item["initiative"] not in statuses:
+                item_errors["initiative"] = [f"Invalid pk \"{item['initiative']}\" - object does not exist."]
+            elif statuses[item["initiative"]] != "APPROVED":
+                item_errors["non_field_errors"] = ["You can only add or update initiative actions for approved initiatives."]
+            if item.get("id") and item["id"] not in self.instances and "id" not in item_errors:
+                item_errors["id"] = [f"Initiative action {item['id']} does not exist."]
+            errors.append(item_errors)
+
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def create(self, validated_data):
+        " Create items without an id and update items with one; ``created`` counts the new rows "
+        request = self.context.get("request")
+        user = request.user if request and request.user.is_authenticated else None
+        now = timezone.now()
+
+        results, to_create, to_update = [], [], []
+        deltas = {}
+        update_fields = {"modified_by", "modified_at"}
+        for item in validated_data:
+            item = dict(item)
+            item_id = item.pop("id", None)
+            item["initiative_id"] = item.pop("initiative")
+            if item_id:
+                instance = self.instances[item_id]
+                previous_id, score, achieved = instance._loaded_scorecard
+                add(deltas, self.buckets[previous_id], action_totals(score, achieved), sign=-1)
+                for attr, value in item.items():
+                    setattr(instance, attr, value)
+                instance.modified_by = user
+                instance.modified_at = now
+                update_fields.update(field.removesuffix("_id") for field in item)
+                to_update.append(instance)
+            else:
+                instance = InitiativeAction(created_by=user, **item)
+                to_create.append(instance)
+            add(deltas, self.buckets[instance.initiative_id], action_totals(instance.weighted_score, instance.weighted_achieved))
+            results.append(instance)
+
+        with transaction.atomic():
+            if to_create:
+                InitiativeAction.objects.bulk_create(to_create)
+            if to_update:
+                InitiativeAction.objects.bulk_update(to_update, sorted(update_fields))
+            apply_deltas(deltas)
+
+        self.created = len(to_create)
+        return results
+
+class InitiativeActionBulkSerializer(InitiativeActionSerializer):
+    id = serializers.IntegerField(required=False, min_value=1)
+    initiative = serializers.IntegerField()
+
+    class Meta(InitiativeActionSerializer.Meta):
+        list_serializer_class = InitiativeActionBulkListSerializer
+
+    def validate(self, attrs):
+        " Initiative status is checked once for the whole batch by the list serializer "
+        return attrs
+
+class EvidenceUploadSerializer(serializers.ModelSerializer):
+    " Opens (and reports on) a resumable evidence upload; chunks are PUT to the upload itself "
+    complete = serializers.BooleanField(source="is_complete", read_only=True)
+
+    class Meta:
+        model = EvidenceUpload
+        fields = ['id', 'action', 'filename', 'size', 'sha256', 'received', 'complete', 'blob', 'created_at', 'modified_at']
+        read_only_fields = ['id', 'action', 'received', 'blob', 'created_at', 'modified_at']
+
+    def validate_filename(self, value):
+        try:
+            validate_file_extension(ContentFile(b"", name=value))
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        return value
+
+    def validate_size(self, value):
+        if not 0 < value <= settings.EVIDENCE_MAX_SIZE:
+            raise serializers.ValidationError(f"Evidence files must be between 1 byte and {settings.EVIDENCE_MAX_SIZE} bytes.")
+        return value
+
+    def validate_sha256(self, value):
+        value = value.lower()
+        if value and not SHA256.match(value):
+            raise serializers.ValidationError("Expected a hex SHA-256 digest.")
+        return value
+
 class ApprovalStatusSerializer(serializers.ModelSerializer):
     created_by = serializers.ReadOnlyField(source='created_by.get_full_name')
     modified_by = serializers.SerializerMethodField()
@@ -153,6 +294,36 @@ class ApprovalStatusSerializer(serializers.ModelSerializer):
             validated_data['modified_by'] = request.user
         return super().update(instance, validated_data)
     
+class ScorecardRollupSerializer(serializers.ModelSerializer):
+    modified_at = serializers.DateTimeField(format="%b %d, %Y %I:%M %p", read_only=True)
+
+    class Meta:
+        model = ScorecardRollup
+        fields = [
+            'dimension', 'objective', 'status', 'initiative_count', 'action_count', 'total_weight', 'total_target',
+            'total_weighted_score', 'total_weighted_achieved', 'modified_at'
+        ]
+        read_only_fields = fields
+
+class InitiativeSummarySerializer(serializers.ModelSerializer):
+    objective = serializers.ReadOnlyField(source='objective.name')
+    dimension = serializers.ReadOnlyField(source='dimension.name')
+
+    class Meta:
+        model = Initiative
+        fields = ['id', 'objective', 'dimension', 'description', 'weight', 'current_target', 'status']
+        read_only_fields = fields
+
+class ApprovalInboxSerializer(serializers.ModelSerializer):
+    initiative = InitiativeSummarySerializer(source='approval_entry', read_only=True)
+    requestor = serializers.ReadOnlyField(source='requestor.get_full_name')
+    requested_at = serializers.DateTimeField(format="%b %d, %Y %I:%M %p", read_only=True)
+
+    class Meta:
+        model = ApprovalEntry
+        fields = ['id', 'initiative', 'requestor', 'requested_at', 'approver', 'status', 'comment']
+        read_only_fields = fields
+
 class BaseApprovalSerializer(serializers.ModelSerializer):
     class Meta:
         model = ApprovalEntry
@@ -162,102 +333,44 @@ class BaseApprovalSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id','requestor', 'requested_at', 'approver', 'actioned_at', 'status']
 
-    def set_status_and_user(self, validated_data, status_code, role="approver"):
-        try:
-            status = ApprovalStatus.objects.get(code=status_code)
-        except ApprovalStatus.DoesNotExist:
-            raise serializers.ValidationError(f"'{status_code}' status not defined.")
+    transition = None
 
+    def create(self, validated_data):
         request = self.context.get("request")
-        if request and request.user.is_authenticated:
-            validated_data[role] = request.user
-            validated_data["status"] = status
-        return validated_data
+        user = request.user if request and request.user.is_authenticated else None
+        return apply_transition(self.transition, validated_data["approval_entry"], user, validated_data.get("comment"))
     
 class RequestApprovalSerializer(BaseApprovalSerializer):
+    approval_entry = serializers.PrimaryKeyRelatedField(queryset=Initiative.objects.select_related("dimension"))
+    transition = "request"
+
     def validate_approval_entry(self, value):
-        if value.status.code != "OPEN":
+        if value.status_id != "OPEN":
             raise serializers.ValidationError("Only Initiatives with status 'OPEN' can be submitted for approval.")
+        if not value.dimension.head_id:
+            raise serializers.ValidationError("The initiative's dimension has no head to approve it.")
         return value
-
-    def create(self, validated_data):
-        validated_data = self.set_status_and_user(validated_data, "PENDINGAPPROVAL", role="requestor")
-        approval_entry = super().create(validated_data)
-
-        # Update the Initiative's status
-        init_instance = approval_entry.approval_entry
-        try:
-            pending_status = ApprovalStatus.objects.get(code="PENDINGAPPROVAL")
-        except ApprovalStatus.DoesNotExist:
-            raise serializers.ValidationError("'PENDINGAPPROVAL' status not defined.")
-
-        init_instance.status = pending_status
-        init_instance.save(update_fields=["status"])
-
-        return approval_entry
     
 class ApproveApprovalRequestSerializer(BaseApprovalSerializer):
+    transition = "approve"
+
     def validate_approval_entry(self, value):
-        if value.status.code != "PENDINGAPPROVAL":
+        if value.status_id != "PENDINGAPPROVAL":
             raise serializers.ValidationError("Only Initiatives with status 'PENDINGAPPROVAL' can be approved.")
         return value
-
-    def create(self, validated_data):
-        validated_data = self.set_status_and_user(validated_data, "APPROVED", role="approver")
-        approval_entry = super().create(validated_data)
-
-
-        init_instance = approval_entry.approval_entry
-        try:
-            approved_status = ApprovalStatus.objects.get(code="APPROVED")
-        except ApprovalStatus.DoesNotExist:
-            raise serializers.ValidationError("'APPROVED' status not defined.")
-
-        init_instance.status = approved_status
-        init_instance.save(update_fields=["status"])
-
-        return approval_entry
     
 class RejectApprovalRequestSerializer(BaseApprovalSerializer):
+    transition = "reject"
+
     def validate_approval_entry(self, value):
-        if value.status.code != "PENDINGAPPROVAL":
+        if value.status_id != "PENDINGAPPROVAL":
             raise serializers.ValidationError("Only Initiatives with status 'PENDINGAPPROVAL' can be rejected.")
         return value
-
-    def create(self, validated_data):
-        validated_data = self.set_status_and_user(validated_data, "REJECTED", role="approver")
-        approval_entry = super().create(validated_data)
-
-
-        init_instance = approval_entry.approval_entry
-        try:
-            open_status = ApprovalStatus.objects.get(code="OPEN")
-        except ApprovalStatus.DoesNotExist:
-            raise serializers.ValidationError("'OPEN' status not defined.")
-
-        init_instance.status = open_status
-        init_instance.save(update_fields=["status"])
-
-        return approval_entry
     
 class CancelApprovalRequestSerializer(BaseApprovalSerializer):
+    transition = "cancel"
+
     def validate_approval_entry(self, value):
-        if value.status.code != "PENDINGAPPROVAL":
+        if value.status_id != "PENDINGAPPROVAL":
             raise serializers.ValidationError("Only Initiatives with status 'PENDINGAPPROVAL' can be cancelled.")
         return value
-
-    def create(self, validated_data):
-        validated_data = self.set_status_and_user(validated_data, "CANCELLED", role="approver")
-        approval_entry = super().create(validated_data)
-
-
-        init_instance = approval_entry.approval_entry
-        try:
-            open_status = ApprovalStatus.objects.get(code="OPEN")
-        except ApprovalStatus.DoesNotExist:
-            raise serializers.ValidationError("'OPEN' status not defined.")
-
-        init_instance.status = open_status
-        init_instance.save(update_fields=["status"])
-
-        return approval_entry
@@ -0,0 +1,86 @@
+from django.dispatch import receiver
+from django.db.models.signals import post_save, post_delete
+from .models import ApprovalStatus, Initiative, InitiativeAction
+from .rollups import (
+    action_totals, actions_of, add, apply_deltas, initiative_buckets, initiative_totals,
+    refresh_buckets, refresh_initiatives,
+)
+from . import statuses
+
+
+def loaded_scorecard(instance):
+    " The row's scorecard share as loaded, or None when it was not loaded in full "
+    loaded = getattr(instance, "_loaded_scorecard", None)
+    if loaded is None or None in loaded[1:]:
+        return None
+    return loaded
+
+
+@receiver(post_save, sender=Initiative)
+def refresh_initiative_scorecard(sender, instance, created=False, raw=False, **kwargs):
+    """Move the initiative's share of the scorecard, including out of the bucket it left."""
+    if raw:
+        return
+    loaded = loaded_scorecard(instance)
+    bucket = instance.scorecard_bucket
+    deltas = {}
+    if created:
+        add(deltas, bucket, initiative_totals(instance.weight, instance.current_target))
+    elif loaded is None:
+        refresh_buckets({bucket, getattr(instance, "_loaded_scorecard", (None,))[0]})
+    elif loaded[0] == bucket:
+        add(deltas, bucket, {
+            "total_weight": instance.weight - loaded[1],
+            "total_target": instance.current_target - loaded[2],
+        })
+    else:
+        add(deltas, loaded[0], {**initiative_totals(loaded[1], loaded[2]), **actions_of(instance.pk)}, sign=-1)
+        add(deltas, bucket, {**initiative_totals(instance.weight, instance.current_target), **actions_of(instance.pk)})
+    apply_deltas(deltas)
+    instance._loaded_scorecard = (bucket, instance.weight, instance.current_target)
+
+
+@receiver(post_delete, sender=Initiative)
+def drop_initiative_scorecard(sender, instance, **kwargs):
+    " Actions protect their initiative, so a deleted initiative takes only its own totals along "
+    loaded = loaded_scorecard(instance)
+    if loaded is None:
+        refresh_buckets({instance.scorecard_bucket})
+        return
+    deltas = {}
+    add(deltas, loaded[0], initiative_totals(loaded[1], loaded[2]), sign=-1)
+    apply_deltas(deltas)
+
+
+@receiver(post_save, sender=InitiativeAction)
+def refresh_action_scorecard(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    loaded = None if created else loaded_scorecard(instance)
+    if not created and loaded is None:
+        refresh_initiatives({instance.initiative_id, getattr(instance, "_loaded_scorecard", (None,))[0]} - {None})
+    else:
+        buckets = initiative_buckets({instance.initiative_id} | ({loaded[0]} if loaded else set()))
+        deltas = {}
+        if loaded:
+            add(deltas, buckets.get(loaded[0]), action_totals(loaded[1], loaded[2]), sign=-1)
+        add(deltas, buckets.get(instance.initiative_id), action_totals(instance.weighted_score, instance.weighted_achieved))
+        apply_deltas(deltas)
+    instance._loaded_scorecard = (instance.initiative_id, instance.weighted_score, instance.weighted_achieved)
+
+
+@receiver(post_delete, sender=InitiativeAction)
+def drop_action_scorecard(sender, instance, **kwargs):
+    loaded = loaded_scorecard(instance)
+    if loaded is None:
+        refresh_initiatives([instance.initiative_id])
+        return
+    deltas = {}
+    add(deltas, initiative_buckets([loaded[0]]).get(loaded[0]), action_totals(loaded[1], loaded[2]), sign=-1)
+    apply_deltas(deltas)
+
+
+@receiver(post_save, sender=ApprovalStatus)
+@receiver(post_delete, sender=ApprovalStatus)
+def invalidate_status_registry(sender, **kwargs):
+    statuses.invalidate()
@@ -0,0 +1,56 @@
+import threading
+import time
+from django.conf import settings
+from django.db import transaction
+from core.metrics import cache_lookup
+from .models import ApprovalStatus
+
+_lock = threading.Lock()
+_statuses = None
+_loaded_at = 0.0
+
+
+def _registry(reload=False):
+    global _statuses, _loaded_at
+    ttl = getattr(settings, "APPROVAL_STATUS_CACHE_TTL", 300)
+    statuses = _statuses
+    if not reload and statuses is not None and time.monotonic() - _loaded_at < ttl:
+        cache_lookup("approval_status", hit=True)
+        return statuses
+
+    with _lock:
+        stale = reload or _statuses is None or time.monotonic() - _loaded_at >= ttl
+        if stale:
+            _statuses = {status.code: status for status in ApprovalStatus.objects.all()}
+            _loaded_at = time.monotonic()
+        cache_lookup("approval_status", hit=not stale)
+        return _statuses
+
+
+def get_status(code):
+    """
+    Return the ApprovalStatus for ``code`` from the process-local registry.
+
+    The table is loaded once and served from memory until an ApprovalStatus is saved or
+    deleted (or APPROVAL_STATUS_CACHE_TTL passes, which bounds staleness across worker
+    processes). Raises ApprovalStatus.DoesNotExist, like ``objects.get()``, for unknown codes.
+    """
+    code = code.upper()
+    status = _registry().get(code)
+    if status is None:
+        # Possibly created by another process since we loaded
+        status = _registry(reload=True).get(code)
+    if status is None:
+        raise ApprovalStatus.DoesNotExist(f"Approval status '{code}' does not exist.")
+    return status
+
+
+def clear():
+    global _statuses
+    _statuses = None
+
+
+def invalidate():
+    " Drop the registry now and again once the surrounding transaction commits "
+    clear()
+    transaction.on_commit(clear)
@@ -1,3 +1,882 @@
-from django.test import TestCase
+import hashlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import uuid
+from decimal import Decimal
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image, UnidentifiedImageError
+from prometheus_client import REGISTRY
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from authentication.models import User
+from core.testing import QueryBudgetMixin
+from . import evidence, previews, statuses
+from .models import ApprovalEntry, ApprovalStatus, Dimension, EvidenceBlob, Initiative, InitiativeAction, ScorecardRollup, StrategicObjective
+from .transitions import apply_transition
+from .views import ApprovalInboxViewSet, InitiativeActionViewSet, InitiativeViewSet, RequestApprovalViewSet, ScorecardViewSet
 
-# Create your tests here.
+DIMENSIONS = 17
+OBJECTIVES = 8
+INITIATIVES_PER_DIMENSION = 300
+ACTIONS_PER_INITIATIVE = 4
+STATUS_CODES = ["OPEN", "PENDINGAPPROVAL", "APPROVED", "REJECTED", "CANCELLED"]
+
+
+def seed_volume(owner):
+    " Bulk insert a hospital-sized dataset and refresh planner statistics "
+    rng = random.Random(7)
+    for code in STATUS_CODES:
+        ApprovalStatus.objects.create(code=code, description=code.title(), created_by=owner)
+    dimensions = Dimension.objects.bulk_create([Dimension(name=f"Dimension {n}", head=owner) for n in range(DIMENSIONS)])
+    objectives = StrategicObjective.objects.bulk_create(
+        [StrategicObjective(name=f"Objective {n}", created_by=owner) for n in range(OBJECTIVES)]
+    )
+    initiatives = Initiative.objects.bulk_create([
+        Initiative(
+            objective=rng.choice(objectives), dimension=dimension, description=f"Initiative {n}", unit_of_measure="%",
+            weight=Decimal("0.100"), previous_target=Decimal("0.500"), current_target=Decimal("0.600"),
+            cumulative_target=Decimal("0.700"), status_id=rng.choice(STATUS_CODES), created_by=owner,
+        )
+        for dimension in dimensions for n in range(INITIATIVES_PER_DIMENSION)
+    ], batch_size=2000)
+    InitiativeAction.objects.bulk_create([
+        InitiativeAction(
+            initiative=initiative, cummulative_actual=Decimal("0.300"), action_description="Action", action_factor="Factor",
+            raw_score=Decimal("1.00"), weighted_score=Decimal("0.50"), weighted_achieved=Decimal("0.25"),
+            deadline="Q4", created_by=owner,
+        )
+        for initiative in initiatives for n in range(ACTIONS_PER_INITIATIVE)
+    ], batch_size=5000)
+    ApprovalEntry.objects.bulk_create([
+        ApprovalEntry(requestor=owner, approver=owner, approval_entry=initiative, status_id=initiative.status_id)
+        for initiative in initiatives
+    ], batch_size=5000)
+    ScorecardRollup.objects.bulk_create([
+        ScorecardRollup(dimension=dimension, objective=objective, status_id=code)
+        for dimension in dimensions for objective in objectives for code in STATUS_CODES
+    ])
+    with connection.cursor() as cursor:
+        for model in (Initiative, InitiativeAction, ApprovalEntry, ScorecardRollup, User):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
+    return dimensions, initiatives
+
+
+@skipUnless(connection.vendor == "postgresql", "Query plans are asserted against PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Seeds a realistic volume and asserts, via EXPLAIN, that each viewset's
+    get_queryset path is answered from an index rather than a sequential scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="planner", email="planner@nbihosp.org", is_superuser=True)
+        cls.dimensions, cls.initiatives = seed_volume(cls.admin)
+        cls.member = User.objects.create(username="member", email="member@nbihosp.org", dimension=cls.dimensions[3])
+
+    def setUp(self):
+        cache.clear()
+
+    def viewset_queryset(self, viewset_class, user, params=None, action="list"):
+        django_request = RequestFactory().get("/", params or {})
+        django_request.user = user
+        request = Request(django_request)
+        request.user = user
+        view = viewset_class(request=request, format_kwarg=None, args=(), kwargs={}, action=action)
+        queryset = view.filter_queryset(view.get_queryset())
+        pagination = view.pagination_class
+        if pagination is not None and getattr(pagination, "ordering", None):
+            queryset = queryset.order_by(*pagination.ordering)[:50]
+        return queryset
+
+    def assertIndexScan(self, queryset, table):
+        plan = queryset.explain()
+        self.assertNotIn(f"Seq Scan on {table}", plan, f"Sequential scan on {table}:\n{plan}")
+        # A bitmap scan names the table on its Bitmap Heap Scan node, above the index it reads
+        self.assertRegex(plan, rf"(Index (Only )?Scan( Backward)? using \w+|Bitmap Heap Scan) on {table}\b", plan)
+
+    def test_initiative_list_scoped_to_dimension(self):
+        self.assertIndexScan(self.viewset_queryset(InitiativeViewSet, self.member), "posts_initiative")
+
+    def test_initiative_dimension_status_filter(self):
+        queryset = Initiative.objects.filter(dimension=self.dimensions[5], status_id="APPROVED")
+        plan = queryset.explain()
+        self.assertIn("init_dimension_status_idx", plan, plan)
+
+    def test_initiative_action_list_scoped_to_dimension(self):
+        self.assertIndexScan(self.viewset_queryset(InitiativeActionViewSet, self.member), "posts_initiativeaction")
+
+    def test_actions_of_one_initiative(self):
+        queryset = InitiativeAction.objects.filter(initiative=self.initiatives[42]).order_by("created_at")
+        plan = queryset.explain()
+        self.assertIn("init_act_initiative_idx", plan, plan)
+
+    def test_approval_entries_by_status(self):
+        queryset = ApprovalEntry.objects.filter(status_id="PENDINGAPPROVAL").order_by("-requested_at")[:50]
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan on posts_approvalentry", plan, plan)
+        self.assertRegex(plan, r"appent_status_idx|appent_requested_idx", plan)
+
+    def test_request_approval_list(self):
+        self.assertIndexScan(self.viewset_queryset(RequestApprovalViewSet, self.admin), "posts_approvalentry")
+
+    def test_approval_inbox(self):
+        queryset = self.viewset_queryset(ApprovalInboxViewSet, self.member)
+        self.assertIndexScan(queryset, "posts_approvalentry")
+
+    def test_scorecard_scoped_to_dimension(self):
+        plan = self.viewset_queryset(ScorecardViewSet, self.member).explain()
+        self.assertNotIn("Seq Scan on posts_scorecardrollup", plan, plan)
+        self.assertTrue(re.search(r"uniq_scorecard_bucket|scorecardrollup_dimension_id", plan), plan)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    """
+    Every route in posts/urls.py must answer in a constant number of queries whether it
+    serves N or 10N rows. Each seeded row gets its own creator / modifier so per-row user
+    lookups show up as repeated queries.
+    """
+    serial = itertools.count()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="budget", email="budget@nbihosp.org", is_superuser=True)
+        for code in STATUS_CODES:
+            ApprovalStatus.objects.create(code=code, description=code.title(), created_by=cls.admin)
+        cls.dimension = Dimension.objects.create(name="Budget dimension", head=cls.admin, created_by=cls.admin)
+        cls.objective = StrategicObjective.objects.create(name="Budget objective", created_by=cls.admin)
+        cls.initiative = cls.make_initiatives(1, status_id="APPROVED")[0]
+        cls.action = cls.make_actions(1)[0]
+        cls.entry = cls.make_entries(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        statuses.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    @classmethod
+    def make_users(cls, count):
+        return User.objects.bulk_create([
+            User(username=f"budget{n}", email=f"budget{n}@nbihosp.org", first_name="Budget", last_name=str(n))
+            for n in itertools.islice(cls.serial, count)
+        ])
+
+    @classmethod
+    def make_dimensions(cls, count):
+        users = cls.make_users(count)
+        return Dimension.objects.bulk_create([
+            Dimension(name=f"Dimension {user.pk}", head=user, created_by=user, modified_by=user) for user in users
+        ])
+
+    @classmethod
+    def make_objectives(cls, count):
+        users = cls.make_users(count)
+        return StrategicObjective.objects.bulk_create([
+            StrategicObjective(name=f"Objective {user.pk}", created_by=user, modified_by=user) for user in users
+        ])
+
+    @classmethod
+    def make_statuses(cls, count):
+        creators, modifiers = cls.make_users(count), cls.make_users(count)
+        return ApprovalStatus.objects.bulk_create([
+            ApprovalStatus(code=f"STATUS{creator.pk}", description="Status", created_by=creator, modified_by=modifier)
+            for creator, modifier in zip(creators, modifiers)
+        ])
+
+    @classmethod
+    def make_initiatives(cls, count, status_id="OPEN"):
+        users = cls.make_users(count)
+        return Initiative.objects.bulk_create([
+            Initiative(
+                objective=cls.objective, dimension=cls.dimension, description="Initiative", unit_of_measure="%",
+                weight=Decimal("0.100"), previous_target=Decimal("0.500"), current_target=Decimal("0.600"),
+                cumulative_target=Decimal("0.700"), status_id=status_id, created_by=user, modified_by=user,
+            )
+            for user in users
+        ])
+
+    @classmethod
+    def make_actions(cls, count):
+        users = cls.make_users(count)
+        return InitiativeAction.objects.bulk_create([
+            InitiativeAction(
+                initiative=cls.initiative, cummulative_actual=Decimal("0.300"), action_description="Action",
+                action_factor="Factor", raw_score=Decimal("1.00"), weighted_score=Decimal("0.50"),
+                weighted_achieved=Decimal("0.25"), deadline="Q4", created_by=user, modified_by=user,
+            )
+            for user in users
+        ])
+
+    @classmethod
+    def make_entries(cls, count):
+        users = cls.make_users(count)
+        initiatives = cls.make_initiatives(count, status_id="PENDINGAPPROVAL")
+        return ApprovalEntry.objects.bulk_create([
+            ApprovalEntry(requestor=user, approver=cls.admin, approval_entry=initiative, status_id="PENDINGAPPROVAL")
+            for user, initiative in zip(users, initiatives)
+        ])
+
+    @classmethod
+    def make_scorecards(cls, count):
+        return ScorecardRollup.objects.bulk_create([
+            ScorecardRollup(dimension=cls.dimension, objective=objective, status_id="OPEN")
+            for objective in cls.make_objectives(count)
+        ])
+
+    def get(self, url):
+        return lambda: self.client.get(url)
+
+    def test_dimensions(self):
+        self.assertQueryBudget(2, self.get("/posts/dimensions/"), self.make_dimensions)
+        self.assertQueryBudget(1, self.get(f"/posts/dimensions/{self.dimension.pk}/"), self.make_dimensions)
+
+    def test_strategic_objectives(self):
+        self.assertQueryBudget(2, self.get("/posts/strategicobjectives/"), self.make_objectives)
+        self.assertQueryBudget(1, self.get(f"/posts/strategicobjectives/{self.objective.pk}/"), self.make_objectives)
+
+    def test_initiatives(self):
+        self.assertQueryBudget(2, self.get("/posts/initiatives/"), self.make_initiatives)
+        self.assertQueryBudget(1, self.get(f"/posts/initiatives/{self.initiative.pk}/"), self.make_initiatives)
+        self.assertQueryBudget(1, self.get("/posts/initiatives/export/"), self.make_initiatives)
+
+    def test_initiative_actions(self):
+        self.assertQueryBudget(2, self.get("/posts/initiativeactions/"), self.make_actions)
+        self.assertQueryBudget(1, self.get(f"/posts/initiativeactions/{self.action.pk}/"), self.make_actions)
+        self.assertQueryBudget(1, self.get("/posts/initiativeactions/export/"), self.make_actions)
+
+    def test_exports_stream_the_scoped_rows(self):
+        self.make_initiatives(3)
+        response = self.client.get("/posts/initiatives/export/", {"file_format": "csv"})
+        self.assertTrue(response.streaming)
+        self.assertIn('filename="initiatives.csv"', response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "objective_id", "objective__name"])
+        self.assertEqual(len(lines), Initiative.objects.count() + 1)
+
+        rows = [json.loads(line) for line in b"".join(
+            self.client.get("/posts/initiatives/export/", {"file_format": "ndjson"}).streaming_content
+        ).decode().splitlines()]
+        self.assertEqual([row["id"] for row in rows], sorted(Initiative.objects.values_list("id", flat=True)))
+        self.assertEqual(rows[0]["weight"], "0.100")
+
+        self.assertEqual(self.client.get("/posts/initiatives/export/", {"file_format": "xlsx"}).status_code, 400)
+        outsider = User.objects.create(
+            username="export-outsider", email="export-outsider@nbihosp.org",
+            dimension=Dimension.objects.create(name="Export dimension", created_by=self.admin),
+        )
+        self.client.force_authenticate(outsider)
+        response = self.client.get("/posts/initiatives/export/")
+        self.assertEqual(len(b"".join(response.streaming_content).decode().splitlines()), 1)
+
+    def scraped_requests(self, route, **headers):
+        " Sum of pt_http_requests_total over every status of ``route``, as scraped from /metrics "
+        response = self.client.get("/metrics", **headers)
+        self.assertEqual(response.status_code, 200)
+        return sum(
+            float(line.rsplit(" ", 1)[1]) for line in response.content.decode().splitlines()
+            if line.startswith("pt_http_requests_total{") and f'route="{route}"' in line
+        )
+
+    def test_metrics_endpoint(self):
+        route = self.client.get("/posts/dimensions/").wsgi_request.resolver_match.route
+        before = self.scraped_requests(route)
+        self.client.get("/posts/dimensions/")
+        self.assertEqual(self.scraped_requests(route), before + 1)
+
+        # Only METRICS_ALLOWED_IPS, or a request with METRICS_TOKEN, may scrape
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.7").status_code, 403)
+        with override_settings(METRICS_TOKEN="scrape-token"):
+            self.scraped_requests(route, REMOTE_ADDR="203.0.113.7", HTTP_AUTHORIZATION="Bearer scrape-token")
+
+    def test_profile_flag(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with override_settings(PROFILE_DIR=directory):
+            response = self.client.get("/posts/dimensions/", {"profile": ""})
+            self.assertEqual(set(response.data), {"data", "profile"})
+            report = response.data["profile"]
+            self.assertEqual((report["id"], report["view"]), (response["X-Profile-Id"], "DimensionViewSet"))
+            self.assertGreaterEqual(report["sql"]["count"], 1)
+            self.assertEqual(self.client.get(f"/profiles/{report['id']}/").data["path"], "/posts/dimensions/?profile=")
+
+            # Anyone else gets the normal response, and no access to stored reports
+            self.client.force_authenticate(User.objects.create(username="no-profile", email="no-profile@nbihosp.org"))
+            response = self.client.get("/posts/dimensions/", {"profile": ""})
+            self.assertNotIn("X-Profile-Id", response)
+            self.assertNotIn("profile", response.data)
+            self.assertEqual(self.client.get(f"/profiles/{report['id']}/").status_code, 403)
+
+    def test_cursor_pages_survive_edits(self):
+        self.make_initiatives(4)
+        url, seen = "/posts/initiatives/?page_size=2", []
+        while url:
+            page = self.client.get(url).data
+            self.assertEqual(set(page), {"next", "previous", "results"})
+            seen += [row["id"] for row in page["results"]]
+            if len(seen) == 2:
+                # Editing a row not reached yet must not move it out of the pages still to come
+                oldest = Initiative.objects.order_by("id").first()
+                oldest.description = "Edited while paging"
+                oldest.save()
+            url = page["next"]
+        self.assertEqual(seen, sorted(Initiative.objects.values_list("id", flat=True), reverse=True))
+
+    def test_timing_covers_streamed_exports(self):
+        with self.assertLogs("core.timing", "INFO") as logs:
+            self.assertIn('queries"', self.client.get("/posts/initiatives/")["Server-Timing"])
+            response = self.client.get("/posts/initiatives/export/")
+            # The export query runs while the body streams, after the headers are sent
+            self.assertNotIn("Server-Timing", response)
+            self.assertEqual(len(logs.records), 1)
+            with CaptureQueriesContext(connection) as queries:
+                b"".join(response.streaming_content)
+        streamed = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((streamed["path"], streamed["status"]), ("/posts/initiatives/export/", 200))
+        self.assertGreaterEqual(streamed["queries"], len(queries))
+        self.assertGreaterEqual(len(queries), 1)
+        self.assertGreater(streamed["db_ms"], 0)
+
+    def test_approval_statuses(self):
+        self.assertQueryBudget(2, self.get("/posts/approvalstatuses/"), self.make_statuses)
+        self.assertQueryBudget(1, self.get("/posts/approvalstatuses/OPEN/"), self.make_statuses)
+
+    def test_approval_entries(self):
+        for route in ("requestapprovals", "approveapprovals", "rejectapprovals", "cancelapprovals"):
+            with self.subTest(route=route):
+                self.assertQueryBudget(2, self.get(f"/posts/{route}/"), self.make_entries)
+                self.assertQueryBudget(1, self.get(f"/posts/{route}/{self.entry.pk}/"), self.make_entries)
+        self.assertQueryBudget(1, self.get("/posts/requestapprovals/export/"), self.make_entries)
+
+    def test_approval_inbox(self):
+        self.assertQueryBudget(2, self.get("/posts/approvalinbox/"), self.make_entries)
+        self.assertQueryBudget(1, self.get(f"/posts/approvalinbox/{self.entry.pk}/"), self.make_entries)
+
+    def test_scorecards(self):
+        self.assertQueryBudget(2, self.get("/posts/scorecards/"), self.make_scorecards)
+
+    def test_bulk_actions(self):
+        item = {
+            "initiative": self.initiative.pk, "cummulative_actual": "0.400", "action_description": "Bulk",
+            "action_factor": "Factor", "raw_score": "1.00", "weighted_score": "0.50", "weighted_achieved": "0.25",
+        }
+        url = "/posts/initiativeactions/bulk/"
+        self.assertEqual(self.client.post(url, [item], format="json").status_code, 201)
+        self.assertEqual(self.client.post(url, [{**item, "id": self.action.pk}], format="json").status_code, 200)
+
+        response = self.client.post(url, [{**item, "id": self.action.pk}, {**item, "id": self.action.pk}], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("more than once", str(response.data[1]["id"]))
+
+    def test_bulk_actions_are_scoped_to_the_users_dimension(self):
+        outsider = User.objects.create(
+            username="bulk-outsider", email="bulk-outsider@nbihosp.org",
+            dimension=Dimension.objects.create(name="Other dimension", created_by=self.admin),
+        )
+        self.client.force_authenticate(outsider)
+        item = {
+            "initiative": self.initiative.pk, "cummulative_actual": "0.400", "action_description": "Bulk",
+            "action_factor": "Factor", "raw_score": "1.00", "weighted_score": "0.50", "weighted_achieved": "0.25",
+        }
+        response = self.client.post("/posts/initiativeactions/bulk/", [item], format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("does not exist", str(response.data[0]["initiative"]))
+        self.assertFalse(InitiativeAction.objects.filter(action_description="Bulk").exists())
+
+    def test_list_etag_follows_author_names(self):
+        etag = self.client.get("/posts/dimensions/")["ETag"]
+        self.assertEqual(self.client.get("/posts/dimensions/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.admin.first_name = "Renamed"
+        self.admin.save()
+        self.assertEqual(self.client.get("/posts/dimensions/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class EvidenceUploadTests(TestCase):
+    " Chunked, resumable evidence uploads stored once per content hash "
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="evidence", email="evidence@nbihosp.org", is_superuser=True)
+        for code in STATUS_CODES:
+            ApprovalStatus.objects.create(code=code, description=code.title(), created_by=cls.admin)
+        initiative = Initiative.objects.create(
+            objective=StrategicObjective.objects.create(name="Evidence objective", created_by=cls.admin),
+            dimension=Dimension.objects.create(name="Evidence dimension", head=cls.admin, created_by=cls.admin),
+            description="Initiative", unit_of_measure="%", weight=Decimal("0.100"), previous_target=Decimal("0.500"),
+            current_target=Decimal("0.600"), cumulative_target=Decimal("0.700"), status_id="APPROVED", created_by=cls.admin,
+        )
+        cls.actions = InitiativeAction.objects.bulk_create([
+            InitiativeAction(
+                initiative=initiative, cummulative_actual=Decimal("0.300"), action_description=f"Action {n}",
+                action_factor="Factor", raw_score=Decimal("1.00"), weighted_score=Decimal("0.50"),
+                weighted_achieved=Decimal("0.25"), deadline="Q4", created_by=cls.admin,
+            )
+            for n in range(2)
+        ])
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media, EVIDENCE_UPLOAD_DIR=f"{media}/uploads")
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.content = bytes(range(256)) * 40
+
+    def start(self, action, **extra):
+        response = self.client.post(
+            f"/posts/initiativeactions/{action.pk}/evidence/",
+            {"filename": "ward-audit.pdf", "size": len(self.content), **extra}, format="json",
+        )
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put(self, upload, start, end, body=None, **headers):
+        body = self.content[start:end + 1] if body is None else body
+        return self.client.put(
+            f"/posts/evidenceuploads/{upload['id']}/", body, content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {start}-{end}/{len(self.content)}", **headers,
+        )
+
+    def test_resumable_upload_and_dedupe(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        upload = self.start(self.actions[0], sha256=sha256)
+
+        first = self.put(upload, 0, 4095, HTTP_X_CHUNK_SHA256=hashlib.sha256(self.content[:4096]).hexdigest())
+        self.assertEqual(first.data["received"], 4096)
+        corrupt = self.put(upload, 4096, 8191, body=b"x" * 4096, HTTP_X_CHUNK_SHA256=hashlib.sha256(self.content[4096:8192]).hexdigest())
+        self.assertEqual(corrupt.status_code, 400)
+        self.assertEqual(self.client.get(f"/posts/evidenceuploads/{upload['id']}/").data["received"], 4096)
+        self.assertEqual(self.put(upload, 8192, len(self.content) - 1).status_code, 400)
+
+        self.put(upload, 4096, 8191)
+        done = self.put(upload, 8192, len(self.content) - 1)
+        self.assertTrue(done.data["complete"], done.data)
+        blob = EvidenceBlob.objects.get()
+        self.assertEqual((blob.sha256, blob.size, blob.content_type), (sha256, len(self.content), "application/pdf"))
+        with blob.file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(InitiativeAction.objects.get(pk=self.actions[0].pk).evidence_blob_id, sha256)
+
+        # Knowing a stored file's hash is not enough to attach it; the bytes must be sent
+        again = self.start(self.actions[1], sha256=sha256)
+        self.assertFalse(again["complete"])
+        self.assertIsNone(InitiativeAction.objects.get(pk=self.actions[1].pk).evidence_blob_id)
+
+    def test_chunks_never_rewrite_stored_bytes(self):
+        upload = self.start(self.actions[0])
+        self.put(upload, 0, 4095)
+        # A retry after a lost response is acknowledged; a chunk overlapping the stored bytes is refused
+        retry = self.put(upload, 0, 4095, body=b"x" * 4096)
+        self.assertEqual((retry.status_code, retry.data["received"]), (200, 4096))
+        overlap = self.put(upload, 2048, 6143)
+        self.assertEqual((overlap.status_code, overlap.data["received"]), (400, "4096"))
+
+        self.assertTrue(self.put(upload, 4096, len(self.content) - 1).data["complete"])
+        with EvidenceBlob.objects.get().file.open("rb") as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertEqual(os.listdir(settings.EVIDENCE_UPLOAD_DIR), [])
+
+    def test_digest_is_kept_while_chunks_arrive(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        upload = self.start(self.actions[0], sha256=sha256)
+        with mock.patch.object(evidence, "file_sha256", wraps=evidence.file_sha256) as rehash:
+            self.put(upload, 0, 4095)
+            self.assertTrue(self.put(upload, 4096, len(self.content) - 1).data["complete"])
+        # Nothing is left to read back from disk when the upload finishes
+        self.assertEqual(rehash.call_args.args[2], len(self.content))
+
+        # A process that didn't see the earlier chunks reads back what it missed (here, all of it)
+        upload = self.start(self.actions[1], sha256=sha256)
+        self.put(upload, 0, 4095)
+        evidence.digests.save(uuid.UUID(upload["id"]), 0, hashlib.sha256())
+        self.put(upload, 4096, 8191)
+        with mock.patch.object(evidence, "file_sha256", wraps=evidence.file_sha256) as rehash:
+            self.assertTrue(self.put(upload, 8192, len(self.content) - 1).data["complete"])
+        self.assertEqual(rehash.call_args.args[2], 0)
+
+    def test_same_content_uploaded_twice_is_stored_once(self):
+        for action in self.actions:
+            upload = self.start(action)
+            self.assertTrue(self.put(upload, 0, len(self.content) - 1).data["complete"])
+        self.assertEqual(EvidenceBlob.objects.count(), 1)
+
+    def test_download(self):
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        self.put(self.start(self.actions[0]), 0, len(self.content) - 1)
+        url = f"/posts/initiativeactions/{self.actions[0].pk}/evidence/download/"
+
+        with override_settings(EVIDENCE_ACCEL_REDIRECT=True):
+            response = self.client.get(url)
+            self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/evidence/{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf")
+            self.assertEqual(response["ETag"], f'"{sha256}"')
+            self.assertIn("ward-audit.pdf", response["Content-Disposition"])
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=f'"{sha256}"').status_code, 304)
+
+        with override_settings(EVIDENCE_ACCEL_REDIRECT=False):
+            self.assertEqual(b"".join(self.client.get(url).streaming_content), self.content)
+
+        outsider = User.objects.create(username="outsider", email="outsider@nbihosp.org")
+        self.client.force_authenticate(outsider)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_image_previews(self):
+        scan = io.BytesIO()
+        Image.new("RGB", (2400, 1800), "white").save(scan, "PNG")
+        self.content = scan.getvalue()
+        upload = self.start(self.actions[0], filename="ward-audit.png")
+        self.put(upload, 0, len(self.content) - 1)
+        url = f"/posts/initiativeactions/{self.actions[0].pk}/evidence/preview/"
+
+        action = self.client.get(f"/posts/initiativeactions/{self.actions[0].pk}/").data
+        self.assertTrue(action["evidence_preview"].endswith(url))
+        blob = EvidenceBlob.objects.get()
+        previews.render_previews(blob.sha256, blob.file.path, blob.content_type)
+        with Image.open(previews.preview_path(blob.sha256, "thumb")) as thumb:
+            self.assertEqual(thumb.size, (256, 192))
+
+        with override_settings(EVIDENCE_ACCEL_REDIRECT=True):
+            response = self.client.get(url, {"size": "page"})
+            self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{previews.preview_name(blob.sha256, 'page')}")
+        self.assertEqual(self.client.get(url, {"size": "poster"}).status_code, 400)
+
+    def test_failed_preview_is_not_retried(self):
+        self.content = b"not really a png" * 64
+        self.put(self.start(self.actions[0], filename="ward-audit.png"), 0, len(self.content) - 1)
+        blob = EvidenceBlob.objects.get()
+        with self.assertRaises(UnidentifiedImageError):
+            previews.render_previews(blob.sha256, blob.file.path, blob.content_type)
+        self.assertTrue(previews.has_failed(blob.sha256))
+        # Skipped from now on, and the endpoint stops asking the client to come back
+        previews.render_previews(blob.sha256, blob.file.path, blob.content_type)
+        response = self.client.get(f"/posts/initiativeactions/{self.actions[0].pk}/evidence/preview/")
+        self.assertEqual(response.status_code, 422)
+
+    def test_transient_preview_failure_is_retried(self):
+        scan = io.BytesIO()
+        Image.new("RGB", (640, 480), "white").save(scan, "PNG")
+        self.content = scan.getvalue()
+        self.put(self.start(self.actions[0], filename="ward-audit.png"), 0, len(self.content) - 1)
+        blob = EvidenceBlob.objects.get()
+        with mock.patch.object(previews, "open_image", side_effect=OSError(28, "No space left on device")):
+            with self.assertRaises(OSError):
+                previews.render_previews(blob.sha256, blob.file.path, blob.content_type)
+        self.assertFalse(previews.has_failed(blob.sha256))
+        previews.render_previews(blob.sha256, blob.file.path, blob.content_type)
+        self.assertTrue(previews.previews_exist(blob.sha256))
+
+    def test_legacy_evidence_field(self):
+        url = f"/posts/initiativeactions/{self.actions[1].pk}/"
+        upload = SimpleUploadedFile("minutes.pdf", self.content, content_type="application/pdf")
+        response = self.client.patch(url, {"evidence": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIn("minutes", response.data["evidence"])
+        self.assertIsNone(response.data["evidence_blob"])
+
+    def test_rejects_other_file_types(self):
+        response = self.client.post(
+            f"/posts/initiativeactions/{self.actions[0].pk}/evidence/", {"filename": "run.exe", "size": 10}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class ApprovalTransitionTests(TestCase):
+    " Each workflow step adds an entry; the request it answers is kept as it was "
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.head = User.objects.create(username="head", email="head@nbihosp.org", is_superuser=True)
+        cls.member = User.objects.create(username="member", email="member@nbihosp.org", is_superuser=True)
+        for code in STATUS_CODES:
+            ApprovalStatus.objects.create(code=code, description=code.title(), created_by=cls.head)
+        cls.initiative = Initiative.objects.create(
+            objective=StrategicObjective.objects.create(name="Workflow objective", created_by=cls.head),
+            dimension=Dimension.objects.create(name="Workflow dimension", head=cls.head, created_by=cls.head),
+            description="Initiative", unit_of_measure="%", weight=Decimal("0.100"), previous_target=Decimal("0.500"),
+            current_target=Decimal("0.600"), cumulative_target=Decimal("0.700"), status_id="OPEN", created_by=cls.member,
+        )
+
+    def setUp(self):
+        cache.clear()
+        statuses.clear()
+        self.client = APIClient()
+
+    def post(self, user, route, comment):
+        self.client.force_authenticate(user)
+        response = self.client.post(f"/posts/{route}/", {"approval_entry": self.initiative.pk, "comment": comment}, format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def test_approval_keeps_the_request(self):
+        request = self.post(self.member, "requestapprovals", "Ready for review")
+        self.client.force_authenticate(self.head)
+        self.assertEqual(len(self.client.get("/posts/approvalinbox/").data["results"]), 1)
+
+        approval = self.post(self.head, "approveapprovals", "Approved")
+        self.assertNotEqual(approval["id"], request["id"])
+        self.assertEqual((approval["requestor"], approval["approver"], approval["status"]), (self.member.pk, self.head.pk, "APPROVED"))
+
+        pending = ApprovalEntry.objects.get(pk=request["id"])
+        self.assertEqual((pending.status_id, pending.requestor_id, pending.comment), ("PENDINGAPPROVAL", self.member.pk, "Ready for review"))
+        self.assertIsNone(pending.actioned_at)
+        self.assertEqual(Initiative.objects.get(pk=self.initiative.pk).status_id, "APPROVED")
+        self.client.force_authenticate(self.head)
+        self.assertEqual(self.client.get("/posts/approvalinbox/").data["results"], [])
+
+
+    def test_entries_cannot_be_edited(self):
+        request = self.post(self.member, "requestapprovals", "Ready for review")
+        for route in ("requestapprovals", "approveapprovals", "rejectapprovals", "cancelapprovals"):
+            with self.subTest(route=route):
+                url = f"/posts/{route}/{request['id']}/"
+                self.assertEqual(self.client.patch(url, {"status": "APPROVED"}, format="json").status_code, 405)
+                self.assertEqual(self.client.delete(url).status_code, 405)
+        self.assertEqual(ApprovalEntry.objects.get(pk=request["id"]).status_id, "PENDINGAPPROVAL")
+        self.assertEqual(Initiative.objects.get(pk=self.initiative.pk).status_id, "PENDINGAPPROVAL")
+
+    def test_etags_follow_comment_edits(self):
+        request = self.post(self.member, "requestapprovals", "Ready for review")
+        list_url, detail_url = "/posts/requestapprovals/", f"/posts/requestapprovals/{request['id']}/"
+        listed, detail = self.client.get(list_url), self.client.get(detail_url)
+        self.assertNotIn("Last-Modified", listed)
+        self.assertIn("Last-Modified", detail)
+
+        entry = ApprovalEntry.objects.get(pk=request["id"])
+        entry.comment = "Edited in the admin"
+        entry.save()
+        self.assertEqual(self.client.get(list_url, HTTP_IF_NONE_MATCH=listed["ETag"]).status_code, 200)
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail["ETag"]).status_code, 200)
+
+    def test_status_registry_is_cached_until_a_status_changes(self):
+        with self.assertNumQueries(1):
+            statuses.get_status("approved")
+        with self.assertNumQueries(0):
+            self.assertEqual(statuses.get_status("APPROVED").description, "Approved")
+        status = ApprovalStatus.objects.get(pk="APPROVED")
+        status.description = "Signed off"
+        status.save()
+        self.assertEqual(statuses.get_status("APPROVED").description, "Signed off")
+        # An unknown code is looked for once more in case another process added it
+        with self.assertNumQueries(1), self.assertRaises(ApprovalStatus.DoesNotExist):
+            statuses.get_status("ARCHIVED")
+
+    def test_stale_source_is_a_conflict(self):
+        self.post(self.member, "requestapprovals", "Ready for review")
+        stale, initiative = Initiative.objects.get(pk=self.initiative.pk), Initiative.objects.get(pk=self.initiative.pk)
+        # Move, entry insert and the two rollup buckets, inside one savepoint
+        with self.assertNumQueries(6):
+            apply_transition("cancel", initiative, self.member, "Withdrawn")
+
+        conflicts = {"transition": "approve", "outcome": "conflict"}
+        before = REGISTRY.get_sample_value("pt_approval_transitions_total", conflicts) or 0
+        entries = ApprovalEntry.objects.count()
+        # Only the conditional UPDATE runs, inside a savepoint that is rolled back
+        with self.assertNumQueries(4), self.assertRaises(ValidationError) as raised:
+            apply_transition("approve", stale, self.head, "Too late")
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertIn("approval_entry", raised.exception.detail)
+        self.assertEqual(ApprovalEntry.objects.count(), entries)
+        self.assertEqual(REGISTRY.get_sample_value("pt_approval_transitions_total", conflicts), before + 1)
+        self.assertEqual(Initiative.objects.get(pk=self.initiative.pk).status_id, "OPEN")
+
+class LoadFixturesTests(TestCase):
+    " load_fixtures --bulk skips and counts bad entries instead of aborting the load "
+
+    def test_bad_entries_are_skipped(self):
+        user = User.objects.create(username="loader", email="loader@nbihosp.org")
+        fixture = [
+            {"fields": {"description": "No model"}},
+            {"model": "posts.approvalstatus", "pk": "ON_HOLD", "fields": {"colour": "red", "created_by": user.pk}},
+            {"model": "posts.approvalstatus", "pk": "draft", "fields": {"description": "Draft", "created_by": user.pk}},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump(fixture, file)
+            file.flush()
+            out = io.StringIO()
+            call_command("load_fixtures", file=file.name, bulk=True, stdout=out, stderr=io.StringIO())
+        self.assertIn("Loaded 1 rows", out.getvalue())
+        self.assertEqual(list(ApprovalStatus.objects.values_list("code", flat=True)), ["DRAFT"])
+
+    def test_create_after_a_bulk_load(self):
+        user = User.objects.create(username="loader", email="loader@nbihosp.org")
+        pk = 1_000_000
+        fixture = [{"model": "posts.dimension", "pk": pk, "fields": {"name": "Loaded dimension", "created_by": user.pk}}]
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            json.dump(fixture, file)
+            file.flush()
+            call_command("load_fixtures", file=file.name, bulk=True, stdout=io.StringIO(), stderr=io.StringIO())
+        # The id sequence was moved past the loaded pk, so the next insert doesn't collide with it
+        self.assertGreater(Dimension.objects.create(name="Created dimension", created_by=user).pk, pk)
+
+
+class CreateRolesTests(TestCase):
+    " create_roles only adds permissions unless asked to prune "
+
+    def test_undeclared_permissions_are_kept_without_prune(self):
+        group = Group.objects.create(name="USER")
+        extra = Permission.objects.get(content_type__app_label="posts", codename="delete_dimension")
+        group.permissions.add(extra)
+
+        call_command("create_roles", stdout=io.StringIO())
+        self.assertTrue(group.permissions.filter(pk=extra.pk).exists())
+        self.assertTrue(group.permissions.filter(codename="view_initiative").exists())
+
+        call_command("create_roles", prune=True, stdout=io.StringIO())
+        self.assertFalse(group.permissions.filter(pk=extra.pk).exists())
+
+
+class ScorecardTests(TestCase):
+    " /posts/scorecards/ filters by dimension, objective and status "
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username="scorecard", email="scorecard@nbihosp.org", is_superuser=True)
+        for code in STATUS_CODES:
+            ApprovalStatus.objects.create(code=code, description=code.title(), created_by=cls.admin)
+        cls.dimensions = [
+            Dimension.objects.create(name=f"Scorecard dimension {n}", head=cls.admin, created_by=cls.admin) for n in range(2)
+        ]
+        cls.objectives = [
+            StrategicObjective.objects.create(name=f"Scorecard objective {n}", created_by=cls.admin) for n in range(2)
+        ]
+        ScorecardRollup.objects.bulk_create([
+            ScorecardRollup(dimension=dimension, objective=objective, status_id=code, initiative_count=1)
+            for dimension in cls.dimensions for objective in cls.objectives for code in ("OPEN", "APPROVED")
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def buckets(self, **params):
+        response = self.client.get("/posts/scorecards/", params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return {(row["dimension"], row["objective"], row["status"]) for row in response.data}
+
+    def test_filters(self):
+        dimension, objective = self.dimensions[0].pk, self.objectives[1].pk
+        self.assertEqual(len(self.buckets()), 8)
+        self.assertEqual({row[0] for row in self.buckets(dimension=dimension)}, {dimension})
+        self.assertEqual(
+            self.buckets(dimension=dimension, objective=objective, status="approved"), {(dimension, objective, "APPROVED")}
+        )
+
+    def test_scoped_to_the_users_dimension(self):
+        cache.clear()
+        member = User.objects.create(username="scorecard-member", email="member@nbihosp.org", dimension=self.dimensions[1])
+        self.client.force_authenticate(member)
+        self.assertEqual({row[0] for row in self.buckets()}, {self.dimensions[1].pk})
+        self.assertEqual(self.buckets(dimension=self.dimensions[0].pk), set())
+
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get("/posts/scorecards/").status_code, (401, 403))
+
+    def test_non_integer_ids_are_rejected(self):
+        for param in ("dimension", "objective"):
+            response = self.client.get("/posts/scorecards/", {param: "abc"})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(param, response.data)
+
+    def assertRollupMatchesAggregate(self):
+        " The non-empty rollup rows equal a fresh aggregate of the initiatives and actions "
+        expected = {}
+        for initiative in Initiative.objects.prefetch_related("initiativeaction_set"):
+            totals = expected.setdefault(
+                (initiative.dimension_id, initiative.objective_id, initiative.status_id), [0, 0, 0, 0, 0, 0]
+            )
+            totals[0] += 1
+            totals[2] += initiative.weight
+            totals[3] += initiative.current_target
+            for initiative_action in initiative.initiativeaction_set.all():
+                totals[1] += 1
+                totals[4] += initiative_action.weighted_score
+                totals[5] += initiative_action.weighted_achieved
+        actual = {
+            row[:3]: list(row[3:]) for row in ScorecardRollup.objects.filter(initiative_count__gt=0).values_list(
+                "dimension_id", "objective_id", "status_id", "initiative_count", "action_count", "total_weight",
+                "total_target", "total_weighted_score", "total_weighted_achieved",
+            )
+        }
+        self.assertEqual(actual, expected)
+
+    def make_initiative(self, dimension, objective, status_id="OPEN"):
+        return Initiative.objects.create(
+            objective=objective, dimension=dimension, description="Initiative", unit_of_measure="%",
+            weight=Decimal("0.100"), previous_target=Decimal("0.500"), current_target=Decimal("0.600"),
+            cumulative_target=Decimal("0.700"), status_id=status_id, created_by=self.admin,
+        )
+
+    def make_action(self, initiative, weighted_score="0.50"):
+        return InitiativeAction.objects.create(
+            initiative=initiative, cummulative_actual=Decimal("0.300"), action_description="Action",
+            action_factor="Factor", raw_score=Decimal("1.00"), weighted_score=Decimal(weighted_score),
+            weighted_achieved=Decimal("0.25"), deadline="Q4", created_by=self.admin,
+        )
+
+    def test_rollup_follows_creates_moves_and_deletes(self):
+        ScorecardRollup.objects.all().delete()
+        first = self.make_initiative(self.dimensions[0], self.objectives[0])
+        second = self.make_initiative(self.dimensions[1], self.objectives[0], "APPROVED")
+        actions = [self.make_action(first), self.make_action(first, "0.75"), self.make_action(second)]
+        self.assertRollupMatchesAggregate()
+
+        # An edit within the bucket, then an action moving to another initiative's bucket
+        moved = InitiativeAction.objects.get(pk=actions[0].pk)
+        moved.weighted_score = Decimal("0.90")
+        moved.save()
+        self.assertRollupMatchesAggregate()
+        moved.initiative = second
+        moved.save()
+        self.assertRollupMatchesAggregate()
+
+        # A status change and an objective change carry the initiative's actions along
+        first = Initiative.objects.get(pk=first.pk)
+        first.status_id = "APPROVED"
+        first.weight = Decimal("0.200")
+        first.save()
+        self.assertRollupMatchesAggregate()
+        first.objective = self.objectives[1]
+        first.save()
+        self.assertRollupMatchesAggregate()
+
+        InitiativeAction.objects.get(pk=actions[1].pk).delete()
+        self.assertRollupMatchesAggregate()
+        first.delete()
+        self.assertRollupMatchesAggregate()
+        # The emptied bucket is kept at zero and left out of the endpoint
+        self.assertEqual(
+            ScorecardRollup.objects.get(dimension=self.dimensions[0], objective=self.objectives[1], status_id="APPROVED").initiative_count, 0
+        )
+        self.assertNotIn((self.dimensions[0].pk, self.objectives[1].pk, "APPROVED"), self.buckets())
+
+    def test_bulk_actions_move_the_rollup(self):
+        ScorecardRollup.objects.all().delete()
+        first = self.make_initiative(self.dimensions[0], self.objectives[0], "APPROVED")
+        second = self.make_initiative(self.dimensions[1], self.objectives[1], "APPROVED")
+        existing = self.make_action(first)
+        item = {
+            "initiative": first.pk, "cummulative_actual": "0.400", "action_description": "Bulk",
+            "action_factor": "Factor", "raw_score": "1.00", "weighted_score": "0.50", "weighted_achieved": "0.25",
+        }
+        response = self.client.post("/posts/initiativeactions/bulk/", [
+            {**item, "id": existing.pk, "initiative": second.pk, "weighted_score": "0.80"}, item,
+        ], format="json")
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertRollupMatchesAggregate()
@@ -0,0 +1,104 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import serializers
+from core.metrics import APPROVAL_TRANSITIONS
+from .models import ApprovalEntry, ApprovalStatus, Dimension, Initiative
+from .rollups import add, apply_deltas, initiative_share
+from .statuses import get_status
+
+# transition: (initiative status it must be in, initiative status it moves to, approval entry status)
+TRANSITIONS = {
+    "request": ("OPEN", "PENDINGAPPROVAL", "PENDINGAPPROVAL"),
+    "approve": ("PENDINGAPPROVAL", "APPROVED", "APPROVED"),
+    "reject": ("PENDINGAPPROVAL", "OPEN", "REJECTED"),
+    "cancel": ("PENDINGAPPROVAL", "OPEN", "CANCELLED"),
+}
+
+ENTRY_FIELDS = [
+    "requestor_id", "approval_entry_id", "requested_at", "approver_id", "actioned_at", "status_id", "comment", "updated_at",
+]
+
+
+def insert_entry(name, initiative, user, source, entry_status, comment, now):
+    """
+    Insert the transition's ApprovalEntry with one INSERT ... RETURNING.
+
+    The other party is looked up inside the INSERT: a "request" goes to the dimension head,
+    and approve/reject/cancel are recorded against the requestor of the latest entry in the
+    source status. Initiatives put in review before entries were tracked have no requestor
+    on record, so the acting user stands in.
+    """
+    quote = connection.ops.quote_name
+    entries = quote(ApprovalEntry._meta.db_table)
+    if name == "request":
+        actioned_at = None
+        requestor, requestor_params = "%s", [user.pk]
+        approver = f"(SELECT {quote('head_id')} FROM {quote(Dimension._meta.db_table)} WHERE {quote('id')} = %s)"
+        approver_params = [initiative.dimension_id]
+    else:
+        actioned_at = now
+        requestor = (
+            f"COALESCE((SELECT {quote('requestor_id')} FROM {entries} WHERE {quote('approval_entry_id')} = %s"
+            f" AND {quote('status_id')} = %s ORDER BY {quote('requested_at')} DESC, {quote('id')} DESC LIMIT 1), %s)"
+        )
+        requestor_params = [initiative.pk, source, user.pk]
+        approver, approver_params = "%s", [user.pk]
+
+    values = [requestor, "%s", "%s", approver, "%s", "%s", "%s", "%s"]
+    params = [*requestor_params, initiative.pk, now, *approver_params, actioned_at, entry_status, comment, now]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {entries} ({', '.join(quote(field) for field in ENTRY_FIELDS)}) VALUES ({', '.join(values)})"
+            f" RETURNING {quote('id')}, {quote('requestor_id')}, {quote('approver_id')}",
+            params,
+        )
+        entry_id, requestor_id, approver_id = cursor.fetchone()
+    return ApprovalEntry.from_db(
+        connection.alias, ["id", *ENTRY_FIELDS],
+        [entry_id, requestor_id, initiative.pk, now, approver_id, actioned_at, entry_status, comment, now],
+    )
+
+
+def apply_transition(name, initiative, user, comment=None):
+    """
+    Move ``initiative`` through the approval workflow and record it on an ApprovalEntry.
+
+    The initiative is moved with a single conditional UPDATE (compare-and-swap on its
+    current status), so when two approvers race only one of them wins; the other gets a
+    validation error and nothing is written. Every transition inserts its own entry, so the
+    history keeps who asked and when; the entry it answers is left as it was.
+    """
+    source, target, entry_status = TRANSITIONS[name]
+    for code in (target, entry_status):
+        try:
+            get_status(code)
+        except ApprovalStatus.DoesNotExist:
+            APPROVAL_TRANSITIONS.labels(name, "invalid").inc()
+            raise serializers.ValidationError(f"'{code}' status not defined.")
+
+    now = timezone.now()
+    with transaction.atomic():
+        moved = Initiative.objects.filter(pk=initiative.pk, status_id=source).update(
+            status_id=target, modified_at=now, modified_by=user
+        )
+        if not moved:
+            APPROVAL_TRANSITIONS.labels(name, "conflict").inc()
+            raise serializers.ValidationError(
+                {"approval_entry": [f"Initiative is no longer '{source}'; it was changed by another request."]}
+            )
+
+        entry = insert_entry(name, initiative, user, source, entry_status, comment, now)
+
+        # The conditional UPDATE bypasses post_save, so move the initiative's share of the rollup here
+        deltas = {}
+        add(deltas, (initiative.dimension_id, initiative.objective_id, source), initiative_share(initiative.pk), sign=-1)
+        add(deltas, (initiative.dimension_id, initiative.objective_id, target), initiative_share(initiative.pk))
+        apply_deltas(deltas)
+
+    APPROVAL_TRANSITIONS.labels(name, "applied").inc()
+    initiative.status_id = target
+    initiative.modified_at = now
+    initiative.modified_by = user
+    if getattr(initiative, "_loaded_scorecard", None):
+        initiative._loaded_scorecard = (initiative.scorecard_bucket, *initiative._loaded_scorecard[1:])
+    return entry
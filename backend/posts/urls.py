@@ -2,7 +2,8 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import (
     DimensionViewSet, StrategicObjectiveViewSet, InitiativeViewSet, InitiativeActionViewSet, ApprovalStatusViewSet,
-    RejectApprovalRequestViewSet, RequestApprovalViewSet, ApproveApprovalRequestViewSet, CancelApprovalRequestViewSet
+    RejectApprovalRequestViewSet, RequestApprovalViewSet, ApproveApprovalRequestViewSet, CancelApprovalRequestViewSet,
+    ScorecardViewSet, ApprovalInboxViewSet, EvidenceUploadViewSet
 )
 
 router = DefaultRouter()
@@ -16,6 +17,9 @@ router.register("requestapprovals", RequestApprovalViewSet, basename="requestapp
 router.register("approveapprovals", ApproveApprovalRequestViewSet, basename="approveapproval")
 router.register("rejectapprovals", RejectApprovalRequestViewSet, basename="rejectapproval")
 router.register("cancelapprovals", CancelApprovalRequestViewSet, basename="cancelapproval")
+router.register("scorecards", ScorecardViewSet, basename="scorecard")
+router.register("approvalinbox", ApprovalInboxViewSet, basename="approvalinbox")
+router.register("evidenceuploads", EvidenceUploadViewSet, basename="evidenceupload")
 
 
 urlpatterns = router.urls
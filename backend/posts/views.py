@@ -1,17 +1,63 @@
+import os
+from django.db.models import Exists, OuterRef
+from django.http import Http404
+from django.utils.http import quote_etag
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework import viewsets
+from rest_framework import mixins, serializers, viewsets
 from rest_framework.permissions import IsAuthenticated
-from .models import Dimension, StrategicObjective, Initiative, InitiativeAction, ApprovalStatus, ApprovalEntry
+from rest_framework.decorators import action
+from authentication.principal import get_principal
+from core.conditional import ConditionalGetMixin
+from core.profiling import ProfilingMixin
+from core.pagination import NewestCursorPagination, RequestedCursorPagination
+from .models import Dimension, StrategicObjective, Initiative, InitiativeAction, ApprovalStatus, ApprovalEntry, ScorecardRollup, EvidenceUpload
+from .exports import EXPORT_FORMATS, stream_export
+from . import evidence, previews
 from .serializers import (
     DimensionSerializer, StrategicObjectiveSerializer, InitiativeActionSerializer, InitiativeSerializer,
     ApprovalStatusSerializer, RejectApprovalRequestSerializer, ApproveApprovalRequestSerializer, 
-    RequestApprovalSerializer, CancelApprovalRequestSerializer
+    RequestApprovalSerializer, CancelApprovalRequestSerializer, ScorecardRollupSerializer, InitiativeActionBulkSerializer,
+    ApprovalInboxSerializer, EvidenceUploadSerializer
 )
 
-class DimensionViewSet(viewsets.ModelViewSet):
+# Lists render the creator's and modifier's names, so their edits must change the ETag
+AUTHOR_TIMESTAMPS = ("created_by__updated_at", "modified_by__updated_at")
+
+def scope_to_dimension(request, queryset, lookup="dimension_id"):
+    " Limit the queryset to the requesting user's dimension unless they may see every dimension "
+    principal = get_principal(request)
+    if principal.is_system_admin:
+        return queryset
+
+    if not principal.dimension_id:
+        return queryset.none()
+
+    return queryset.filter(**{lookup: principal.dimension_id})
+
+class ExportMixin:
+    " Adds a streaming CSV/NDJSON `export` action over the scoped queryset "
+    export_fields = []
+    export_filename = "export"
+
+    def get_export_queryset(self):
+        return self.get_queryset()
+
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        file_format = request.query_params.get("file_format", "csv").lower()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"detail": f"Unsupported export format '{file_format}'. Use one of: {', '.join(EXPORT_FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        queryset = self.filter_queryset(self.get_export_queryset())
+        return stream_export(queryset, self.export_fields, file_format, self.export_filename)
+
+class DimensionViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Dimension.objects.select_related("created_by", "modified_by")
     serializer_class = DimensionSerializer
+    last_modified_fields = ("modified_at", *AUTHOR_TIMESTAMPS)
 
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -19,9 +65,10 @@ class DimensionViewSet(viewsets.ModelViewSet):
         context["request"] = self.request
         return context 
     
-class StrategicObjectiveViewSet(viewsets.ModelViewSet):
+class StrategicObjectiveViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = StrategicObjective.objects.select_related("created_by", "modified_by")
     serializer_class = StrategicObjectiveSerializer
+    last_modified_fields = ("modified_at", *AUTHOR_TIMESTAMPS)
 
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -29,8 +76,16 @@ class StrategicObjectiveViewSet(viewsets.ModelViewSet):
         context["request"] = self.request
         return context
     
-class InitiativeViewSet(viewsets.ModelViewSet):
+class InitiativeViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = InitiativeSerializer
+    last_modified_fields = ("modified_at", *AUTHOR_TIMESTAMPS)
+    pagination_class = NewestCursorPagination
+    export_filename = "initiatives"
+    export_fields = [
+        "id", "objective_id", "objective__name", "dimension_id", "dimension__name", "description", "unit_of_measure",
+        "weight", "previous_target", "current_target", "cumulative_target", "status_id",
+        "created_by__username", "created_at", "modified_by__username", "modified_at",
+    ]
 
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -39,18 +94,19 @@ class InitiativeViewSet(viewsets.ModelViewSet):
         return context
     
     def get_queryset(self):
-        user = self.request.user
         qs = Initiative.objects.select_related("status", "objective", "dimension", "created_by", "modified_by")
-        if user.is_superuser or user.role == "SYSTEM_ADMIN":
-            return qs
-
-        if not user.dimension:
-            return Initiative.objects.none()
-
-        return qs.filter(dimension=user.dimension)
+        return scope_to_dimension(self.request, qs, "dimension_id")
     
-class InitiativeActionViewSet(viewsets.ModelViewSet):
+class InitiativeActionViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     serializer_class = InitiativeActionSerializer
+    last_modified_fields = ("modified_at", *AUTHOR_TIMESTAMPS)
+    pagination_class = NewestCursorPagination
+    export_filename = "initiative_actions"
+    export_fields = [
+        "id", "initiative_id", "initiative__description", "initiative__dimension__name", "cummulative_actual",
+        "action_description", "action_factor", "raw_score", "weighted_score", "weighted_achieved", "progress",
+        "status", "deadline", "evidence", "created_by__username", "created_at", "modified_by__username", "modified_at",
+    ]
 
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -59,19 +115,120 @@ class InitiativeActionViewSet(viewsets.ModelViewSet):
         return context
     
     def get_queryset(self):
-        user = self.request.user
-        qs = InitiativeAction.objects.select_related("initiative", "created_by", "modified_by")
-        if user.is_superuser or user.role == "SYSTEM_ADMIN":
-            return qs
+        qs = InitiativeAction.objects.select_related("initiative", "created_by", "modified_by", "evidence_blob")
+        return scope_to_dimension(self.request, qs, "initiative__dimension_id")
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk(self, request):
+        " Create (no id) or update (with id) a list of initiative actions in one transaction "
+        context = self.get_serializer_context()
+        context["queryset"] = self.get_queryset()
+        context["initiatives"] = scope_to_dimension(request, Initiative.objects.all())
+        serializer = InitiativeActionBulkSerializer(data=request.data, many=True, max_length=500, context=context)
+        serializer.is_valid(raise_exception=True)
+        actions = serializer.save()
+        # 201 only when the batch created something; a batch of updates is a plain 200
+        return Response(
+            InitiativeActionSerializer(actions, many=True, context=context).data,
+            status=status.HTTP_201_CREATED if serializer.created else status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=["post"], url_path="evidence", permission_classes=[IsAuthenticated])
+    def upload_evidence(self, request, pk=None):
+        """
+        Open a resumable upload for this action's evidence, then PUT the chunks to
+        /posts/evidenceuploads/<id>/. Content already stored is deduplicated once the
+        server has hashed the uploaded bytes; a claimed sha256 alone never attaches a file.
+        """
+        initiative_action = self.get_object()
+        if initiative_action.initiative.status_id != "APPROVED":
+            raise serializers.ValidationError("You can only add or update initiative actions for approved initiatives.")
+        serializer = EvidenceUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(action=initiative_action, created_by=request.user)
+        return Response(EvidenceUploadSerializer(upload).data, status=status.HTTP_201_CREATED)
 
-        if not user.dimension:
-            return InitiativeAction.objects.none()
+    @action(detail=True, methods=["get"], url_path="evidence/download", permission_classes=[IsAuthenticated])
+    def download_evidence(self, request, pk=None):
+        " The action's evidence file, for users who can see the action (dimension scoped like the list) "
+        initiative_action = self.get_object()
+        blob = initiative_action.evidence_blob
+        if blob is None:
+            raise Http404("This action has no evidence.")
+        filename = (
+            initiative_action.evidence_uploads.filter(blob=blob).order_by("-modified_at").values_list("filename", flat=True).first()
+            or f"evidence-{initiative_action.pk}{os.path.splitext(blob.file.name)[1]}"
+        )
+        return evidence.serve(request, blob, filename)
 
-        return qs.filter(initiative__dimension=user.dimension)
+    @action(detail=True, methods=["get"], url_path="evidence/preview", permission_classes=[IsAuthenticated])
+    def preview_evidence(self, request, pk=None):
+        """
+        A small JPEG of the evidence (first page for PDFs): ?size=thumb (default) or page.
+        Previews are rendered in the background; until then this answers 202 with Retry-After,
+        and 422 once rendering the file has failed.
+        """
+        size = request.query_params.get("size", "thumb")
+        if size not in previews.PREVIEW_SIZES:
+            raise serializers.ValidationError(f"Unknown preview size '{size}'. Use one of: {', '.join(previews.PREVIEW_SIZES)}.")
+        blob = self.get_object().evidence_blob
+        if blob is None or not previews.can_preview(blob.content_type):
+            raise Http404("This action has no evidence that can be previewed.")
+        if previews.has_failed(blob.sha256):
+            return Response(
+                {"detail": "A preview cannot be rendered for this file."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if not os.path.exists(previews.preview_path(blob.sha256, size)):
+            previews.pool.submit(blob.sha256, blob.file.path, blob.content_type)
+            return Response(status=status.HTTP_202_ACCEPTED, headers={"Retry-After": "2"})
+        return evidence.send_file(
+            request, previews.preview_name(blob.sha256, size), quote_etag(f"{blob.sha256}-{size}"), "image/jpeg",
+            f"preview-{size}.jpg",
+        )
 
-class ApprovalStatusViewSet(viewsets.ModelViewSet):
+class EvidenceUploadViewSet(ProfilingMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """
+    The uploader's evidence upload sessions. GET one for the offset to resume from; PUT
+    each chunk as the raw request body with ``Content-Range: bytes <start>-<end>/<size>``
+    and, optionally, ``X-Chunk-SHA256`` to have the chunk verified on arrival.
+    """
+    serializer_class = EvidenceUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return EvidenceUpload.objects.filter(created_by_id=self.request.user.pk)
+
+    def update(self, request, pk=None):
+        upload = self.get_object()
+        start, end = evidence.parse_content_range(request.headers.get("Content-Range"), upload.size)
+        upload = evidence.write_chunk(upload, request.stream, start, end, request.headers.get("X-Chunk-SHA256"))
+        return Response(self.get_serializer(upload).data)
+
+class ScorecardViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    " Weighted achieved vs. target totals per dimension, objective and approval status "
+    serializer_class = ScorecardRollupSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        # Buckets that emptied out are kept at zero rather than deleted under concurrent writers
+        qs = ScorecardRollup.objects.filter(initiative_count__gt=0).order_by("dimension_id", "objective_id", "status_id")
+        for param in ("dimension", "objective"):
+            value = self.request.query_params.get(param)
+            if value:
+                try:
+                    qs = qs.filter(**{f"{param}_id": int(value)})
+                except ValueError:
+                    raise serializers.ValidationError({param: f"Expected an id, got {value!r}."})
+        status_code = self.request.query_params.get("status")
+        if status_code:
+            qs = qs.filter(status_id=status_code.upper())
+
+        return scope_to_dimension(self.request, qs, "dimension_id")
+
+class ApprovalStatusViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ApprovalStatus.objects.select_related("created_by", "modified_by")
     serializer_class = ApprovalStatusSerializer
+    last_modified_fields = ("modified_at", *AUTHOR_TIMESTAMPS)
 
     def get_serializer_context(self):
         " Pass request to serializer context to access request.user "
@@ -79,40 +236,90 @@ class ApprovalStatusViewSet(viewsets.ModelViewSet):
         context["request"] = self.request
         return context
     
-class RequestApprovalViewSet(viewsets.ModelViewSet):
+class RequestApprovalViewSet(ProfilingMixin, ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = ApprovalEntry.objects.select_related("status", "requestor", "approver")
     serializer_class = RequestApprovalSerializer
     permission_classes = [IsAuthenticated]
+    # Entries only change through apply_transition (POST); PUT/PATCH/DELETE would bypass it
+    http_method_names = ["get", "post", "head", "options"]
+    pagination_class = RequestedCursorPagination
+    last_modified_fields = ("updated_at",)
+    export_filename = "approval_entries"
+    export_fields = [
+        "id", "approval_entry_id", "approval_entry__description", "approval_entry__dimension__name", "status_id",
+        "requestor__username", "approver__username", "requested_at", "actioned_at", "comment",
+    ]
+
+    def get_export_queryset(self):
+        qs = self.get_queryset()
+        return scope_to_dimension(self.request, qs, "approval_entry__dimension_id")
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
 
-class ApproveApprovalRequestViewSet(viewsets.ModelViewSet):
+class ApprovalInboxViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Pending approval requests waiting on the current user, newest first.
+    Pass ?scope=dimension to see everything pending in the user's dimension instead.
+    """
+    serializer_class = ApprovalInboxSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = RequestedCursorPagination
+    # The inbox also renders the initiative, its objective and dimension names and the requestor's name
+    last_modified_fields = (
+        "updated_at", "approval_entry__modified_at", "approval_entry__objective__modified_at",
+        "approval_entry__dimension__modified_at", "requestor__updated_at",
+    )
+
+    def get_queryset(self):
+        principal = get_principal(self.request)
+        # Requests stay PENDINGAPPROVAL in the history; one is answered once a later entry exists
+        answered = ApprovalEntry.objects.filter(
+            approval_entry=OuterRef("approval_entry"), requested_at__gt=OuterRef("requested_at")
+        )
+        qs = ApprovalEntry.objects.filter(status_id="PENDINGAPPROVAL").exclude(Exists(answered)).select_related(
+            "requestor", "approval_entry__objective", "approval_entry__dimension"
+        )
+        if self.request.query_params.get("scope") == "dimension":
+            return scope_to_dimension(self.request, qs, "approval_entry__dimension_id")
+
+        return qs.filter(approver_id=principal.user_id)
+
+class ApproveApprovalRequestViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ApprovalEntry.objects.select_related("status", "requestor", "approver")
     serializer_class = ApproveApprovalRequestSerializer
     permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "post", "head", "options"]
+    pagination_class = RequestedCursorPagination
+    last_modified_fields = ("updated_at",)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
     
-class RejectApprovalRequestViewSet(viewsets.ModelViewSet):
+class RejectApprovalRequestViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ApprovalEntry.objects.select_related("status", "requestor", "approver")
     serializer_class = RejectApprovalRequestSerializer
     permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "post", "head", "options"]
+    pagination_class = RequestedCursorPagination
+    last_modified_fields = ("updated_at",)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["request"] = self.request
         return context
     
-class CancelApprovalRequestViewSet(viewsets.ModelViewSet):
+class CancelApprovalRequestViewSet(ProfilingMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ApprovalEntry.objects.select_related("status", "requestor", "approver")
     serializer_class = CancelApprovalRequestSerializer
     permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "post", "head", "options"]
+    pagination_class = RequestedCursorPagination
+    last_modified_fields = ("updated_at",)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()